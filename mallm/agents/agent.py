@@ -13,6 +13,8 @@ from mallm.models.discussion.ResponseGenerator import ResponseGenerator
 if TYPE_CHECKING:
     from mallm.coordinator import Coordinator
 
+from mallm.utils.enums import CallType
+from mallm.utils.tracking import call_scope
 from mallm.utils.types import Agreement, Memory, TemplateFilling
 
 logger = logging.getLogger("mallm")
@@ -64,9 +66,10 @@ class Agent:
         Agent improves a solution based on the current state of the discussion.
         """
         logger.debug(f"Agent [bold blue]{self.short_id}[/] is improving the solution.")
-        response = self.response_generator.generate_improve(
-            template_filling, self.chain_of_thought
-        )
+        with call_scope(self.id, CallType.IMPROVE):
+            response = self.response_generator.generate_improve(
+                template_filling, self.chain_of_thought
+            )
         logger.debug(
             f"Agent [bold blue]{self.short_id}[/] {'agreed' if response.agreement else 'disagreed'} with the solution."
         )
@@ -110,9 +113,10 @@ class Agent:
         Agent drafts a solution based on the current state of the discussion.
         """
         logger.debug(f"Agent [bold blue]{self.short_id}[/] is drafting a solution.")
-        response = self.response_generator.generate_draft(
-            template_filling, self.chain_of_thought
-        )
+        with call_scope(self.id, CallType.DRAFT):
+            response = self.response_generator.generate_draft(
+                template_filling, self.chain_of_thought
+            )
         agreements.append(
             Agreement(
                 agreement=None,
@@ -153,9 +157,10 @@ class Agent:
         logger.debug(
             f"Agent [bold blue]{self.short_id}[/] provides feedback to a solution."
         )
-        response = self.response_generator.generate_feedback(
-            template_filling, self.chain_of_thought
-        )
+        with call_scope(self.id, CallType.FEEDBACK):
+            response = self.response_generator.generate_feedback(
+                template_filling, self.chain_of_thought
+            )
         logger.debug(
             f"Agent [bold blue]{self.short_id}[/] {'agreed' if response.agreement else 'disagreed'} with the solution."
         )
@@ -13,6 +13,8 @@ if TYPE_CHECKING:
 
 from mallm.agents.agent import Agent
 from mallm.evaluation.evaluator import Evaluator
+from mallm.utils.enums import CallType
+from mallm.utils.tracking import call_scope
 from mallm.utils.types import Memory, TemplateFilling
 
 logger = logging.getLogger("mallm")
@@ -57,9 +59,10 @@ class Judge(Agent):
         repeats = 0
         while repeats < 3:
             # check for drift
-            response = self.response_generator.generate_judgement(
-                template_filling, self.judged_solutions[-2], self.judged_solutions[-1]
-            )
+            with call_scope(self.id, CallType.JUDGE):
+                response = self.response_generator.generate_judgement(
+                    template_filling, self.judged_solutions[-2], self.judged_solutions[-1]
+                )
             if "[[A]]" in response.message:
                 return True     # answer_before is better
             if "[[B]]" in response.message:
@@ -99,10 +102,11 @@ class Judge(Agent):
             if self.intervention_type == "policy":
                 # Give the agents tips on how to improve their policy
                 logger.debug("Judge decided to give policy feedback.")
-                response = self.response_generator.generate_policy_intervention(
-                    template_filling,
-                    provide_labels=False
-                )
+                with call_scope(self.id, CallType.JUDGE):
+                    response = self.response_generator.generate_policy_intervention(
+                        template_filling,
+                        provide_labels=False
+                    )
                 memory = Memory(
                     message_id=unique_id,
                     turn=turn,
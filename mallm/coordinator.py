@@ -25,6 +25,13 @@ from mallm.utils.dicts import (
     PERSONA_GENERATORS,
     RESPONSE_GENERATORS,
 )
+from mallm.utils.enums import CallType
+from mallm.utils.tracking import (
+    DeadlineExceeded,
+    call_scope,
+    deadline_exceeded,
+    token_budget_exhausted,
+)
 from mallm.utils.types import (
     Agreement,
     ChallengeResult,
@@ -104,13 +111,14 @@ class Coordinator:
                 )
                 raise Exception("Invalid persona generator.")
 
-            persona = PERSONA_GENERATORS[agent_generator](
-                llm=self.llm
-            ).generate_persona(
-                task_description=f"{task_instruction} {input_str}",
-                already_generated_personas=personas,
-                sample=sample,
-            )
+            with call_scope(call_type=CallType.PERSONA):
+                persona = PERSONA_GENERATORS[agent_generator](
+                    llm=self.llm
+                ).generate_persona(
+                    task_description=f"{task_instruction} {input_str}",
+                    already_generated_personas=personas,
+                    sample=sample,
+                )
             personas.append(persona)
 
         logger.debug(f"Created {len(personas)} personas: \n" + str(personas))
@@ -287,69 +295,67 @@ class Coordinator:
 -------------"""
         )
 
-        answer, turn, agreements, decision_success, voting_results_per_turn = (
-            policy.discuss(
-                coordinator=self,
-                task_instruction=sample_instruction,
-                input_str=input_str,
-                config=config,
-                console=self.console,
-                solution=str(sample.references),
-            )
-        )
-
-        challenged_answers: ChallengeResult = ChallengeResult(
-            answer or "No answer was provided."
-        )
-        if config.challenge_final_results:
-            logger.info("Challenging final results...")
-            challenged_answers.additional_information = (
-                worker_functions.worker_context_function(input_str)
-            )
-            challenged_answers.wrong_answer = self.llm.invoke(
-                self.response_generator.generate_wrong_answer_prompt(
-                    sample_instruction, input_str
+        voting_results_per_turn: dict[int, Optional[VotingResultList]]
+        try:
+            answer, turn, agreements, decision_success, voting_results_per_turn = (
+                policy.discuss(
+                    coordinator=self,
+                    task_instruction=sample_instruction,
+                    input_str=input_str,
+                    config=config,
+                    console=self.console,
+                    solution=str(sample.references),
                 )
             )
-            challenged_answers.irrelevant_answer = "I) I don't know."
-
-            challenged_answers.challenged_answers = self.challenge_solution(
-                answer, input_str, sample_instruction, None, False
+        except DeadlineExceeded:
+            # A call of the current turn could not finish in time, so the discussion ends with the draft so far
+            logger.warning(
+                f"Stopping the discussion in turn {policy.turn} because its deadline of {config.max_discussion_seconds} seconds has passed."
             )
-            challenged_answers.challenged_answers_wrong = self.challenge_solution(
-                challenged_answers.wrong_answer,
-                input_str,
-                sample_instruction,
-                None,
+            answer, turn, agreements, decision_success, voting_results_per_turn = (
+                policy.draft or None,
+                policy.turn,
+                policy.agreements,
                 False,
+                {},
             )
-            challenged_answers.challenged_answers_irrelevant = self.challenge_solution(
-                challenged_answers.irrelevant_answer,
-                input_str,
-                sample_instruction,
-                None,
-                False,
+
+        challenged_answers: ChallengeResult = ChallengeResult(
+            answer or "No answer was provided."
+        )
+        if config.challenge_final_results and token_budget_exhausted(
+            config.max_discussion_tokens
+        ):
+            logger.warning(
+                "Skipping the challenge of the final results because the token budget of the discussion is used up."
             )
-            challenged_answers.challenged_answers_history = self.challenge_solution(
-                answer, input_str, sample_instruction, None, True
+        elif config.challenge_final_results and deadline_exceeded():
+            logger.warning(
+                "Skipping the challenge of the final results because the deadline of the discussion has passed."
             )
-            challenged_answers.challenged_answers_additional_information = (
-                self.challenge_solution(
+        elif config.challenge_final_results:
+            try:
+                self.challenge_final_results(
+                    challenged_answers,
                     answer,
                     input_str,
                     sample_instruction,
-                    challenged_answers.additional_information,
-                    False,
+                    worker_functions,
+                )
+            except DeadlineExceeded:
+                logger.warning(
+                    "Stopping the challenge of the final results because the deadline of the discussion has passed."
                 )
-            )
 
         discussion_time = timedelta(
             seconds=time.perf_counter() - start_time
         ).total_seconds()
 
-        self.console.save_html(
-            str(Path(config.output_json_file_path).with_suffix(".html")), clear=False
-        )
+        # Not recorded in the bounded memory mode
+        if self.console.record:
+            self.console.save_html(
+                str(Path(config.output_json_file_path).with_suffix(".html")), clear=False
+            )
 
         return (
             answer,
@@ -365,6 +371,59 @@ class Coordinator:
             self.judge.judged_solutions if self.judge else None,
         )
 
+    def challenge_final_results(
+        self,
+        challenged_answers: ChallengeResult,
+        answer: Optional[str],
+        input_str: str,
+        sample_instruction: str,
+        worker_functions: WorkerFunctions,
+    ) -> None:
+        """
+        Asks the agents whether they stick to the final answer when it is challenged, and fills in the challenged_answers.
+        """
+        logger.info("Challenging final results...")
+        challenged_answers.additional_information = (
+            worker_functions.worker_context_function(input_str)
+        )
+        with call_scope(call_type=CallType.CHALLENGE):
+            challenged_answers.wrong_answer = self.llm.invoke(
+                self.response_generator.generate_wrong_answer_prompt(
+                    sample_instruction, input_str
+                )
+            )
+        challenged_answers.irrelevant_answer = "I) I don't know."
+
+        challenged_answers.challenged_answers = self.challenge_solution(
+            answer, input_str, sample_instruction, None, False
+        )
+        challenged_answers.challenged_answers_wrong = self.challenge_solution(
+            challenged_answers.wrong_answer,
+            input_str,
+            sample_instruction,
+            None,
+            False,
+        )
+        challenged_answers.challenged_answers_irrelevant = self.challenge_solution(
+            challenged_answers.irrelevant_answer,
+            input_str,
+            sample_instruction,
+            None,
+            False,
+        )
+        challenged_answers.challenged_answers_history = self.challenge_solution(
+            answer, input_str, sample_instruction, None, True
+        )
+        challenged_answers.challenged_answers_additional_information = (
+            self.challenge_solution(
+                answer,
+                input_str,
+                sample_instruction,
+                challenged_answers.additional_information,
+                False,
+            )
+        )
+
     def challenge_solution(
         self,
         answer: Optional[str],
@@ -375,37 +434,39 @@ class Coordinator:
     ) -> dict[str, Optional[str]]:
         challenged_answers: dict[str, Optional[str]] = {}
         for panelist in self.panelists:
-            agreement = panelist.llm.invoke(
-                panelist.response_generator.generate_challenge_prompt(
-                    panelist,
-                    input_str,
-                    sample_instruction,
-                    (answer or "No answer was provided."),
-                    history,
-                    additional_information,
-                )
-            )
-            if "disagree" in agreement.lower():
-                challenge_result = panelist.llm.invoke(
-                    panelist.response_generator.generate_challenge_new_answer_prompt(
+            with call_scope(panelist.id, CallType.CHALLENGE):
+                agreement = panelist.llm.invoke(
+                    panelist.response_generator.generate_challenge_prompt(
                         panelist,
                         input_str,
                         sample_instruction,
                         (answer or "No answer was provided."),
                         history,
                         additional_information,
-                    )
+                    ),
+                    generation_profile="challenge",
                 )
-                logger.info(
-                    f"{panelist.persona} disagrees with the final result and proposes a new solution:\n{challenge_result}"
-                )
-                challenged_answers[panelist.id] = challenge_result
-            elif "agree" in agreement.lower():
-                logger.info(f"{panelist.persona} agrees with the final result.")
-                challenged_answers[panelist.id] = None
-            else:
-                logger.info(f"{panelist.persona} failed to challenge the final result.")
-                challenged_answers[panelist.id] = None
+                if "disagree" in agreement.lower():
+                    challenge_result = panelist.llm.invoke(
+                        panelist.response_generator.generate_challenge_new_answer_prompt(
+                            panelist,
+                            input_str,
+                            sample_instruction,
+                            (answer or "No answer was provided."),
+                            history,
+                            additional_information,
+                        )
+                    )
+                    logger.info(
+                        f"{panelist.persona} disagrees with the final result and proposes a new solution:\n{challenge_result}"
+                    )
+                    challenged_answers[panelist.id] = challenge_result
+                elif "agree" in agreement.lower():
+                    logger.info(f"{panelist.persona} agrees with the final result.")
+                    challenged_answers[panelist.id] = None
+                else:
+                    logger.info(f"{panelist.persona} failed to challenge the final result.")
+                    challenged_answers[panelist.id] = None
         return challenged_answers
 
     def get_memories(
@@ -1,4 +1,5 @@
 import logging
+import re
 from collections import Counter
 from typing import Any, Optional
 
@@ -7,7 +8,13 @@ from mallm.decision_protocols.protocol import DecisionProtocol
 from mallm.models.discussion.ResponseGenerator import ResponseGenerator
 from mallm.utils.config import Config
 from mallm.utils.enums import DecisionAlteration
-from mallm.utils.types import Agreement, VotingResult, VotingResultList, WorkerFunctions
+from mallm.utils.types import (
+    Agreement,
+    OutputConstraint,
+    VotingResult,
+    VotingResultList,
+    WorkerFunctions,
+)
 
 logger = logging.getLogger("mallm")
 
@@ -109,6 +116,13 @@ class ApprovalVoting(DecisionProtocol):
             logger.info("There was a tie. Going for another round of voting.")
         return all_votes
 
+    def vote_constraint(self, num_solutions: int) -> Optional[OutputConstraint]:
+        index = self.solution_index_pattern(num_solutions)
+        return OutputConstraint(name="approvals", regex=f"{index}(, ?{index})*")
+
+    def vote_complete(self, partial_vote: str) -> bool:  # noqa: PLR6301
+        return re.match(r"\s*\d+(\s*,\s*\d+)*[ \t]*\n", partial_vote) is not None
+
     def process_votes(
         self,
         final_answers: list[str],
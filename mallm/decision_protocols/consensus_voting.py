@@ -1,6 +1,7 @@
 import json
 import logging
 import random
+import re
 from collections import Counter
 from typing import Any, Optional
 
@@ -8,8 +9,15 @@ from mallm.agents.panelist import Panelist
 from mallm.decision_protocols.protocol import DecisionProtocol
 from mallm.models.discussion.ResponseGenerator import ResponseGenerator
 from mallm.utils.config import Config
-from mallm.utils.enums import DecisionAlteration
-from mallm.utils.types import Agreement, VotingResult, VotingResultList, WorkerFunctions
+from mallm.utils.enums import CallType, DecisionAlteration
+from mallm.utils.tracking import call_scope
+from mallm.utils.types import (
+    Agreement,
+    OutputConstraint,
+    VotingResult,
+    VotingResultList,
+    WorkerFunctions,
+)
 
 logger = logging.getLogger("mallm")
 
@@ -57,19 +65,25 @@ class ConsensusVoting(DecisionProtocol):
 
         final_answers = self.remove_duplicate_answers(final_answers)
 
+        vote_constraint = self.vote_constraint(len(final_answers))
         for panelist in self.panelists:
             retries = 0
             while retries < 10:
                 # Creates a prompt with all the answers and asks the agent to vote for the best one, 0 indexed inorder
-                vote = panelist.llm.invoke(
-                    ResponseGenerator.generate_voting_prompt(
-                        panelist=panelist,
-                        panelists=self.panelists,
-                        task=task,
-                        question=question,
-                        solutions=final_answers,
+                with call_scope(panelist.id, CallType.VOTE):
+                    vote = panelist.llm.invoke(
+                        ResponseGenerator.generate_voting_prompt(
+                            panelist=panelist,
+                            panelists=self.panelists,
+                            task=task,
+                            question=question,
+                            solutions=final_answers,
+                        ),
+                        output_constraint=vote_constraint,
+                        generation_profile="vote",
+                        is_complete=self.vote_complete,
+                        attempt=retries,
                     )
-                )
 
                 try:
                     vote, votes, success, voting_process_string = (
@@ -157,6 +171,14 @@ class ConsensusVoting(DecisionProtocol):
             logger.info("There was a tie. Selecting a random solution. agreed=false marks this unsuccessful decision.")
         return all_votes
 
+    def vote_constraint(self, num_solutions: int) -> Optional[OutputConstraint]:
+        return OutputConstraint(
+            name="vote", regex=self.solution_index_pattern(num_solutions)
+        )
+
+    def vote_complete(self, partial_vote: str) -> bool:  # noqa: PLR6301
+        return re.match(r"\s*\d+\D", partial_vote) is not None
+
     def process_votes(
         self,
         final_answers: list[str],
@@ -7,7 +7,14 @@ from mallm.decision_protocols.protocol import DecisionProtocol
 from mallm.models.discussion.ResponseGenerator import ResponseGenerator
 from mallm.utils.config import Config
 from mallm.utils.enums import DecisionAlteration
-from mallm.utils.types import Agreement, VotingResult, VotingResultList, WorkerFunctions
+from mallm.utils.functions import json_object_complete
+from mallm.utils.types import (
+    Agreement,
+    OutputConstraint,
+    VotingResult,
+    VotingResultList,
+    WorkerFunctions,
+)
 
 logger = logging.getLogger("mallm")
 
@@ -108,6 +115,23 @@ class CumulativeVoting(DecisionProtocol):
             logger.info("There was a tie. Going for another round of voting.")
         return all_votes
 
+    def vote_constraint(self, num_solutions: int) -> Optional[OutputConstraint]:  # noqa: PLR6301
+        return OutputConstraint(
+            name="points",
+            json_schema={
+                "type": "object",
+                "properties": {
+                    str(i): {"type": "integer", "minimum": 0, "maximum": 10}
+                    for i in range(num_solutions)
+                },
+                "required": [str(i) for i in range(num_solutions)],
+                "additionalProperties": False,
+            },
+        )
+
+    def vote_complete(self, partial_vote: str) -> bool:  # noqa: PLR6301
+        return json_object_complete(partial_vote)
+
     def process_votes(
         self,
         final_answers: list[str],
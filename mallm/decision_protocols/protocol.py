@@ -9,8 +9,15 @@ from sklearn.metrics.pairwise import cosine_similarity
 from mallm.agents.panelist import Panelist
 from mallm.models.discussion.ResponseGenerator import ResponseGenerator
 from mallm.utils.config import Config
-from mallm.utils.enums import DecisionAlteration
-from mallm.utils.types import Agreement, VotingResult, VotingResultList, WorkerFunctions
+from mallm.utils.enums import CallType, DecisionAlteration
+from mallm.utils.tracking import call_scope
+from mallm.utils.types import (
+    Agreement,
+    OutputConstraint,
+    VotingResult,
+    VotingResultList,
+    WorkerFunctions,
+)
 
 logger = logging.getLogger("mallm")
 
@@ -49,6 +56,22 @@ class DecisionProtocol(ABC):
         self.total_agents: int = len(panelists) + num_neutral_agents
         self.worker_functions = worker_functions
 
+    def vote_constraint(self, num_solutions: int) -> Optional[OutputConstraint]:  # noqa: PLR6301
+        """
+        Returns the format of a valid vote, so that endpoints with structured output only generate parseable votes.
+        """
+        return None
+
+    def vote_complete(self, partial_vote: str) -> bool:  # noqa: PLR6301
+        """
+        Returns whether a streamed vote is complete, so that the rest of the response is not generated.
+        """
+        return False
+
+    @staticmethod
+    def solution_index_pattern(num_solutions: int) -> str:
+        return "(" + "|".join(str(i) for i in range(num_solutions)) + ")"
+
     @staticmethod
     def remove_duplicate_answers(final_answers: list[str]) -> list[str]:
         '''
@@ -87,16 +110,18 @@ class DecisionProtocol(ABC):
                 nonlocal confidence
                 confidence = confidence_value
 
-            response = panelist.llm.invoke(
-                ResponseGenerator.generate_final_answer_prompt(
-                    question,
-                    task,
-                    prev_answer.solution,
-                    panelist.persona,
-                    panelist.persona_description,
-                ),
-                confidence_callback=confidence_callback,
-            )
+            with call_scope(panelist.id, CallType.FINAL_ANSWER):
+                response = panelist.llm.invoke(
+                    ResponseGenerator.generate_final_answer_prompt(
+                        question,
+                        task,
+                        prev_answer.solution,
+                        panelist.persona,
+                        panelist.persona_description,
+                    ),
+                    confidence_callback=confidence_callback,
+                    generation_profile="final_answer",
+                )
             prev_answer.solution = response
             final_answers_with_confidence.append((response, int(confidence * 100)))
             voting_process_string += f"{panelist.persona} final answer: {response}\n"
@@ -148,101 +173,123 @@ class DecisionProtocol(ABC):
                 confidences_consistency = self.get_consistency_confidences()
                 voting_process_string += f"\nConfidence: {confidences_consistency}\n"
             votes: Any = []
+            vote_kwargs: dict[str, Any] = {
+                "output_constraint": self.vote_constraint(len(final_answers)),
+                "generation_profile": "vote",
+                "is_complete": self.vote_complete,
+            }
             for panelist in panelists:
                 retries = 0
                 while retries < 10:
-                    # Creates a prompt with all the answers and asks the agent to vote for the best one, 0 indexed inorder
-                    if alteration == DecisionAlteration.ANONYMOUS:
-                        vote = panelist.llm.invoke(
-                            voting_prompt_function(
-                                panelist=panelist,
-                                panelists=self.panelists,
-                                task=task,
-                                question=question,
-                                solutions=final_answers,
+                    with call_scope(panelist.id, CallType.VOTE):
+                        # Creates a prompt with all the answers and asks the agent to vote for the best one, 0 indexed inorder
+                        if alteration == DecisionAlteration.ANONYMOUS:
+                            vote = panelist.llm.invoke(
+                                voting_prompt_function(
+                                    panelist=panelist,
+                                    panelists=self.panelists,
+                                    task=task,
+                                    question=question,
+                                    solutions=final_answers,
+                                ),
+                                **vote_kwargs,
+                                attempt=retries,
                             )
-                        )
-                    elif alteration == DecisionAlteration.FACTS:
-                        vote = panelist.llm.invoke(
-                            voting_prompt_function(
-                                panelist=panelist,
-                                panelists=self.panelists,
-                                task=task,
-                                question=question,
-                                solutions=final_answers,
-                                additional_context=facts,
+                        elif alteration == DecisionAlteration.FACTS:
+                            vote = panelist.llm.invoke(
+                                voting_prompt_function(
+                                    panelist=panelist,
+                                    panelists=self.panelists,
+                                    task=task,
+                                    question=question,
+                                    solutions=final_answers,
+                                    additional_context=facts,
+                                ),
+                                **vote_kwargs,
+                                attempt=retries,
                             )
-                        )
-                    elif alteration == DecisionAlteration.CONFIDENCE:
-                        vote = panelist.llm.invoke(
-                            voting_prompt_function(
-                                panelist=panelist,
-                                panelists=self.panelists,
-                                task=task,
-                                question=question,
-                                solutions=final_answers,
-                                confidence=confidences_static,
+                        elif alteration == DecisionAlteration.CONFIDENCE:
+                            vote = panelist.llm.invoke(
+                                voting_prompt_function(
+                                    panelist=panelist,
+                                    panelists=self.panelists,
+                                    task=task,
+                                    question=question,
+                                    solutions=final_answers,
+                                    confidence=confidences_static,
+                                ),
+                                **vote_kwargs,
+                                attempt=retries,
                             )
-                        )
-                    elif alteration == DecisionAlteration.CONFIDENCE_LOG_PROBS:
-                        vote = panelist.llm.invoke(
-                            voting_prompt_function(
-                                panelist=panelist,
-                                panelists=self.panelists,
-                                task=task,
-                                question=question,
-                                solutions=final_answers,
-                                confidence=confidences_log_prob,
+                        elif alteration == DecisionAlteration.CONFIDENCE_LOG_PROBS:
+                            vote = panelist.llm.invoke(
+                                voting_prompt_function(
+                                    panelist=panelist,
+                                    panelists=self.panelists,
+                                    task=task,
+                                    question=question,
+                                    solutions=final_answers,
+                                    confidence=confidences_log_prob,
+                                ),
+                                **vote_kwargs,
+                                attempt=retries,
                             )
-                        )
-                    elif alteration == DecisionAlteration.CONFIDENCE_PROMPTED:
-                        vote = panelist.llm.invoke(
-                            voting_prompt_function(
-                                panelist=panelist,
-                                panelists=self.panelists,
-                                task=task,
-                                question=question,
-                                solutions=final_answers,
-                                confidence=confidences_prompted,
+                        elif alteration == DecisionAlteration.CONFIDENCE_PROMPTED:
+                            vote = panelist.llm.invoke(
+                                voting_prompt_function(
+                                    panelist=panelist,
+                                    panelists=self.panelists,
+                                    task=task,
+                                    question=question,
+                                    solutions=final_answers,
+                                    confidence=confidences_prompted,
+                                ),
+                                **vote_kwargs,
+                                attempt=retries,
                             )
-                        )
-                    elif alteration == DecisionAlteration.CONFIDENCE_CONSISTENCY:
-                        vote = panelist.llm.invoke(
-                            voting_prompt_function(
-                                panelist=panelist,
-                                panelists=self.panelists,
-                                task=task,
-                                question=question,
-                                solutions=final_answers,
-                                confidence=confidences_consistency,
+                        elif alteration == DecisionAlteration.CONFIDENCE_CONSISTENCY:
+                            vote = panelist.llm.invoke(
+                                voting_prompt_function(
+                                    panelist=panelist,
+                                    panelists=self.panelists,
+                                    task=task,
+                                    question=question,
+                                    solutions=final_answers,
+                                    confidence=confidences_consistency,
+                                ),
+                                **vote_kwargs,
+                                attempt=retries,
                             )
-                        )
-                    elif alteration == DecisionAlteration.PUBLIC:
-                        vote = panelist.llm.invoke(
-                            voting_prompt_function(
-                                panelist=panelist,
-                                panelists=self.panelists,
-                                task=task,
-                                question=question,
-                                solutions=final_answers,
-                                anonymous=False,
+                        elif alteration == DecisionAlteration.PUBLIC:
+                            vote = panelist.llm.invoke(
+                                voting_prompt_function(
+                                    panelist=panelist,
+                                    panelists=self.panelists,
+                                    task=task,
+                                    question=question,
+                                    solutions=final_answers,
+                                    anonymous=False,
+                                ),
+                                **vote_kwargs,
+                                attempt=retries,
                             )
-                        )
-                    elif alteration == DecisionAlteration.HISTORY:
-                        vote = panelist.llm.invoke(
-                            voting_prompt_function(
-                                panelist=panelist,
-                                panelists=self.panelists,
-                                task=task,
-                                question=question,
-                                solutions=final_answers,
-                                history=True,
+                        elif alteration == DecisionAlteration.HISTORY:
+                            vote = panelist.llm.invoke(
+                                voting_prompt_function(
+                                    panelist=panelist,
+                                    panelists=self.panelists,
+                                    task=task,
+                                    question=question,
+                                    solutions=final_answers,
+                                    history=True,
+                                ),
+                                **vote_kwargs,
+                                attempt=retries,
+                            )
+                        else:
+                            raise ValueError(
+                                f"Unknown DecisionAlteration type: {alteration.value}"
                             )
-                        )
-                    else:
-                        raise ValueError(
-                            f"Unknown DecisionAlteration type: {alteration.value}"
-                        )
                     try:
                         vote, votes, success, voting_process_string = (
                             self.process_votes(
@@ -304,11 +351,17 @@ class DecisionProtocol(ABC):
             retries = 0
             confidence_score = None
             while retries < 10:
-                confidence_prompted = panelist.llm.invoke(
-                    ResponseGenerator.generate_answer_confidence_prompt(
-                        panelist, question, task, final_answer
+                with call_scope(panelist.id, CallType.CONFIDENCE):
+                    confidence_prompted = panelist.llm.invoke(
+                        ResponseGenerator.generate_answer_confidence_prompt(
+                            panelist, question, task, final_answer
+                        ),
+                        output_constraint=OutputConstraint(
+                            name="confidence", regex="100|[1-9]?[0-9]"
+                        ),
+                        generation_profile="confidence",
+                        attempt=retries,
                     )
-                )
                 try:
                     confidence_score = int(confidence_prompted.strip())
                     if 0 <= confidence_score <= 100:
@@ -1,4 +1,5 @@
 import logging
+import re
 from typing import Any, Optional
 
 from mallm.agents.panelist import Panelist
@@ -6,7 +7,13 @@ from mallm.decision_protocols.protocol import DecisionProtocol
 from mallm.models.discussion.ResponseGenerator import ResponseGenerator
 from mallm.utils.config import Config
 from mallm.utils.enums import DecisionAlteration
-from mallm.utils.types import Agreement, VotingResult, VotingResultList, WorkerFunctions
+from mallm.utils.types import (
+    Agreement,
+    OutputConstraint,
+    VotingResult,
+    VotingResultList,
+    WorkerFunctions,
+)
 
 logger = logging.getLogger("mallm")
 
@@ -110,6 +117,15 @@ class RankedVoting(DecisionProtocol):
             logger.info("There was a tie. Going for another round of voting.")
         return all_votes
 
+    def vote_constraint(self, num_solutions: int) -> Optional[OutputConstraint]:
+        index = self.solution_index_pattern(num_solutions)
+        return OutputConstraint(
+            name="ranking", regex=f"{index}( {index}){{0,{min(num_solutions, 5) - 1}}}"
+        )
+
+    def vote_complete(self, partial_vote: str) -> bool:  # noqa: PLR6301
+        return re.match(r"\s*\d+( +\d+)*[ \t]*\n", partial_vote) is not None
+
     def process_votes(
         self,
         final_answers: list[str],
@@ -84,9 +84,7 @@ class CollectiveRefinement(DiscussionParadigm):
                 """
         )
 
-        while (
-            not self.decision or config.skip_decision_making
-        ) and self.turn < config.max_turns:
+        while self.continue_discussion(config):
             self.turn += 1
             logger.debug("Ongoing. Current turn: " + str(self.turn))
 
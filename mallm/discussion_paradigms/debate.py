@@ -76,9 +76,7 @@ class DiscussionDebate(DiscussionParadigm):
             "Debate rounds between agents A2, ..., An: " + str(config.debate_rounds)
         )
 
-        while (
-            not self.decision or config.skip_decision_making
-        ) and self.turn < config.max_turns:
+        while self.continue_discussion(config):
             self.turn += 1
             logger.debug("Ongoing. Current turn: " + str(self.turn))
 
@@ -11,6 +11,11 @@ from rich.text import Text
 from mallm.agents.draftProposer import DraftProposer
 from mallm.agents.judge import Judge
 from mallm.agents.panelist import Panelist
+from mallm.utils.tracking import (
+    current_discussion_progress,
+    deadline_exceeded,
+    token_budget_exhausted,
+)
 from mallm.utils.types import Agreement, Memory, TemplateFilling, VotingResultList
 
 if TYPE_CHECKING:
@@ -46,9 +51,7 @@ class DiscussionParadigm(ABC):
 
         if console is None:
             console = Console()
-        while (
-            not self.decision or config.skip_decision_making
-        ) and self.turn < config.max_turns:
+        while self.continue_discussion(config):
             self.turn += 1
             logger.debug(f"Ongoing. Current turn: {self.turn}")
 
@@ -150,6 +153,30 @@ class DiscussionParadigm(ABC):
             voting_results_per_turn,
         )
 
+    def continue_discussion(self, config: Config) -> bool:
+        """
+        Returns whether the discussion continues with another turn.
+        The discussion stops once a decision is reached, the maximum number of turns is over, the token budget is used up or the deadline has passed.
+        """
+        progress = current_discussion_progress()
+        if progress is not None:
+            progress.turn = self.turn
+        if (
+            self.decision and not config.skip_decision_making
+        ) or self.turn >= config.max_turns:
+            return False
+        if token_budget_exhausted(config.max_discussion_tokens):
+            logger.warning(
+                f"Stopping the discussion after {self.turn} turns because its budget of {config.max_discussion_tokens} tokens is used up."
+            )
+            return False
+        if deadline_exceeded():
+            logger.warning(
+                f"Stopping the discussion after {self.turn} turns because its deadline of {config.max_discussion_seconds} seconds has passed."
+            )
+            return False
+        return True
+
     def print_messages(
         self,
         coordinator: Coordinator,
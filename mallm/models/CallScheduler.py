@@ -0,0 +1,121 @@
+import heapq
+import itertools
+import logging
+import time
+from typing import Optional
+
+from mallm.utils.enums import CallPriority, CallType
+from mallm.utils.gate import Gate
+from mallm.utils.tracking import current_call_scope, current_discussion_progress
+
+logger = logging.getLogger("mallm")
+
+
+class CallScheduler(Gate):
+    """
+    Lets at most max_concurrent_calls LLM calls of all discussions run at the same time and orders the waiting calls by a policy.
+
+    oldest_discussion: The calls of the discussion that started first go first.
+    closest_to_completion: The calls of the discussion with the largest share of its turns done go first. Votes and final
+    answers count as half a turn, since they finish the current turn.
+    fifo: The calls go in the order they arrive.
+    Preferring the discussions in flight over new ones finishes each discussion sooner, so that fewer discussions hold
+    their memories at the same time. Calls outside of a discussion, e.g. of the baseline, rank like a discussion that
+    just started.
+    """
+
+    def __init__(self, policy: CallPriority, max_concurrent_calls: int) -> None:
+        super().__init__()
+        self.policy = policy
+        self.max_concurrent_calls = max_concurrent_calls
+        self.in_flight = 0
+        self.calls = 0
+        self.waited_calls = 0
+        self.max_wait = 0.0
+        self._waiting: list[tuple[tuple[float, ...], int]] = []
+        self._sequence = itertools.count()
+
+    def acquire(self) -> None:
+        """
+        Waits until the call is the one with the highest priority and a slot is free.
+        """
+        entry = self._enqueue()
+        started = time.monotonic()
+        try:
+            self.wait_for(lambda: self._take(entry))
+        except BaseException:
+            self._dequeue(entry)
+            raise
+        self._record_wait(started)
+
+    async def aacquire(self) -> None:
+        """
+        Waits without blocking the event loop until the call is the one with the highest priority and a slot is free.
+        """
+        entry = self._enqueue()
+        started = time.monotonic()
+        try:
+            await self.await_for(lambda: self._take(entry))
+        except BaseException:
+            self._dequeue(entry)
+            raise
+        self._record_wait(started)
+
+    def release(self) -> None:
+        with self._lock:
+            self.in_flight -= 1
+            # Only the waiting call with the highest priority may take the slot, so all of them check
+            self.notify_all()
+
+    def priority(self) -> tuple[float, ...]:
+        """
+        Returns the sort key of a call made in the current context. Lower keys go first.
+        """
+        progress = current_discussion_progress()
+        now = time.monotonic()
+        started = progress.started if progress is not None else now
+        if self.policy == CallPriority.OLDEST_DISCUSSION:
+            return (started,)
+        if self.policy == CallPriority.CLOSEST_TO_COMPLETION:
+            if progress is None:
+                return (0.0, started)
+            _, call_type = current_call_scope()
+            turns = progress.turn + (
+                0.5 if call_type in {CallType.VOTE, CallType.FINAL_ANSWER} else 0.0
+            )
+            return (-turns / max(progress.max_turns, 1), started)
+        return (now,)
+
+    def log_statistics(self) -> None:
+        logger.info(
+            f"Call scheduling ({self.policy.value}): {self.waited_calls} of {self.calls} calls waited for a slot, the longest for {self.max_wait:.2f} seconds."
+        )
+
+    def _enqueue(self) -> tuple[tuple[float, ...], int]:
+        entry = (self.priority(), next(self._sequence))
+        with self._lock:
+            heapq.heappush(self._waiting, entry)
+        return entry
+
+    def _dequeue(self, entry: tuple[tuple[float, ...], int]) -> None:
+        with self._lock:
+            if entry in self._waiting:
+                self._waiting.remove(entry)
+                heapq.heapify(self._waiting)
+                self.notify_all()
+
+    def _take(self, entry: tuple[tuple[float, ...], int]) -> Optional[bool]:
+        if self.in_flight >= self.max_concurrent_calls or self._waiting[0] != entry:
+            return None
+        heapq.heappop(self._waiting)
+        self.in_flight += 1
+        return True
+
+    def _record_wait(self, started: float) -> None:
+        wait = time.monotonic() - started
+        with self._lock:
+            self.calls += 1
+            # Waits below a millisecond only measure the bookkeeping
+            if wait > 0.001:
+                self.waited_calls += 1
+                self.max_wait = max(self.max_wait, wait)
@@ -0,0 +1,131 @@
+import asyncio
+import json
+import logging
+import threading
+import time
+from collections import defaultdict, deque
+from collections.abc import AsyncIterator, Iterator
+from typing import Any
+
+from openai.types.chat import ChatCompletionChunk
+
+from mallm.models.ResponseCache import ResponseCache
+from mallm.utils.enums import CassetteMode
+
+logger = logging.getLogger("mallm")
+
+# Fields that are identical for all chunks of a response and are stored only once
+_SHARED_CHUNK_FIELDS = ("id", "created", "model", "object", "system_fingerprint")
+
+
+class Cassette:
+    """
+    Records the streamed responses of all LLM requests to a JSONL file and replays them without a network connection.
+
+    Each line of the cassette holds one response: the request key, the streamed chunks (including logprobs) and the time
+    at which each chunk arrived, measured from the start of the request.
+    Identical requests are replayed in the order in which they were recorded.
+    """
+
+    def __init__(self, path: str, mode: CassetteMode, keep_latency: bool = True) -> None:
+        self.path = path
+        self.mode = mode
+        self.keep_latency = keep_latency
+        self._lock = threading.Lock()
+        self._responses: dict[str, deque[dict[str, Any]]] = defaultdict(deque)
+        if mode == CassetteMode.RECORD:
+            self._file = open(path, "w")
+        else:
+            with open(path) as file:
+                for line in file:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self._responses[entry["key"]].append(entry)
+            logger.info(
+                f"Loaded {sum(len(r) for r in self._responses.values())} recorded responses from {path}."
+            )
+
+    def record(
+        self, request: dict[str, Any], stream: Iterator[ChatCompletionChunk], start_time: float
+    ) -> Iterator[ChatCompletionChunk]:
+        """
+        Passes the chunks of a stream through and writes them to the cassette once the stream is complete.
+        """
+        chunks = []
+        for chunk in stream:
+            chunks.append(self._compact(chunk, start_time))
+            yield chunk
+        self._write(request, chunks)
+
+    async def arecord(
+        self, request: dict[str, Any], stream: AsyncIterator[ChatCompletionChunk], start_time: float
+    ) -> AsyncIterator[ChatCompletionChunk]:
+        """
+        Passes the chunks of an async stream through and writes them to the cassette once the stream is complete.
+        """
+        chunks = []
+        async for chunk in stream:
+            chunks.append(self._compact(chunk, start_time))
+            yield chunk
+        self._write(request, chunks)
+
+    def replay(self, request: dict[str, Any]) -> Iterator[ChatCompletionChunk]:
+        """
+        Streams the recorded response of a request.
+        """
+        start_time = time.perf_counter()
+        shared, chunks = self._next_response(request)
+        for offset, chunk in chunks:
+            if self.keep_latency:
+                time.sleep(max(0.0, offset - (time.perf_counter() - start_time)))
+            yield ChatCompletionChunk.model_validate({**shared, **chunk})
+
+    async def areplay(self, request: dict[str, Any]) -> AsyncIterator[ChatCompletionChunk]:
+        """
+        Streams the recorded response of a request without blocking the event loop.
+        """
+        start_time = time.perf_counter()
+        shared, chunks = self._next_response(request)
+        for offset, chunk in chunks:
+            if self.keep_latency:
+                await asyncio.sleep(max(0.0, offset - (time.perf_counter() - start_time)))
+            yield ChatCompletionChunk.model_validate({**shared, **chunk})
+
+    def close(self) -> None:
+        if self.mode == CassetteMode.RECORD:
+            with self._lock:
+                self._file.close()
+
+    def _next_response(self, request: dict[str, Any]) -> tuple[dict[str, Any], list[tuple[float, dict[str, Any]]]]:
+        key = ResponseCache.key(request)
+        with self._lock:
+            if not self._responses[key]:
+                logger.error(
+                    f"The cassette {self.path} contains no (further) response for this request. Please record the run again."
+                )
+                raise Exception("No recorded response for the request.")
+            entry = self._responses[key].popleft()
+        return entry["shared"], entry["chunks"]
+
+    @staticmethod
+    def _compact(chunk: ChatCompletionChunk, start_time: float) -> tuple[float, dict[str, Any]]:
+        return (
+            round(time.perf_counter() - start_time, 4),
+            chunk.model_dump(exclude_none=True, exclude_unset=True),
+        )
+
+    def _write(self, request: dict[str, Any], chunks: list[tuple[float, dict[str, Any]]]) -> None:
+        shared = {}
+        if chunks:
+            shared = {k: chunks[0][1][k] for k in _SHARED_CHUNK_FIELDS if k in chunks[0][1]}
+        entry = {
+            "key": ResponseCache.key(request),
+            "shared": shared,
+            "chunks": [
+                (offset, {k: v for k, v in chunk.items() if k not in shared})
+                for offset, chunk in chunks
+            ],
+        }
+        with self._lock:
+            self._file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            self._file.flush()
@@ -1,18 +1,60 @@
+import asyncio
+import contextvars
+import dataclasses
 import logging
 import math
+import threading
 import time
-from collections.abc import Iterator
-from typing import Any, Optional, Union, cast
+from collections.abc import AsyncIterator, Iterator
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, Callable, ClassVar, Optional, Union, cast
 
 logger = logging.getLogger("mallm")
 
+import httpx
 from langchain_core.callbacks import Callbacks
-from langchain_core.callbacks.manager import CallbackManagerForLLMRun
+from langchain_core.callbacks.manager import (
+    AsyncCallbackManagerForLLMRun,
+    CallbackManagerForLLMRun,
+)
 from langchain_core.language_models import LanguageModelInput
 from langchain_core.language_models.llms import LLM
 from langchain_core.outputs import LLMResult
 from langchain_core.prompt_values import PromptValue
-from openai import APIError, RateLimitError, OpenAI
+from langchain_core.pydantic_v1 import Field
+from openai import APIError, AsyncOpenAI, OpenAI
+from openai.types.chat import ChatCompletion, ChatCompletionChunk
+
+from mallm.models.batch.BatchCollector import BatchCollector
+from mallm.models.CallScheduler import CallScheduler
+from mallm.models.Cassette import Cassette
+from mallm.models.ConcurrencyLimiter import ConcurrencyLimiter, ConcurrencySlot
+from mallm.models.EndpointPool import Endpoint, EndpointPool
+from mallm.models.LatencyTracker import LatencyTracker
+from mallm.models.RateLimiter import RateLimiter
+from mallm.models.ResponseCache import ResponseCache
+from mallm.models.RetryPolicy import RetryPolicy
+from mallm.utils.async_bridge import await_only, in_async_bridge
+from mallm.utils.enums import CassetteMode, StructuredOutput
+from mallm.utils.functions import token_counter
+from mallm.utils.generation_profiles import GENERATION_PROFILES
+from mallm.utils.tracking import check_deadline, current_call_scope, current_call_statistics
+from mallm.utils.types import (
+    CallStatistics,
+    GenerationProfile,
+    OutputConstraint,
+    TokenUsage,
+)
+
+_statistics_lock = threading.Lock()
+# Threads that run the competing attempts of hedged synchronous calls, created on demand
+_hedge_executor = ThreadPoolExecutor(max_workers=1024, thread_name_prefix="mallm-hedge")
+
+
+class _HedgeCancelled(Exception):
+    """Stops the attempt of a hedged call that lost the race."""
+
 
 class Chat(LLM):    # type: ignore
     """A custom chat model that queries the chat API of HuggingFace Text Generation Inference
@@ -33,7 +75,11 @@ class Chat(LLM):    # type: ignore
     """
 
     client: OpenAI
-    timeout: int = 120
+    async_client: Optional[AsyncOpenAI] = None
+    # Seconds to establish a connection, to wait for the next chunk of a stream and for a whole attempt of a call
+    connect_timeout: float = 10.0
+    read_timeout: float = 60.0
+    timeout: float = 300.0
     model: str = "gpt-3.5-turbo"
     stop_tokens: list[str] = [
         "<|start_header_id|>",
@@ -42,6 +88,24 @@ class Chat(LLM):    # type: ignore
         "<|reserved_special_token",
     ]
     max_tokens: int = 1024
+    generation_profiles: dict[str, GenerationProfile] = Field(default_factory=lambda: dict(GENERATION_PROFILES))
+    context_window: Optional[int] = None
+    tokenizer: Optional[str] = None
+    retry_policy: RetryPolicy = RetryPolicy()
+    response_cache: Optional[ResponseCache] = None
+    cassette: Optional[Cassette] = None
+    endpoint_pool: Optional[EndpointPool] = None
+    concurrency_limiter: Optional[ConcurrencyLimiter] = None
+    call_scheduler: Optional[CallScheduler] = None
+    rate_limiter: Optional[RateLimiter] = None
+    latency_tracker: Optional[LatencyTracker] = None
+    stream_usage: bool = True
+    structured_output: Optional[StructuredOutput] = None
+    batch_collector: Optional[BatchCollector] = None
+    call_statistics: CallStatistics = Field(default_factory=CallStatistics)
+
+    # Tokens of the chat template around each message (role and separators)
+    MESSAGE_OVERHEAD: ClassVar[int] = 4
 
     # Overwrite to send direct chat structure to tgi endpoint
     def _convert_input(self, input: LanguageModelInput) -> PromptValue:
@@ -58,6 +122,16 @@ class Chat(LLM):    # type: ignore
         # this is a wrong cast, but we need it because we use a custom call function which can handle this
         return self.generate(prompts, stop=stop, callbacks=callbacks, **kwargs)
 
+    # Overwrite to send direct chat structure to tgi endpoint
+    async def agenerate_prompt(
+        self,
+        prompts: list[PromptValue],
+        stop: Optional[list[str]] = None,
+        callbacks: Optional[Union[Callbacks, list[Callbacks]]] = None,
+        **kwargs: Any,
+    ) -> LLMResult:
+        return await self.agenerate(prompts, stop=stop, callbacks=callbacks, **kwargs)
+
     @staticmethod
     def merge_consecutive_messages(
         messages: list[dict[str, str]]
@@ -109,44 +183,711 @@ class Chat(LLM):    # type: ignore
         Returns:
             The model output as a string. Actual completions SHOULD NOT include the prompt.
         """
-        merged_messages = self.merge_consecutive_messages(prompt)
-        retries = 0
-        while retries < 5:
+        profile = self._generation_profile(kwargs.get("generation_profile", "default"))
+        prompt, trimmed_tokens = self._fit_context_window(prompt, profile.max_tokens)
+        request = self._completion_request(prompt, kwargs.get("output_constraint"), profile)
+        cached_response = self._cached_response(request, **kwargs)
+        if cached_response is not None:
+            return cached_response
+
+        statistics = CallStatistics(calls=1, trimmed_prompts=int(trimmed_tokens > 0), trimmed_tokens=trimmed_tokens)
+        latency_key = self._latency_key()
+        try:
+            if self.batch_collector is not None and in_async_bridge():
+                return await_only(self._abatch_complete(request, statistics, **kwargs))
+            if self.async_client is not None and in_async_bridge():
+                # Running on the event loop of the async scheduler: hand the request over instead of blocking
+                return await_only(self._acomplete(request, statistics, latency_key, **kwargs))
+            return self._complete(request, statistics, latency_key, **kwargs)
+        except Exception:
+            statistics.failed_calls += 1
+            raise
+        finally:
+            self._record_statistics(statistics)
+
+    async def _acall(  # type: ignore
+        self,
+        prompt,
+        stop: Optional[list[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> str:
+        """Run the LLM on the given input using the AsyncOpenAI client.
+
+        Falls back to running the synchronous _call in an executor if no async client is configured.
+
+        Args:
+            prompt: The prompt to generate from.
+            stop: Stop words to use when generating.
+            run_manager: Callback manager for the run.
+            **kwargs: Arbitrary additional keyword arguments.
+
+        Returns:
+            The model output as a string. Actual completions SHOULD NOT include the prompt.
+        """
+        if self.async_client is None:
+            return cast(str, await super()._acall(prompt, stop=stop, run_manager=run_manager, **kwargs))
+
+        profile = self._generation_profile(kwargs.get("generation_profile", "default"))
+        prompt, trimmed_tokens = self._fit_context_window(prompt, profile.max_tokens)
+        request = self._completion_request(prompt, kwargs.get("output_constraint"), profile)
+        cached_response = self._cached_response(request, **kwargs)
+        if cached_response is not None:
+            return cached_response
+
+        statistics = CallStatistics(calls=1, trimmed_prompts=int(trimmed_tokens > 0), trimmed_tokens=trimmed_tokens)
+        try:
+            if self.batch_collector is not None:
+                return await self._abatch_complete(request, statistics, **kwargs)
+            return await self._acomplete(request, statistics, self._latency_key(), **kwargs)
+        except Exception:
+            statistics.failed_calls += 1
+            raise
+        finally:
+            self._record_statistics(statistics)
+
+    def _complete(self, request: dict[str, Any], statistics: CallStatistics, latency_key: str, **kwargs: Any) -> str:
+        """Queries the chat API and sends a duplicate request if the call takes unusually long."""
+        started = time.monotonic()
+        threshold = self._hedge_threshold(latency_key)
+        if threshold is None:
+            collected_messages, log_prob_sum, statistics.usage = self._request_with_retries(
+                request, statistics, is_complete=kwargs.get("is_complete")
+            )
+        else:
+            collected_messages, log_prob_sum, statistics.usage = self._hedged_request(
+                request, statistics, threshold, kwargs.get("is_complete")
+            )
+        if self.latency_tracker is not None:
+            self.latency_tracker.record(latency_key, time.monotonic() - started)
+        return self._finish(request, collected_messages, log_prob_sum, **kwargs)
+
+    async def _acomplete(self, request: dict[str, Any], statistics: CallStatistics, latency_key: str, **kwargs: Any) -> str:
+        """Queries the chat API with the async client and sends a duplicate request if the call takes unusually long."""
+        started = time.monotonic()
+        threshold = self._hedge_threshold(latency_key)
+        if threshold is None:
+            collected_messages, log_prob_sum, statistics.usage = await self._arequest_with_retries(
+                request, statistics, kwargs.get("is_complete")
+            )
+        else:
+            collected_messages, log_prob_sum, statistics.usage = await self._ahedged_request(
+                request, statistics, threshold, kwargs.get("is_complete")
+            )
+        if self.latency_tracker is not None:
+            self.latency_tracker.record(latency_key, time.monotonic() - started)
+        return self._finish(request, collected_messages, log_prob_sum, **kwargs)
+
+    async def _abatch_complete(self, request: dict[str, Any], statistics: CallStatistics, **kwargs: Any) -> str:
+        """Waits for the response to a request that is executed with the next batch of the batch collector."""
+        assert self.batch_collector is not None
+        body = await self.batch_collector.submit(request)
+        choice = body["choices"][0]
+        response = choice["message"]["content"] or ""
+        log_probs = [token["logprob"] for token in ((choice.get("logprobs") or {}).get("content") or [])]
+        usage = body.get("usage")
+        if usage is not None:
+            statistics.usage = TokenUsage(prompt_tokens=usage["prompt_tokens"], completion_tokens=usage["completion_tokens"])
+        else:
+            statistics.usage = TokenUsage(prompt_tokens=self._estimate_prompt_tokens(request), completion_tokens=len(log_probs))
+        log_prob = sum(log_probs) / len(log_probs) if log_probs else 0.0
+        return self._finish(request, [response] if response else [], log_prob, **kwargs)
+
+    def _request_with_retries(
+        self,
+        request: dict[str, Any],
+        statistics: CallStatistics,
+        cancelled: Optional[threading.Event] = None,
+        is_complete: Optional[Callable[[str], bool]] = None,
+    ) -> tuple[list[str], float, TokenUsage]:
+        """Streams the response of a request and retries failed requests according to the retry policy.
+
+        Returns the collected chunks, the sum of their log probabilities and the token usage. Stops early once cancelled is set.
+        The stream is closed as soon as is_complete accepts the response received so far.
+        """
+        endpoint = None
+        while True:
+            reserved_tokens = self._acquire_quota(request)
             try:
-                chat_completion = self.client.chat.completions.create(
-                    model=self.model,
-                    messages=merged_messages,
-                    stream=True,
-                    stop=self.stop_tokens,
-                    max_tokens=self.max_tokens,
-                    logprobs=True,
-                )
-                # iterate and print stream
-                collected_messages = []
-                log_prob_sum = 0.0
-                for message in chat_completion:
-                    message_str = message.choices[0].delta.content
-                    if message.choices[0].logprobs:
-                        log_prob_sum += message.choices[0].logprobs.content[0].logprob
-                    if message_str and message_str not in self.stop_tokens:
-                        collected_messages.append(message_str)
-                log_prob_sum = log_prob_sum / len(collected_messages)
+                # A retry is routed to a different endpoint than the failed attempt if possible
+                with self._schedule_call(), self._limit_concurrency() as slot, self._use_endpoint(
+                    exclude=endpoint
+                ) as endpoint:
+                    attempt_started = time.monotonic()
+                    attempt_timeout = self._attempt_timeout()
+                    chat_completion = self._open_stream(request, endpoint, attempt_timeout, is_complete)
+                    # iterate and print stream
+                    collected_messages: list[str] = []
+                    log_prob_sum = 0.0
+                    usage = None
+                    for message in chat_completion:
+                        if cancelled is not None and cancelled.is_set():
+                            getattr(chat_completion, "close", lambda: None)()
+                            raise _HedgeCancelled()
+                        if time.monotonic() - attempt_started > attempt_timeout:
+                            getattr(chat_completion, "close", lambda: None)()
+                            check_deadline()
+                            raise httpx.ReadTimeout(f"The response took longer than {attempt_timeout:.1f} seconds.")
+                        if request["stream"]:
+                            # The latency of a response that is not streamed includes its generation
+                            slot.first_token()
+                        log_prob_sum += self._collect_chunk(message, collected_messages)
+                        usage = message.usage or usage
                 break
-            except APIError as e:
-                # Handle API error here, e.g. retry or log
-                retries += 1
-                if retries < 5:
-                    logger.warning(
-                        f"API returned an Error: {e}. Retry number {retries}..."
-                    )
-                    time.sleep(3)
-                else:
-                    logger.error(f" {e}: Exceeded maximum retries. This sample failed.")
-                    raise Exception("Exceeded maximum API retries.")
+            except (APIError, httpx.TransportError) as e:
+                delay = self._retry_delay(e, statistics)
+                # Gives up instead of waiting for a retry that cannot finish before the deadline
+                check_deadline(delay)
+                time.sleep(delay)
+                if cancelled is not None and cancelled.is_set():
+                    raise _HedgeCancelled() from e
+        token_usage = self._token_usage(request, usage, collected_messages)
+        if self.rate_limiter is not None:
+            self.rate_limiter.settle(reserved_tokens, token_usage.total_tokens)
+        return collected_messages, log_prob_sum, token_usage
+
+    async def _arequest_with_retries(
+        self,
+        request: dict[str, Any],
+        statistics: CallStatistics,
+        is_complete: Optional[Callable[[str], bool]] = None,
+    ) -> tuple[list[str], float, TokenUsage]:
+        """Streams the response of a request with the async client and retries failed requests according to the retry policy."""
+        endpoint = None
+        while True:
+            reserved_tokens = await self._aacquire_quota(request)
+            try:
+                async with self._aschedule_call(), self._alimit_concurrency() as slot, self._ause_endpoint(
+                    exclude=endpoint
+                ) as endpoint:
+                    attempt_started = time.monotonic()
+                    attempt_timeout = self._attempt_timeout()
+                    chat_completion = await self._aopen_stream(request, endpoint, attempt_timeout, is_complete)
+                    collected_messages: list[str] = []
+                    log_prob_sum = 0.0
+                    usage = None
+                    async for message in chat_completion:
+                        if time.monotonic() - attempt_started > attempt_timeout:
+                            await self._aclose_stream(chat_completion)
+                            check_deadline()
+                            raise httpx.ReadTimeout(f"The response took longer than {attempt_timeout:.1f} seconds.")
+                        if request["stream"]:
+                            slot.first_token()
+                        log_prob_sum += self._collect_chunk(message, collected_messages)
+                        usage = message.usage or usage
+                break
+            except (APIError, httpx.TransportError) as e:
+                delay = self._retry_delay(e, statistics)
+                check_deadline(delay)
+                await asyncio.sleep(delay)
+        token_usage = self._token_usage(request, usage, collected_messages)
+        if self.rate_limiter is not None:
+            self.rate_limiter.settle(reserved_tokens, token_usage.total_tokens)
+        return collected_messages, log_prob_sum, token_usage
+
+    def _hedged_request(
+        self,
+        request: dict[str, Any],
+        statistics: CallStatistics,
+        threshold: float,
+        is_complete: Optional[Callable[[str], bool]] = None,
+    ) -> tuple[list[str], float, TokenUsage]:
+        """Sends a duplicate request once the first one took longer than threshold seconds and returns the response that finishes first.
+
+        The attempts run on separate threads, so each counts its retries separately and only the statistics of the attempt whose result is returned or raised are kept.
+        """
+        cancel_events = [threading.Event(), threading.Event()]
+        attempt_statistics = [CallStatistics(), CallStatistics()]
+        attempts = [
+            _hedge_executor.submit(
+                contextvars.copy_context().run,
+                self._request_with_retries,
+                request,
+                attempt_statistics[0],
+                cancel_events[0],
+                is_complete,
+            )
+        ]
+        done, _ = wait(attempts, timeout=threshold)
+        if done:
+            statistics.merge(attempt_statistics[0])
+            return attempts[0].result()
+        statistics.hedged_calls += 1
+        logger.debug(f"Request took longer than {threshold:.1f}s, sending a hedged request.")
+        attempts.append(
+            _hedge_executor.submit(
+                contextvars.copy_context().run,
+                self._request_with_retries,
+                request,
+                attempt_statistics[1],
+                cancel_events[1],
+                is_complete,
+            )
+        )
+        pending = set(attempts)
+        error: Optional[BaseException] = None
+        try:
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                finished = [attempt for attempt in done if attempt.exception() is None]
+                if finished:
+                    if finished[0] is attempts[1]:
+                        statistics.hedge_wins += 1
+                    statistics.merge(attempt_statistics[attempts.index(finished[0])])
+                    return finished[0].result()
+                if error is None:
+                    failed = next(iter(done))
+                    error = failed.exception()
+                    error_statistics = attempt_statistics[attempts.index(failed)]
+            assert error is not None
+            statistics.merge(error_statistics)
+            raise error
+        finally:
+            for event in cancel_events:
+                event.set()
+
+    async def _ahedged_request(
+        self,
+        request: dict[str, Any],
+        statistics: CallStatistics,
+        threshold: float,
+        is_complete: Optional[Callable[[str], bool]] = None,
+    ) -> tuple[list[str], float, TokenUsage]:
+        """Sends a duplicate request once the first one took longer than threshold seconds and cancels the slower one.
+
+        Like the synchronous attempts, each attempt counts its retries separately.
+        """
+        attempt_statistics = [CallStatistics(), CallStatistics()]
+        attempts = [asyncio.ensure_future(self._arequest_with_retries(request, attempt_statistics[0], is_complete))]
+        try:
+            done, _ = await asyncio.wait(attempts, timeout=threshold)
+            if done:
+                statistics.merge(attempt_statistics[0])
+                return attempts[0].result()
+            statistics.hedged_calls += 1
+            logger.debug(f"Request took longer than {threshold:.1f}s, sending a hedged request.")
+            attempts.append(asyncio.ensure_future(self._arequest_with_retries(request, attempt_statistics[1], is_complete)))
+            pending = set(attempts)
+            error: Optional[BaseException] = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                finished = [attempt for attempt in done if attempt.exception() is None]
+                if finished:
+                    if finished[0] is attempts[1]:
+                        statistics.hedge_wins += 1
+                    statistics.merge(attempt_statistics[attempts.index(finished[0])])
+                    return finished[0].result()
+                if error is None:
+                    failed = next(iter(done))
+                    error = failed.exception()
+                    error_statistics = attempt_statistics[attempts.index(failed)]
+            assert error is not None
+            statistics.merge(error_statistics)
+            raise error
+        finally:
+            for attempt in attempts:
+                attempt.cancel()
+
+    def _latency_key(self) -> str:
+        """Returns the call type of the current call, whose latencies are tracked separately."""
+        _, call_type = current_call_scope()
+        return call_type.value if call_type is not None else "default"
+
+    def _hedge_threshold(self, latency_key: str) -> Optional[float]:
+        """Returns the seconds after which a call is hedged, or None if it must not be hedged."""
+        if self.latency_tracker is None or (
+            self.cassette is not None and self.cassette.mode == CassetteMode.REPLAY
+        ):
+            return None
+        return self.latency_tracker.threshold(latency_key)
+
+    def _acquire_quota(self, request: dict[str, Any]) -> int:
+        """Waits until the rate limiter admits the request and returns the number of reserved tokens."""
+        if self.rate_limiter is None:
+            return 0
+        return self.rate_limiter.acquire(self._estimate_prompt_tokens(request) + request["max_tokens"])
+
+    async def _aacquire_quota(self, request: dict[str, Any]) -> int:
+        """Waits without blocking the event loop until the rate limiter admits the request."""
+        if self.rate_limiter is None:
+            return 0
+        return await self.rate_limiter.aacquire(self._estimate_prompt_tokens(request) + request["max_tokens"])
+
+    @contextmanager
+    def _schedule_call(self) -> Iterator[None]:
+        """Waits until the call scheduler lets this call run before the waiting calls of other discussions."""
+        if self.call_scheduler is None:
+            yield
+            return
+        self.call_scheduler.acquire()
+        try:
+            yield
+        finally:
+            self.call_scheduler.release()
+
+    @asynccontextmanager
+    async def _aschedule_call(self) -> AsyncIterator[None]:
+        """Waits without blocking the event loop until the call scheduler lets this call run."""
+        if self.call_scheduler is None:
+            yield
+            return
+        await self.call_scheduler.aacquire()
+        try:
+            yield
+        finally:
+            self.call_scheduler.release()
+
+    @contextmanager
+    def _limit_concurrency(self) -> Iterator[ConcurrencySlot]:
+        """Waits until the concurrency limiter admits another request and reports its latency or error to the limiter."""
+        if self.concurrency_limiter is None:
+            yield ConcurrencySlot(time.monotonic())
+            return
+        slot = self.concurrency_limiter.acquire()
+        try:
+            yield slot
+        except BaseException as e:
+            self.concurrency_limiter.release(slot, e)
+            raise
+        self.concurrency_limiter.release(slot)
+
+    @asynccontextmanager
+    async def _alimit_concurrency(self) -> AsyncIterator[ConcurrencySlot]:
+        """Waits without blocking the event loop until the concurrency limiter admits another request."""
+        if self.concurrency_limiter is None:
+            yield ConcurrencySlot(time.monotonic())
+            return
+        slot = await self.concurrency_limiter.aacquire()
+        try:
+            yield slot
+        except BaseException as e:
+            self.concurrency_limiter.release(slot, e)
+            raise
+        self.concurrency_limiter.release(slot)
+
+    @contextmanager
+    def _use_endpoint(self, exclude: Optional[Endpoint]) -> Iterator[Optional[Endpoint]]:
+        """Reserves an endpoint of the endpoint pool for one request and reports whether the request succeeded."""
+        if self.endpoint_pool is None:
+            yield None
+            return
+        endpoint = self.endpoint_pool.acquire(exclude)
+        try:
+            yield endpoint
+        except BaseException as e:
+            self.endpoint_pool.release(endpoint, e)
+            raise
+        self.endpoint_pool.release(endpoint)
+
+    @asynccontextmanager
+    async def _ause_endpoint(self, exclude: Optional[Endpoint]) -> AsyncIterator[Optional[Endpoint]]:
+        """Reserves an endpoint of the endpoint pool for one request without blocking the event loop."""
+        if self.endpoint_pool is None:
+            yield None
+            return
+        endpoint = await self.endpoint_pool.aacquire(exclude)
+        try:
+            yield endpoint
+        except BaseException as e:
+            self.endpoint_pool.release(endpoint, e)
+            raise
+        self.endpoint_pool.release(endpoint)
+
+    def _open_stream(
+        self,
+        request: dict[str, Any],
+        endpoint: Optional[Endpoint],
+        timeout: float,
+        is_complete: Optional[Callable[[str], bool]] = None,
+    ) -> Iterator[Any]:
+        """Sends a request, or replays its response if a cassette is replayed."""
+        if self.cassette is not None and self.cassette.mode == CassetteMode.REPLAY:
+            return self.cassette.replay(request)
+        client = endpoint.client if endpoint is not None else self.client
+        start_time = time.perf_counter()
+        response = client.chat.completions.create(**request, timeout=self._request_timeout(request, timeout))
+        if not request["stream"]:
+            stream = iter([self._completion_chunk(response)])
+        elif is_complete is not None:
+            # Cut before recording, so that a replayed cassette ends where the live stream was closed
+            stream = self._until_complete(response, is_complete)
+        else:
+            stream = response
+        if self.cassette is not None:
+            return self.cassette.record(request, stream, start_time)
+        return stream
+
+    async def _aopen_stream(
+        self,
+        request: dict[str, Any],
+        endpoint: Optional[Endpoint],
+        timeout: float,
+        is_complete: Optional[Callable[[str], bool]] = None,
+    ) -> AsyncIterator[Any]:
+        """Sends a request with the async client, or replays its response if a cassette is replayed."""
+        if self.cassette is not None and self.cassette.mode == CassetteMode.REPLAY:
+            return self.cassette.areplay(request)
+        client = endpoint.async_client if endpoint is not None else self.async_client
+        assert client is not None
+        start_time = time.perf_counter()
+        response = await client.chat.completions.create(**request, timeout=self._request_timeout(request, timeout))
+        if not request["stream"]:
+            stream = self._achunks(self._completion_chunk(response))
+        elif is_complete is not None:
+            stream = self._auntil_complete(response, is_complete)
+        else:
+            stream = response
+        if self.cassette is not None:
+            return self.cassette.arecord(request, stream, start_time)
+        return stream
+
+    def _attempt_timeout(self) -> float:
+        """Returns the seconds an attempt of a call may take, which is less than timeout if the deadline of the discussion is closer."""
+        remaining = check_deadline()
+        return self.timeout if remaining is None else min(self.timeout, remaining)
+
+    def _request_timeout(self, request: dict[str, Any], timeout: float) -> httpx.Timeout:
+        """Returns the timeouts of a request that may take timeout seconds in total. A response that is not streamed arrives at once, so its read timeout is the total timeout."""
+        return httpx.Timeout(
+            min(self.read_timeout, timeout) if request["stream"] else timeout,
+            connect=min(self.connect_timeout, timeout),
+        )
+
+    @staticmethod
+    async def _aclose_stream(stream: Any) -> None:
+        # Async generators that wrap a stream are closed with aclose(), streams of the client with close()
+        await (stream.aclose() if hasattr(stream, "aclose") else stream.close())
+
+    @staticmethod
+    def _until_complete(stream: Any, is_complete: Callable[[str], bool]) -> Iterator[ChatCompletionChunk]:
+        """Passes the chunks of a stream through until the response is complete and closes the connection then, so that the server stops generating."""
+        response = ""
+        try:
+            for chunk in stream:
+                yield chunk
+                if chunk.choices and chunk.choices[0].delta.content:
+                    response += chunk.choices[0].delta.content
+                    if is_complete(response):
+                        logger.debug("Closing the stream of a complete response.")
+                        return
+        finally:
+            stream.close()
+
+    @staticmethod
+    async def _auntil_complete(stream: Any, is_complete: Callable[[str], bool]) -> AsyncIterator[ChatCompletionChunk]:
+        """Passes the chunks of an async stream through until the response is complete and closes the connection then."""
+        response = ""
+        try:
+            async for chunk in stream:
+                yield chunk
+                if chunk.choices and chunk.choices[0].delta.content:
+                    response += chunk.choices[0].delta.content
+                    if is_complete(response):
+                        logger.debug("Closing the stream of a complete response.")
+                        return
+        finally:
+            await stream.close()
+
+    @staticmethod
+    def _completion_chunk(completion: ChatCompletion) -> ChatCompletionChunk:
+        """Converts a response that was not streamed into a single chunk, whose log probability is the mean of its tokens."""
+        choice = completion.choices[0]
+        log_probs = [token.logprob for token in (choice.logprobs.content or [])] if choice.logprobs else []
+        return ChatCompletionChunk.model_validate(
+            {
+                "id": completion.id,
+                "object": "chat.completion.chunk",
+                "created": completion.created,
+                "model": completion.model,
+                "choices": [
+                    {
+                        "index": 0,
+                        "delta": {"content": choice.message.content},
+                        "finish_reason": choice.finish_reason,
+                        "logprobs": (
+                            {"content": [{"token": "", "logprob": sum(log_probs) / len(log_probs), "top_logprobs": []}]}
+                            if log_probs
+                            else None
+                        ),
+                    }
+                ],
+                "usage": completion.usage.model_dump() if completion.usage else None,
+            }
+        )
+
+    @staticmethod
+    async def _achunks(*chunks: ChatCompletionChunk) -> AsyncIterator[ChatCompletionChunk]:
+        for chunk in chunks:
+            yield chunk
+
+    def _retry_delay(self, error: Exception, statistics: CallStatistics) -> float:
+        """Counts a failed request and returns the seconds to wait before retrying it. Raises if the request must not be retried."""
+        error_type = self.retry_policy.classify(error)
+        if error_type is None:
+            logger.error(f"API returned a non-retryable error: {error}. This sample failed.")
+            raise Exception("API returned a non-retryable error.") from error
+        retries = statistics.retries.get(error_type.value, 0) + 1
+        if retries > self.retry_policy.budget(error_type):
+            logger.error(f" {error}: Exceeded maximum retries for {error_type.value} errors. This sample failed.")
+            raise Exception("Exceeded maximum API retries.") from error
+        statistics.retries[error_type.value] = retries
+        delay = self.retry_policy.delay(error, retries)
+        logger.warning(
+            f"API returned an Error ({error_type.value}): {error}. Retry number {retries} in {delay:.1f}s..."
+        )
+        return delay
+
+    def _token_usage(self, request: dict[str, Any], usage: Any, collected_messages: list[str]) -> TokenUsage:
+        """Returns the token usage reported by the endpoint or estimates it if the endpoint does not report it."""
+        if usage is not None:
+            return TokenUsage(prompt_tokens=usage.prompt_tokens, completion_tokens=usage.completion_tokens)
+        # Each streamed chunk usually carries a single token
+        return TokenUsage(prompt_tokens=self._estimate_prompt_tokens(request), completion_tokens=len(collected_messages))
+
+    def _estimate_prompt_tokens(self, request: dict[str, Any]) -> int:
+        return self._count_tokens("\n\n".join(message["content"] for message in request["messages"]))
+
+    def _count_tokens(self, text: str) -> int:
+        """Counts the tokens of a text with the tokenizer of the model, which is loaded on the first call."""
+        return token_counter(self.tokenizer)(text)
+
+    def _record_statistics(self, statistics: CallStatistics) -> None:
+        """Adds the statistics of a single call to the current discussion and to the totals of this model."""
+        agent_id, call_type = current_call_scope()
+        if call_type is not None:
+            statistics.usage_by_call_type[call_type.value] = statistics.usage
+        if agent_id is not None:
+            statistics.usage_by_agent[agent_id] = statistics.usage
+        discussion_statistics = current_call_statistics()
+        with _statistics_lock:
+            if discussion_statistics is not None:
+                discussion_statistics.merge(statistics)
+            # Agents are unique to a discussion, so the totals of a long run would collect every agent that ever existed
+            self.call_statistics.merge(dataclasses.replace(statistics, usage_by_agent={}))
+
+    def _cached_response(self, request: dict[str, Any], **kwargs: Any) -> Optional[str]:
+        """Returns the cached response to a request, if the response cache is enabled and contains it."""
+        if self.response_cache is None:
+            return None
+        cached = self.response_cache.lookup(request, kwargs.get("attempt", 0))
+        if cached is None:
+            return None
+        response, log_prob = cached
+        if "confidence_callback" in kwargs:
+            kwargs["confidence_callback"](math.exp(log_prob))
+        return response
+
+    def _finish(self, request: dict[str, Any], collected_messages: list[str], log_prob_sum: float, **kwargs: Any) -> str:
+        """Reports the confidence of a completed response, adds it to the response cache and returns its text."""
+        if collected_messages:
+            log_prob_sum = log_prob_sum / len(collected_messages)
+        response = "".join(collected_messages)
+        if self.response_cache is not None:
+            self.response_cache.store(request, response, log_prob_sum, kwargs.get("attempt", 0))
         confidence = math.exp(log_prob_sum)
         if "confidence_callback" in kwargs:
             kwargs["confidence_callback"](confidence)
-        return "".join(collected_messages)
+        return response
+
+    def _fit_context_window(
+        self, prompt: list[dict[str, str]], max_tokens: Optional[int] = None
+    ) -> tuple[list[dict[str, str]], int]:
+        """Trims the prompt to fit the context window minus max_tokens and returns it with the number of removed tokens.
+
+        The leading system messages, the task message after them and the final instruction are kept, the discussion history in between is dropped oldest first.
+        If that is not enough, the longest remaining message is shortened in its middle.
+        """
+        if self.context_window is None:
+            return prompt, 0
+        budget = self.context_window - (max_tokens or self.max_tokens)
+        token_counts = [self._count_tokens(message["content"]) + self.MESSAGE_OVERHEAD for message in prompt]
+        original_tokens = sum(token_counts)
+        if original_tokens <= budget:
+            return prompt, 0
+
+        messages = list(prompt)
+        first_history_message = next((i for i, m in enumerate(messages) if m["role"] != "system"), len(messages)) + 1
+        while sum(token_counts) > budget and len(messages) > first_history_message + 1:
+            del messages[first_history_message]
+            del token_counts[first_history_message]
+        while sum(token_counts) > budget:
+            longest = max(range(len(messages)), key=lambda i: token_counts[i])
+            content = messages[longest]["content"]
+            excess = sum(token_counts) - budget
+            shortened_tokens = token_counts[longest]
+            if token_counts[longest] - excess > self.MESSAGE_OVERHEAD:
+                keep = int(len(content) * (1 - (excess + self.MESSAGE_OVERHEAD) / token_counts[longest])) // 2
+                shortened = f"{content[:keep]}\n[...]\n{content[len(content) - keep:]}"
+                shortened_tokens = self._count_tokens(shortened) + self.MESSAGE_OVERHEAD
+            # Also gives up if the marker of the omitted text takes as many tokens as the text it replaces
+            if shortened_tokens >= token_counts[longest]:
+                logger.error(f"The prompt does not fit the context window of {self.context_window} tokens.")
+                raise Exception("Prompt exceeds the context window.")
+            messages[longest] = {**messages[longest], "content": shortened}
+            token_counts[longest] = shortened_tokens
+
+        trimmed_tokens = original_tokens - sum(token_counts)
+        logger.debug(f"Trimmed the prompt by {trimmed_tokens} tokens to fit the context window of {self.context_window} tokens.")
+        return messages, trimmed_tokens
+
+    def _generation_profile(self, name: str) -> GenerationProfile:
+        if name not in self.generation_profiles:
+            logger.error(f"Unknown generation profile: {name}. Available profiles are: {list(self.generation_profiles)}.")
+            raise Exception(f"Unknown generation profile: {name}")
+        return self.generation_profiles[name]
+
+    def _completion_request(
+        self,
+        prompt: list[dict[str, str]],
+        output_constraint: Optional[OutputConstraint] = None,
+        profile: Optional[GenerationProfile] = None,
+    ) -> dict[str, Any]:
+        """Builds the arguments of a chat completion request according to the generation profile of the call."""
+        if profile is None:
+            profile = self.generation_profiles["default"]
+        return {
+            "model": self.model,
+            "messages": self.merge_consecutive_messages(prompt),
+            "stream": profile.stream,
+            "stop": self.stop_tokens + profile.stop,
+            "max_tokens": profile.max_tokens or self.max_tokens,
+            **({"logprobs": True} if profile.logprobs else {}),
+            **({"stream_options": {"include_usage": True}} if profile.stream and self.stream_usage else {}),
+            **self._structured_output_parameters(output_constraint),
+        }
+
+    def _structured_output_parameters(self, output_constraint: Optional[OutputConstraint]) -> dict[str, Any]:
+        """Translates an output constraint into the request parameters of the configured structured output backend.
+
+        The OpenAI API only supports JSON schemas, regular expressions are left to the prompt.
+        """
+        if output_constraint is None or self.structured_output is None:
+            return {}
+        if self.structured_output == StructuredOutput.VLLM:
+            if output_constraint.json_schema is not None:
+                return {"extra_body": {"guided_json": output_constraint.json_schema}}
+            return {"extra_body": {"guided_regex": output_constraint.regex}}
+        if output_constraint.json_schema is not None:
+            return {
+                "response_format": {
+                    "type": "json_schema",
+                    "json_schema": {"name": output_constraint.name, "schema": output_constraint.json_schema, "strict": True},
+                }
+            }
+        return {}
+
+    def _collect_chunk(self, message: Any, collected_messages: list[str]) -> float:
+        """Appends the content of a streamed chunk and returns its log probability."""
+        if not message.choices:
+            # The last chunk only carries the token usage
+            return 0.0
+        log_prob = 0.0
+        message_str = message.choices[0].delta.content
+        if message.choices[0].logprobs:
+            log_prob = message.choices[0].logprobs.content[0].logprob
+        if message_str and message_str not in self.stop_tokens:
+            collected_messages.append(message_str)
+        return float(log_prob)
 
     def _stream(  # type: ignore
         self,
@@ -0,0 +1,114 @@
+import logging
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+from mallm.models.RetryPolicy import RetryPolicy
+from mallm.utils.enums import APIErrorType
+from mallm.utils.gate import Gate
+
+logger = logging.getLogger("mallm")
+
+
+@dataclass
+class ConcurrencySlot:
+    started: float
+    latency: Optional[float] = None
+
+    def first_token(self) -> None:
+        """
+        Records the time to the first token of the request.
+        """
+        if self.latency is None:
+            self.latency = time.monotonic() - self.started
+
+
+class ConcurrencyLimiter(Gate):
+    """
+    Adapts the number of in-flight LLM requests to the capacity of the server (additive increase, multiplicative decrease).
+
+    The limit grows by one after a full window of requests whose time to the first token stays within latency_tolerance times the lowest observed latency.
+    Rate limits, server errors and timeouts multiply the limit by backoff, a growing latency reduces it slightly.
+    Only requests started after the last decrease can lower the limit again, so that a burst of failures counts as a single congestion signal.
+    """
+
+    # Latencies below this many seconds are considered noise and never reduce the limit
+    LATENCY_FLOOR = 0.05
+
+    def __init__(
+        self,
+        initial_limit: int = 8,
+        min_limit: int = 1,
+        max_limit: int = 100,
+        latency_tolerance: float = 2.0,
+        backoff: float = 0.5,
+    ) -> None:
+        super().__init__()
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.limit = float(min(max(initial_limit, min_limit), max_limit))
+        self.latency_tolerance = latency_tolerance
+        self.backoff = backoff
+        self.in_flight = 0
+        self.min_observed_limit = self.limit
+        self.max_observed_limit = self.limit
+        self._min_latency: Optional[float] = None
+        self._last_decrease = 0.0
+
+    def acquire(self) -> ConcurrencySlot:
+        """
+        Waits until the limit allows another request.
+        """
+        return self.wait_for(self._take)
+
+    async def aacquire(self) -> ConcurrencySlot:
+        """
+        Waits without blocking the event loop until the limit allows another request.
+        """
+        return await self.await_for(self._take)
+
+    def release(self, slot: ConcurrencySlot, error: Optional[BaseException] = None) -> None:
+        """
+        Frees the slot of a finished request and adapts the limit to its latency or error.
+        """
+        with self._lock:
+            self.in_flight -= 1
+            if error is not None:
+                if RetryPolicy.classify(error) in {
+                    APIErrorType.RATE_LIMIT,
+                    APIErrorType.SERVER,
+                    APIErrorType.TIMEOUT,
+                }:
+                    self._decrease(slot.started, self.backoff)
+            elif slot.latency is not None:
+                latency = slot.latency
+                if self._min_latency is None or latency < self._min_latency:
+                    self._min_latency = latency
+                else:
+                    # Slowly forget the minimum so that the baseline follows lasting changes of the server
+                    self._min_latency += (latency - self._min_latency) * 0.01
+                if latency > max(self._min_latency, self.LATENCY_FLOOR) * self.latency_tolerance:
+                    self._decrease(slot.started, 0.9)
+                else:
+                    self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+                    self.max_observed_limit = max(self.max_observed_limit, self.limit)
+            self.notify_all()
+
+    def log_statistics(self) -> None:
+        logger.info(
+            f"Adaptive concurrency: final limit {int(self.limit)} (ranged from {int(self.min_observed_limit)} to {int(self.max_observed_limit)})."
+        )
+
+    def _take(self) -> Optional[ConcurrencySlot]:
+        if self.in_flight >= int(self.limit):
+            return None
+        self.in_flight += 1
+        return ConcurrencySlot(time.monotonic())
+
+    def _decrease(self, started: float, factor: float) -> None:
+        if started < self._last_decrease:
+            return
+        self.limit = max(self.min_limit, self.limit * factor)
+        self.min_observed_limit = min(self.min_observed_limit, self.limit)
+        self._last_decrease = time.monotonic()
+        logger.debug(f"Reduced the number of concurrent requests to {int(self.limit)}.")
@@ -0,0 +1,113 @@
+import logging
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+from openai import AsyncOpenAI, OpenAI
+
+from mallm.models.RetryPolicy import RetryPolicy
+from mallm.utils.enums import APIErrorType
+from mallm.utils.gate import Gate
+
+logger = logging.getLogger("mallm")
+
+
+@dataclass
+class Endpoint:
+    url: str
+    client: OpenAI
+    async_client: Optional[AsyncOpenAI] = None
+    weight: float = 1.0
+    max_concurrent_requests: Optional[int] = None
+    outstanding: int = 0
+    consecutive_failures: int = 0
+    ejected_until: float = 0.0
+    requests: int = 0
+    failures: int = 0
+
+    def has_capacity(self) -> bool:
+        return (
+            self.max_concurrent_requests is None
+            or self.outstanding < self.max_concurrent_requests
+        )
+
+    def load(self) -> float:
+        return (self.outstanding + 1) / self.weight
+
+
+class EndpointPool(Gate):
+    """
+    Distributes the requests of a model over several OpenAI-compatible endpoints.
+
+    Each request is routed to the endpoint with the fewest outstanding requests relative to its weight.
+    Endpoints that fail ejection_threshold times in a row (server, timeout or connection errors) are ejected for ejection_cooldown seconds.
+    A retried request prefers a different endpoint than the one that just failed.
+    If all endpoints reached their concurrency limit, requests wait for a free slot.
+    """
+
+    def __init__(
+        self,
+        endpoints: list[Endpoint],
+        ejection_threshold: int = 3,
+        ejection_cooldown: float = 30.0,
+    ) -> None:
+        super().__init__()
+        self.endpoints = endpoints
+        self.ejection_threshold = ejection_threshold
+        self.ejection_cooldown = ejection_cooldown
+
+    def acquire(self, exclude: Optional[Endpoint] = None) -> Endpoint:
+        """
+        Reserves a slot on the best endpoint, waiting until one is free.
+        """
+        return self.wait_for(lambda: self._select(exclude))
+
+    async def aacquire(self, exclude: Optional[Endpoint] = None) -> Endpoint:
+        """
+        Reserves a slot on the best endpoint without blocking the event loop.
+        """
+        return await self.await_for(lambda: self._select(exclude))
+
+    def release(self, endpoint: Endpoint, error: Optional[BaseException] = None) -> None:
+        """
+        Frees the slot of a finished request and updates the health of its endpoint.
+        """
+        with self._lock:
+            endpoint.outstanding -= 1
+            if error is None:
+                endpoint.consecutive_failures = 0
+            elif RetryPolicy.classify(error) in {
+                APIErrorType.SERVER,
+                APIErrorType.TIMEOUT,
+                APIErrorType.CONNECTION,
+            }:
+                endpoint.failures += 1
+                endpoint.consecutive_failures += 1
+                if endpoint.consecutive_failures >= self.ejection_threshold:
+                    endpoint.ejected_until = time.monotonic() + self.ejection_cooldown
+                    endpoint.consecutive_failures = 0
+                    logger.warning(
+                        f"Endpoint {endpoint.url} failed {self.ejection_threshold} times in a row and is ejected for {self.ejection_cooldown} seconds."
+                    )
+            self.notify()
+
+    def log_statistics(self) -> None:
+        for endpoint in self.endpoints:
+            logger.info(
+                f"Endpoint {endpoint.url}: {endpoint.requests} requests, {endpoint.failures} failures."
+            )
+
+    def _select(self, exclude: Optional[Endpoint]) -> Optional[Endpoint]:
+        now = time.monotonic()
+        available = [e for e in self.endpoints if e.has_capacity()]
+        if not available:
+            return None
+        # Prefer healthy endpoints and avoid the endpoint that failed last, unless there is no alternative
+        healthy = [e for e in available if e.ejected_until <= now] or [
+            min(available, key=lambda e: e.ejected_until)
+        ]
+        candidates = [e for e in healthy if e is not exclude] or healthy
+        endpoint = min(candidates, key=lambda e: e.load())
+        endpoint.outstanding += 1
+        endpoint.requests += 1
+        return endpoint
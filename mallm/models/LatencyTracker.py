@@ -0,0 +1,36 @@
+import math
+import threading
+from collections import deque
+from typing import Optional
+
+
+class LatencyTracker:
+    """
+    Tracks the latency of recent LLM calls per call type to decide when a slow call is hedged.
+
+    The threshold of a call type is the given percentile of its last window calls.
+    No threshold is reported until min_samples calls of that type finished, so that the first calls are never hedged.
+    """
+
+    def __init__(
+        self, percentile: float = 0.95, window: int = 200, min_samples: int = 20
+    ) -> None:
+        self.percentile = percentile
+        self.window = window
+        self.min_samples = min_samples
+        self._latencies: dict[str, deque[float]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, key: str, latency: float) -> None:
+        with self._lock:
+            self._latencies.setdefault(key, deque(maxlen=self.window)).append(latency)
+
+    def threshold(self, key: str) -> Optional[float]:
+        """
+        Returns the seconds after which a call of this type is hedged, or None if there are too few samples.
+        """
+        with self._lock:
+            latencies = sorted(self._latencies.get(key, ()))
+        if len(latencies) < self.min_samples:
+            return None
+        return latencies[min(len(latencies) - 1, math.ceil(self.percentile * len(latencies)) - 1)]
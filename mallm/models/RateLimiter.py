@@ -0,0 +1,104 @@
+import logging
+import time
+from typing import Optional
+
+from mallm.utils.gate import Gate
+
+logger = logging.getLogger("mallm")
+
+
+class RateLimiter(Gate):
+    """
+    Keeps the requests of all threads and tasks within the requests-per-minute and tokens-per-minute quotas of an API.
+
+    Both quotas are token buckets that refill continuously and hold at most one minute of quota.
+    A request is admitted once both buckets can pay for it, otherwise it waits locally instead of failing with a rate limit error.
+    The token cost of a request is reserved from its estimated prompt tokens plus max_tokens and corrected once its real usage is known.
+    """
+
+    # Seconds between checks of a waiting request whether the buckets refilled enough
+    POLL_INTERVAL = 0.1
+
+    def __init__(
+        self,
+        requests_per_minute: Optional[int] = None,
+        tokens_per_minute: Optional[int] = None,
+    ) -> None:
+        super().__init__()
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self._request_bucket = float(requests_per_minute or 0)
+        self._token_bucket = float(tokens_per_minute or 0)
+        self._last_refill = time.monotonic()
+        self.delayed_requests = 0
+        self.delay = 0.0
+
+    def acquire(self, tokens: int) -> int:
+        """
+        Waits until the quotas admit a request of the estimated number of tokens. Returns the number of reserved tokens.
+        """
+        started = time.monotonic()
+        reserved = self.wait_for(lambda: self._take(tokens), self.POLL_INTERVAL)
+        self._count_delay(started)
+        return reserved
+
+    async def aacquire(self, tokens: int) -> int:
+        """
+        Waits without blocking the event loop until the quotas admit a request. Returns the number of reserved tokens.
+        """
+        started = time.monotonic()
+        reserved = await self.await_for(lambda: self._take(tokens), self.POLL_INTERVAL)
+        self._count_delay(started)
+        return reserved
+
+    def settle(self, reserved: int, used: int) -> None:
+        """
+        Returns the tokens that were reserved for a request but not used, or charges the tokens that exceeded the reservation.
+        """
+        if self.tokens_per_minute is None:
+            return
+        with self._lock:
+            self._token_bucket = min(
+                self.tokens_per_minute, self._token_bucket + reserved - used
+            )
+            self.notify_all()
+
+    def log_statistics(self) -> None:
+        logger.info(
+            f"Rate limiter: delayed {self.delayed_requests} requests by {self.delay:.1f} seconds in total."
+        )
+
+    def _take(self, tokens: int) -> Optional[int]:
+        self._refill()
+        if self.tokens_per_minute is not None:
+            # A request larger than the whole quota would wait forever
+            tokens = min(tokens, self.tokens_per_minute)
+        if (self.requests_per_minute is not None and self._request_bucket < 1) or (
+            self.tokens_per_minute is not None and self._token_bucket < tokens
+        ):
+            return None
+        self._request_bucket -= 1
+        self._token_bucket -= tokens
+        return tokens
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        elapsed_minutes = (now - self._last_refill) / 60
+        self._last_refill = now
+        if self.requests_per_minute is not None:
+            self._request_bucket = min(
+                self.requests_per_minute,
+                self._request_bucket + elapsed_minutes * self.requests_per_minute,
+            )
+        if self.tokens_per_minute is not None:
+            self._token_bucket = min(
+                self.tokens_per_minute,
+                self._token_bucket + elapsed_minutes * self.tokens_per_minute,
+            )
+
+    def _count_delay(self, started: float) -> None:
+        waited = time.monotonic() - started
+        if waited >= self.POLL_INTERVAL:
+            with self._lock:
+                self.delayed_requests += 1
+                self.delay += waited
@@ -0,0 +1,157 @@
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Optional
+
+logger = logging.getLogger("mallm")
+
+
+class ResponseCache:
+    """
+    Persistent cache of LLM responses stored in a SQLite database.
+
+    Responses are addressed by a hash of the complete request (model, merged messages, stop tokens, max_tokens and sampling parameters).
+    A caller that asks again because it could not parse a response passes the number of its attempt, which is part of the
+    address, so that it gets a new response instead of the rejected one.
+    Entries older than max_age_days are discarded. If the cached responses exceed max_size_mb, the least recently used entries are evicted.
+    The cache can be shared between threads and between runs.
+    """
+
+    # Check the size of the cache every n inserts instead of after each insert
+    EVICTION_INTERVAL = 100
+
+    def __init__(
+        self,
+        path: str,
+        max_size_mb: Optional[float] = 1024,
+        max_age_days: Optional[float] = 30,
+    ) -> None:
+        self.path = path
+        self.max_size = int(max_size_mb * 1024 * 1024) if max_size_mb else None
+        self.max_age = max_age_days * 24 * 60 * 60 if max_age_days else None
+        self.hits = 0
+        self.misses = 0
+        self._inserts = 0
+        self._lock = threading.Lock()
+
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(
+            """CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                response TEXT NOT NULL,
+                log_prob REAL NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )"""
+        )
+        self._connection.execute(
+            "CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at)"
+        )
+        self._connection.commit()
+        self.evict()
+
+    @staticmethod
+    def key(request: dict[str, Any], attempt: int = 0) -> str:
+        """
+        Returns the content address of a chat completion request.
+        """
+        content = {
+            k: v for k, v in request.items() if k not in {"stream", "stream_options"}
+        }
+        if attempt:
+            content["attempt"] = attempt
+        return hashlib.sha256(
+            json.dumps(content, sort_keys=True, ensure_ascii=False).encode("utf-8")
+        ).hexdigest()
+
+    def lookup(self, request: dict[str, Any], attempt: int = 0) -> Optional[tuple[str, float]]:
+        """
+        Returns the cached response and its average log probability for a request, or None if the request is not cached.
+        """
+        key = self.key(request, attempt)
+        now = time.time()
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT response, log_prob, created_at FROM responses WHERE key = ?",
+                (key,),
+            ).fetchone()
+            if row is None or (self.max_age and row[2] < now - self.max_age):
+                self.misses += 1
+                return None
+            self._connection.execute(
+                "UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key)
+            )
+            self._connection.commit()
+            self.hits += 1
+        return row[0], row[1]
+
+    def store(self, request: dict[str, Any], response: str, log_prob: float, attempt: int = 0) -> None:
+        """
+        Adds the response of a request to the cache.
+        """
+        now = time.time()
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    self.key(request, attempt),
+                    response,
+                    log_prob,
+                    len(response.encode("utf-8")),
+                    now,
+                    now,
+                ),
+            )
+            self._connection.commit()
+            self._inserts += 1
+            evict = self._inserts % self.EVICTION_INTERVAL == 0
+        if evict:
+            self.evict()
+
+    def evict(self) -> None:
+        """
+        Removes expired entries and the least recently used entries exceeding the size limit.
+        """
+        with self._lock:
+            if self.max_age:
+                self._connection.execute(
+                    "DELETE FROM responses WHERE created_at < ?",
+                    (time.time() - self.max_age,),
+                )
+            if self.max_size:
+                size = self._connection.execute(
+                    "SELECT COALESCE(SUM(size), 0) FROM responses"
+                ).fetchone()[0]
+                if size > self.max_size:
+                    # Delete the oldest entries until the cache is below 90% of its size limit
+                    self._connection.execute(
+                        """DELETE FROM responses WHERE key IN (
+                            SELECT key FROM (
+                                SELECT key, SUM(size) OVER (ORDER BY accessed_at DESC) AS cumulative_size
+                                FROM responses
+                            ) WHERE cumulative_size > ?
+                        )""",
+                        (int(self.max_size * 0.9),),
+                    )
+            self._connection.commit()
+
+    def log_statistics(self) -> None:
+        """
+        Logs the number of cache hits and misses.
+        """
+        requests = self.hits + self.misses
+        hit_rate = self.hits / requests if requests else 0.0
+        logger.info(
+            f"Response cache: {self.hits} hits, {self.misses} misses ({hit_rate:.1%} hit rate)."
+        )
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
@@ -0,0 +1,96 @@
+import email.utils
+import random
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+import httpx
+from openai import (
+    APIConnectionError,
+    APIStatusError,
+    APITimeoutError,
+    RateLimitError,
+)
+
+from mallm.utils.enums import APIErrorType
+
+
+@dataclass
+class RetryPolicy:
+    """
+    Decides whether a failed API request is retried and how long to wait before the next attempt.
+
+    Errors are classified into rate limits (429), server errors (5xx), timeouts and connection errors.
+    Other errors (e.g. 400 Bad Request) are not retried because repeating the same request does not help.
+    Waiting times use capped exponential backoff with full jitter, so that many concurrent requests do not retry in lockstep.
+    A Retry-After header sent by the server takes precedence over the backoff.
+    """
+
+    max_retries: int = 5
+    max_rate_limit_retries: int = 10
+    base_delay: float = 1.0
+    max_delay: float = 60.0
+
+    @staticmethod
+    def classify(error: BaseException) -> Optional[APIErrorType]:
+        """
+        Returns the type of a retryable error or None if the error should not be retried.
+        """
+        if isinstance(error, RateLimitError):
+            return APIErrorType.RATE_LIMIT
+        if isinstance(error, (APITimeoutError, httpx.TimeoutException)):
+            return APIErrorType.TIMEOUT
+        if isinstance(error, (APIConnectionError, httpx.TransportError)):
+            return APIErrorType.CONNECTION
+        if isinstance(error, APIStatusError):
+            if error.status_code == 429:
+                return APIErrorType.RATE_LIMIT
+            if error.status_code == 408:
+                return APIErrorType.TIMEOUT
+            if error.status_code >= 500:
+                return APIErrorType.SERVER
+        return None
+
+    def budget(self, error_type: APIErrorType) -> int:
+        """
+        Returns the maximum number of retries for an error type.
+        """
+        if error_type == APIErrorType.RATE_LIMIT:
+            return self.max_rate_limit_retries
+        return self.max_retries
+
+    def delay(self, error: BaseException, attempt: int) -> float:
+        """
+        Returns the seconds to wait before retry number `attempt` (starting at 1).
+        """
+        retry_after = self.retry_after(error)
+        if retry_after is not None:
+            # Spread the retries of requests that received the same Retry-After
+            return retry_after + random.uniform(0, self.base_delay)
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+    @staticmethod
+    def retry_after(error: BaseException) -> Optional[float]:
+        """
+        Reads the Retry-After (or retry-after-ms) header of an error response in seconds.
+        """
+        if not isinstance(error, APIStatusError):
+            return None
+        headers = error.response.headers
+        retry_after_ms = headers.get("retry-after-ms")
+        if retry_after_ms:
+            try:
+                return max(0.0, float(retry_after_ms) / 1000)
+            except ValueError:
+                pass
+        retry_after = headers.get("retry-after")
+        if not retry_after:
+            return None
+        try:
+            return max(0.0, float(retry_after))
+        except ValueError:
+            pass
+        retry_date = email.utils.parsedate_tz(retry_after)
+        if retry_date is None:
+            return None
+        return max(0.0, email.utils.mktime_tz(retry_date) - time.time())
@@ -0,0 +1,29 @@
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Optional
+
+from openai import OpenAI
+
+
+class BatchBackend(ABC):
+    """
+    Executes files of chat completion requests in the OpenAI Batch JSONL format.
+    Each line of an input file holds a custom_id and a request body, each line of an output file the response to one custom_id.
+    """
+
+    def __init__(self, client: OpenAI, directory: Path):
+        self.client = client
+        self.directory = directory
+
+    @abstractmethod
+    def submit(self, input_path: Path) -> str:
+        """
+        Submits a batch input file and returns the id of the batch.
+        """
+
+    @abstractmethod
+    def poll(self, batch_id: str) -> Optional[Path]:
+        """
+        Returns the path of the output file once the batch is finished or None while it is still running.
+        Raises if the batch failed as a whole.
+        """
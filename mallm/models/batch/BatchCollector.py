@@ -0,0 +1,162 @@
+import asyncio
+import json
+import logging
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import Any, Optional
+
+from mallm.models.batch.BatchBackend import BatchBackend
+
+logger = logging.getLogger("mallm")
+
+
+class BatchCollector:
+    """
+    Collects the LLM requests of all discussions in flight and executes them together as one batch.
+
+    Every discussion registers as a participant while it runs. Once each participant waits for a response, the pending
+    requests are written to a batch file and submitted. After the batch finished, every participant continues with its
+    response until it needs the next one, so that all discussions advance in lockstep.
+    Requests that failed within a batch are submitted again with the next batch, up to max_retries times.
+    """
+
+    def __init__(
+        self,
+        backend: BatchBackend,
+        poll_interval: float = 30.0,
+        max_retries: int = 5,
+    ) -> None:
+        self.backend = backend
+        self.poll_interval = poll_interval
+        self.max_retries = max_retries
+        self.participants = 0
+        self.batches = 0
+        self.requests = 0
+        self._pending: dict[str, tuple[dict[str, Any], asyncio.Future[dict[str, Any]], int]] = {}
+        self._next_id = 0
+        self._flushing = False
+        self._flush_task: Optional[asyncio.Task[None]] = None
+        self.backend.directory.mkdir(parents=True, exist_ok=True)
+
+    @asynccontextmanager
+    async def participant(self) -> AsyncIterator[None]:
+        """
+        Registers a discussion whose requests are waited for before a batch is submitted.
+        """
+        self.participants += 1
+        try:
+            yield
+        finally:
+            self.participants -= 1
+            self._flush_if_ready()
+
+    async def submit(self, request: dict[str, Any]) -> dict[str, Any]:
+        """
+        Adds a chat completion request to the next batch and returns the body of its response.
+        """
+        future: asyncio.Future[dict[str, Any]] = asyncio.get_running_loop().create_future()
+        self._add(request, future, 0)
+        self._flush_if_ready()
+        return await future
+
+    @staticmethod
+    def batch_body(request: dict[str, Any]) -> dict[str, Any]:
+        """
+        Converts the arguments of a streaming request into the body of a batch request.
+        """
+        body = {
+            k: v
+            for k, v in request.items()
+            if k not in {"stream", "stream_options", "extra_body"}
+        }
+        body.update(request.get("extra_body") or {})
+        return body
+
+    async def aclose(self) -> None:
+        """
+        Waits for the batch in flight, if any, so that it is not abandoned when the event loop closes.
+        """
+        while self._flush_task is not None and not self._flush_task.done():
+            await self._flush_task
+
+    def log_statistics(self) -> None:
+        logger.info(
+            f"Batch mode: {self.requests} requests in {self.batches} batches."
+        )
+
+    def _add(
+        self,
+        request: dict[str, Any],
+        future: asyncio.Future[dict[str, Any]],
+        attempts: int,
+    ) -> None:
+        self._next_id += 1
+        self._pending[f"request-{self._next_id}"] = (request, future, attempts)
+
+    def _flush_if_ready(self) -> None:
+        if self._flushing or not self._pending:
+            return
+        if len(self._pending) >= self.participants:
+            self._flushing = True
+            self._flush_task = asyncio.ensure_future(self._flush())
+
+    async def _flush(self) -> None:
+        batch, self._pending = self._pending, {}
+        self.batches += 1
+        self.requests += len(batch)
+        try:
+            input_path = self.backend.directory / f"batch-{self.batches}-input.jsonl"
+            with open(input_path, "w") as file:
+                for custom_id, (request, _, _) in batch.items():
+                    file.write(
+                        json.dumps(
+                            {
+                                "custom_id": custom_id,
+                                "method": "POST",
+                                "url": "/v1/chat/completions",
+                                "body": self.batch_body(request),
+                            }
+                        )
+                        + "\n"
+                    )
+            batch_id = await asyncio.to_thread(self.backend.submit, input_path)
+            logger.info(f"Submitted batch {batch_id} with {len(batch)} requests.")
+            while True:
+                output_path = await asyncio.to_thread(self.backend.poll, batch_id)
+                if output_path is not None:
+                    break
+                await asyncio.sleep(self.poll_interval)
+            self._resolve(batch, output_path)
+        except Exception as e:
+            logger.error(f"Batch {self.batches} failed: {e}")
+            for _, future, _ in batch.values():
+                if not future.done():
+                    future.set_exception(e)
+        finally:
+            self._flushing = False
+            self._flush_if_ready()
+
+    def _resolve(
+        self,
+        batch: dict[str, tuple[dict[str, Any], asyncio.Future[dict[str, Any]], int]],
+        output_path: Path,
+    ) -> None:
+        with open(output_path) as file:
+            results = {
+                result["custom_id"]: result
+                for result in (json.loads(line) for line in file if line.strip())
+            }
+        for custom_id, (request, future, attempts) in batch.items():
+            result = results.get(custom_id)
+            response = result.get("response") if result else None
+            if response is not None and response.get("status_code") == 200:
+                future.set_result(response["body"])
+                continue
+            error = (result or {}).get("error") or (response or {}).get("body") or "missing from the batch output"
+            if attempts < self.max_retries:
+                logger.warning(f"Batch request failed ({error}). Retrying it with the next batch.")
+                self._add(request, future, attempts + 1)
+            else:
+                logger.error(f"Batch request failed ({error}) after {attempts} retries.")
+                future.set_exception(Exception("Batch request failed."))
@@ -0,0 +1,58 @@
+import json
+import logging
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Optional
+
+import httpx
+from openai import APIError
+
+from mallm.models.batch.BatchBackend import BatchBackend
+
+logger = logging.getLogger("mallm")
+
+
+class LocalBatchBackend(BatchBackend):
+    """
+    File-based stand-in for a batch API that answers each request of a batch with the interactive chat completion endpoint.
+    Useful for testing the batch mode against local servers that have no batch API.
+    """
+
+    # Number of requests of a batch that are sent at the same time
+    CONCURRENT_REQUESTS = 16
+
+    def submit(self, input_path: Path) -> str:
+        batch_id = f"batch_{uuid.uuid4().hex}"
+        with open(input_path) as file:
+            requests = [json.loads(line) for line in file if line.strip()]
+        with ThreadPoolExecutor(max_workers=self.CONCURRENT_REQUESTS) as pool:
+            results = list(pool.map(self._execute, requests))
+        with open(self.directory / f"{batch_id}-output.jsonl", "w") as file:
+            for result in results:
+                file.write(json.dumps(result) + "\n")
+        return batch_id
+
+    def poll(self, batch_id: str) -> Optional[Path]:
+        return self.directory / f"{batch_id}-output.jsonl"
+
+    def _execute(self, request: dict[str, Any]) -> dict[str, Any]:
+        body = dict(request["body"])
+        # Parameters that the client does not know are passed through to the server
+        known = {"model", "messages", "stop", "max_tokens", "logprobs", "response_format"}
+        extra_body = {k: body.pop(k) for k in list(body) if k not in known}
+        try:
+            response = self.client.chat.completions.create(**body, extra_body=extra_body or None)
+        except (APIError, httpx.TransportError) as e:
+            return {
+                "id": uuid.uuid4().hex,
+                "custom_id": request["custom_id"],
+                "response": None,
+                "error": {"code": type(e).__name__, "message": str(e)},
+            }
+        return {
+            "id": uuid.uuid4().hex,
+            "custom_id": request["custom_id"],
+            "response": {"status_code": 200, "body": response.model_dump()},
+            "error": None,
+        }
@@ -0,0 +1,38 @@
+import logging
+from pathlib import Path
+from typing import Optional, cast
+
+from mallm.models.batch.BatchBackend import BatchBackend
+
+logger = logging.getLogger("mallm")
+
+
+class OpenAIBatchBackend(BatchBackend):
+    """
+    Runs batches with the Batch API of OpenAI (or any endpoint implementing the files and batches routes).
+    """
+
+    def submit(self, input_path: Path) -> str:
+        with open(input_path, "rb") as file:
+            input_file = self.client.files.create(file=file, purpose="batch")
+        batch = self.client.batches.create(
+            input_file_id=input_file.id,
+            endpoint="/v1/chat/completions",
+            completion_window="24h",
+        )
+        return cast(str, batch.id)
+
+    def poll(self, batch_id: str) -> Optional[Path]:
+        batch = self.client.batches.retrieve(batch_id)
+        if batch.status in {"failed", "cancelled"}:
+            logger.error(f"Batch {batch_id} {batch.status}: {batch.errors}")
+            raise Exception(f"Batch {batch_id} {batch.status}.")
+        # Requests of an expired batch that did not finish are missing from its output and submitted again
+        if batch.status not in {"completed", "expired"}:
+            return None
+        output_path = self.directory / f"{batch_id}-output.jsonl"
+        with open(output_path, "w") as file:
+            for file_id in (batch.output_file_id, batch.error_file_id):
+                if file_id:
+                    file.write(self.client.files.content(file_id).text)
+        return output_path
@@ -38,7 +38,8 @@ Input: {input_str}
             },
         ]
         return self.generate_response(
-            prompt, task_instruction, input_str, chain_of_thought, None, True, True
+            prompt, task_instruction, input_str, chain_of_thought, None, True, True,
+            generation_profile="draft",
         )
 
     def generate_feedback(
@@ -65,6 +66,7 @@ Input: {input_str}
             None,
             False,
             False,
+            generation_profile="feedback",
         )
 
     def generate_improve(
@@ -91,6 +93,7 @@ Input: {input_str}
             None,
             False,
             False,
+            generation_profile="improve",
         )
 
     def generate_draft(self, data: TemplateFilling, chain_of_thought: bool) -> Response:
@@ -115,6 +118,7 @@ Input: {input_str}
             None,
             False,
             True,
+            generation_profile="draft",
         )
 
     @staticmethod
@@ -3,6 +3,7 @@ from typing import Optional
 
 from mallm.models.Chat import Chat
 from mallm.models.discussion.ResponseGenerator import ResponseGenerator
+from mallm.utils.functions import draft_complete
 from mallm.utils.types import Response, TemplateFilling
 
 logger = logging.getLogger("mallm")
@@ -43,7 +44,8 @@ Input: {input_str}
             },
         ]
         return self.generate_response(
-            prompt, task_instruction, input_str, chain_of_thought, None, True, True
+            prompt, task_instruction, input_str, chain_of_thought, None, True, True,
+            generation_profile="draft",
         )
 
     def generate_response(
@@ -56,6 +58,7 @@ Input: {input_str}
         baseline: bool,
         drafting: bool,
         judging: bool = False,
+        generation_profile: str = "default",
     ) -> Response:
         if chain_of_thought:
             current_prompt.append(
@@ -65,9 +68,17 @@ Input: {input_str}
                 }
             )
 
+        # The agreement is read from the whole response, so only responses that do not state one are cut off after the solution
+        is_complete = draft_complete if agreement is not None or drafting else None
+
         retry = 0
         while retry < 10:
-            res = self.llm.invoke(current_prompt)
+            res = self.llm.invoke(
+                current_prompt,
+                is_complete=is_complete,
+                generation_profile=generation_profile,
+                attempt=retry,
+            )
 
             response = Response(
                 agreement=(
@@ -115,6 +126,7 @@ Input: {input_str}
             None,
             False,
             False,
+            generation_profile="feedback",
         )
 
     def generate_improve(
@@ -142,6 +154,7 @@ Input: {input_str}
             None,
             False,
             False,
+            generation_profile="improve",
         )
 
     def generate_draft(self, data: TemplateFilling, chain_of_thought: bool) -> Response:
@@ -167,6 +180,7 @@ Input: {input_str}
             None,
             False,
             True,
+            generation_profile="draft",
         )
 
     def extract_result(
@@ -177,7 +191,7 @@ Input: {input_str}
             task=task_instruction,
             previous_answer=result
         )
-        return str(self.llm.invoke(current_prompt))
+        return str(self.llm.invoke(current_prompt, generation_profile="final_answer"))
 
     def generate_ablation(
         self,
@@ -206,6 +220,7 @@ Current solution: {current_solution}
             agreement=None,
             baseline=True,
             drafting=True,
+            generation_profile="draft",
         )
 
     def generate_policy_intervention(self, data: TemplateFilling, provide_labels: bool = True) -> Response:
@@ -39,7 +39,8 @@ Input: {input_str}
             },
         ]
         return self.generate_response(
-            prompt, task_instruction, input_str, chain_of_thought, None, True, True
+            prompt, task_instruction, input_str, chain_of_thought, None, True, True,
+            generation_profile="draft",
         )
 
     def generate_feedback(
@@ -66,6 +67,7 @@ Input: {input_str}
             None,
             False,
             False,
+            generation_profile="feedback",
         )
 
     def generate_improve(
@@ -92,6 +94,7 @@ Input: {input_str}
             None,
             False,
             False,
+            generation_profile="improve",
         )
 
     def generate_draft(self, data: TemplateFilling, chain_of_thought: bool) -> Response:
@@ -116,6 +119,7 @@ Input: {input_str}
             None,
             False,
             True,
+            generation_profile="draft",
         )
 
     @staticmethod
@@ -25,6 +25,8 @@ class ResponseGenerator(ABC):
         agreement: Optional[bool],
         baseline: bool,
         drafting: bool,
+        *,
+        generation_profile: str = "default",
     ) -> Response:
         """
         Abstract method to generate an agents response to a discussion.
@@ -35,6 +37,7 @@ class ResponseGenerator(ABC):
         agreement (Optional[bool]): the agreement if already computed.
         baseline (bool): Whether use the prompt for the baseline, without discussion.
         drafting (bool): Whether the response should be drafting a new solution.
+        generation_profile (str): The generation profile of the call, e.g. draft, improve or feedback.
 
         Returns:
         Response: An object with the attributes "agreement", "message", and "solution".
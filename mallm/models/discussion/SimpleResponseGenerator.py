@@ -37,7 +37,8 @@ Input: {input_str}
             },
         ]
         return self.generate_response(
-            prompt, task_instruction, input_str, chain_of_thought, None, True, True
+            prompt, task_instruction, input_str, chain_of_thought, None, True, True,
+            generation_profile="draft",
         )
 
     def generate_feedback(
@@ -64,6 +65,7 @@ Input: {input_str}
             None,
             False,
             False,
+            generation_profile="feedback",
         )
 
     def generate_improve(
@@ -90,6 +92,7 @@ Input: {input_str}
             None,
             False,
             False,
+            generation_profile="improve",
         )
 
     def generate_draft(self, data: TemplateFilling, chain_of_thought: bool) -> Response:
@@ -114,6 +117,7 @@ Input: {input_str}
             None,
             False,
             True,
+            generation_profile="draft",
         )
 
     @staticmethod
@@ -168,6 +172,7 @@ Your role: {data.persona} ({data.persona_description})"""
             None,
             False,
             False,
+            generation_profile="judge",
         )
 
     def generate_policy_intervention(self, data: TemplateFilling, provide_labels: bool = True) -> Response:
@@ -201,4 +206,5 @@ Your role: {data.persona} ({data.persona_description})"""
             None,
             False,
             False,
+            generation_profile="feedback",
         )
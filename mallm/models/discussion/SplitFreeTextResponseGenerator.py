@@ -50,6 +50,7 @@ class SplitFreeTextResponseGenerator(FreeTextResponseGenerator):
             agreement,
             False,
             False,
+            generation_profile="feedback",
         )
 
     def generate_improve(
@@ -86,6 +87,7 @@ class SplitFreeTextResponseGenerator(FreeTextResponseGenerator):
             agreement,
             False,
             False,
+            generation_profile="improve",
         )
 
     def generate_agreement(self, data: TemplateFilling) -> Optional[bool]:
@@ -97,7 +99,7 @@ class SplitFreeTextResponseGenerator(FreeTextResponseGenerator):
                 "content": "Do you agree with the solution, considering the arguments and evidence presented? Please provide your reasoning step-by-step. After that, respond with [AGREE] or [DISAGREE].",
             },
         ]
-        return self.extract_agreement(res=self.llm.invoke(prompt), drafting=False)
+        return self.extract_agreement(res=self.llm.invoke(prompt, generation_profile="agreement"), drafting=False)
 
     def generate_policy_intervention(self, data: TemplateFilling, provide_labels: bool = True) -> Response:
         logger.error(f"Policy Intervention is not implemented for this response generator. {self.__class__.__name__}")
@@ -5,7 +5,8 @@ from json_repair import repair_json
 
 from mallm.models.Chat import Chat
 from mallm.models.personas.PersonaGenerator import PersonaGenerator
-from mallm.utils.types import InputExample
+from mallm.utils.functions import json_object_complete
+from mallm.utils.types import InputExample, OutputConstraint
 
 logger = logging.getLogger("mallm")
 
@@ -44,6 +45,18 @@ New Participant:
 {"role": "Chef", "description": "A professional chef specializing in Italian cuisine who enjoys teaching cooking techniques."}
         """,
         }
+        self.persona_constraint = OutputConstraint(
+            name="persona",
+            json_schema={
+                "type": "object",
+                "properties": {
+                    "role": {"type": "string"},
+                    "description": {"type": "string"},
+                },
+                "required": ["role", "description"],
+                "additionalProperties": False,
+            },
+        )
 
     def generate_persona(
         self,
@@ -82,8 +95,13 @@ New Participant:
                         "role": "user",
                         "content": "Please use the following examples to generate a useful persona for the task! Only answer with the JSON for the next persona!",
                     },
-                ]
+                ],
+                output_constraint=self.persona_constraint,
+                generation_profile="persona",
+                is_complete=json_object_complete,
+                attempt=retry,
             )
+            retry += 1
             try:
                 new_agent = json.loads(repair_json(response))
                 if isinstance(new_agent, list):
@@ -98,7 +116,6 @@ New Participant:
                 agent: dict[str, str] = new_agent
                 break
             except (json.decoder.JSONDecodeError, TypeError) as e:
-                retry += 1
                 logger.debug(
                     f"Could not decode json (will attempt retry no. {retry!s}): "
                     + str(e)
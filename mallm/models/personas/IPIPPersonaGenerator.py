@@ -3,7 +3,8 @@ import logging
 
 from mallm.models.Chat import Chat
 from mallm.models.personas.PersonaGenerator import PersonaGenerator
-from mallm.utils.types import InputExample
+from mallm.utils.functions import json_object_complete
+from mallm.utils.types import InputExample, OutputConstraint
 
 logger = logging.getLogger("mallm")
 
@@ -45,6 +46,36 @@ New Participant:
 {"role": "Software Developer", "extraversion": "low", "agreeableness": "high", "conscientiousness": "high", "neuroticism": "low", "openness": "high", "experience": "Expert", "gender": "non-binary"}
         """,
         }
+        traits = {
+            trait: {"type": "string", "enum": ["high", "low"]}
+            for trait in (
+                "extraversion",
+                "agreeableness",
+                "conscientiousness",
+                "neuroticism",
+                "openness",
+            )
+        }
+        self.persona_constraint = OutputConstraint(
+            name="persona",
+            json_schema={
+                "type": "object",
+                "properties": {
+                    "role": {"type": "string"},
+                    **traits,
+                    "experience": {
+                        "type": "string",
+                        "enum": ["Expert", "Neutral", "Non-Expert"],
+                    },
+                    "gender": {
+                        "type": "string",
+                        "enum": ["male", "female", "non-binary"],
+                    },
+                },
+                "required": ["role", *traits, "experience", "gender"],
+                "additionalProperties": False,
+            },
+        )
 
     def generate_persona(
         self,
@@ -83,8 +114,13 @@ New Participant:
                         "role": "user",
                         "content": "Only answer with the JSON for the next persona! Ensure your new participant is unique.",
                     },
-                ]
+                ],
+                output_constraint=self.persona_constraint,
+                generation_profile="persona",
+                is_complete=json_object_complete,
+                attempt=retry,
             )
+            retry += 1
 
             try:
                 new_agent = json.loads(response)
@@ -318,7 +354,6 @@ New Participant:
                     + "\nResponse string: "
                     + str(response)
                 )
-                retry += 1
                 continue
 
         return agent
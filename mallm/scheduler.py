@@ -1,18 +1,25 @@
+import asyncio
 import dataclasses
 import gc
 import json
 import logging
+import multiprocessing
 import os
+import queue
 import random
+import re
 import sys
 import time
 import traceback
 import uuid
+from collections import deque
+from collections.abc import AsyncIterator, Callable
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager, nullcontext
 from datetime import timedelta
-from multiprocessing.pool import ThreadPool
 from pathlib import Path
-from threading import Lock
-from typing import Any, Optional
+from threading import Event, Lock, Thread
+from typing import Any, Optional, TypeVar, Union
 
 import fire
 import httpx
@@ -21,7 +28,7 @@ import langchain_core
 import openai
 from contextplus import context
 from datasets import load_dataset
-from openai import OpenAI
+from openai import AsyncOpenAI, OpenAI
 from rich import print  # noqa: A004
 from rich.logging import RichHandler
 from rich.progress import Console, Progress, TaskID
@@ -30,10 +37,48 @@ from sentence_transformers.util import cos_sim
 from torch import Tensor
 
 from mallm.coordinator import Coordinator
+from mallm.models.batch.BatchCollector import BatchCollector
+from mallm.models.CallScheduler import CallScheduler
+from mallm.models.Cassette import Cassette
 from mallm.models.Chat import Chat
+from mallm.models.ConcurrencyLimiter import ConcurrencyLimiter
+from mallm.models.EndpointPool import Endpoint, EndpointPool
+from mallm.models.LatencyTracker import LatencyTracker
+from mallm.models.RateLimiter import RateLimiter
+from mallm.models.ResponseCache import ResponseCache
+from mallm.models.RetryPolicy import RetryPolicy
+from mallm.utils.async_bridge import run_sync_in_loop
+from mallm.utils.checkpoint import Checkpoint
 from mallm.utils.config import Config
-from mallm.utils.dicts import RESPONSE_GENERATORS
-from mallm.utils.types import InputExample, Response, WorkerFunctions
+from mallm.utils.dicts import BATCH_BACKENDS, RESPONSE_GENERATORS
+from mallm.utils.enums import (
+    CallPriority,
+    CallType,
+    CassetteMode,
+    JobType,
+    StructuredOutput,
+)
+from mallm.utils.generation_profiles import GENERATION_PROFILES
+from mallm.utils.memory_tracker import MemoryTracker
+from mallm.utils.output_writer import OutputWriter
+from mallm.utils.sample_costs import SampleCostEstimator
+from mallm.utils.sample_feeder import SampleFeeder
+from mallm.utils.tracking import (
+    call_scope,
+    discussion_deadline,
+    track_call_statistics,
+    track_discussion_progress,
+)
+from mallm.utils.types import (
+    CallStatistics,
+    InputExample,
+    Response,
+    TokenUsage,
+    WorkerFunctions,
+)
+from mallm.utils.work_queue import WorkQueue, WorkQueueWriter
+
+HTTPClient = TypeVar("HTTPClient", bound=Union[httpx.Client, httpx.AsyncClient])
 
 FORMAT = "%(message)s"
 
@@ -57,18 +102,183 @@ class Scheduler:
     The Scheduler is capable of managing many discussions simultaneously through parallelized API requests.
     """
 
-    def __init__(self, config: Config) -> None:
-        config.check_config()
+    # Seconds between attempts to lease a sample while the other nodes of a distributed run finish their samples
+    WORK_QUEUE_POLL_INTERVAL = 5.0
+    # The outputs of a run, the discussions and the ablation and the baseline written next to them
+    OUTPUT_KINDS = ("output", "ablation", "baseline")
 
-        # Cleaning other files
-        if os.path.exists(config.output_json_file_path):
-            os.remove(config.output_json_file_path)
-            logger.info(
-                f"""The file {config.output_json_file_path} has been deleted."""
+    def __init__(self, config: Config, worker: bool = False) -> None:
+        self.data: list[InputExample] = []
+        self.dataset_name = config.input_json_file_path
+        self.checkpoint: Optional[Checkpoint] = None
+        self.resumed_samples = 0
+        self.pending_ablations: dict[str, int] = {}
+        # Worker processes receive their samples from the parent process, which already checked the config
+        if not worker:
+            config.check_config()
+            self.load_data(config)
+            self.prepare_data(config)
+
+        self.config = config
+        self.retry_policy = RetryPolicy(
+            max_retries=self.config.api_max_retries,
+            max_rate_limit_retries=self.config.api_max_rate_limit_retries,
+            base_delay=self.config.api_retry_base_delay,
+            max_delay=self.config.api_retry_max_delay,
+        )
+        self.response_cache = None
+        if self.config.response_cache_path:
+            self.response_cache = ResponseCache(
+                self.config.response_cache_path,
+                max_size_mb=self.config.response_cache_max_size_mb,
+                max_age_days=self.config.response_cache_max_age_days,
+            )
+        self.cassette = None
+        if self.config.cassette_path:
+            self.cassette = Cassette(
+                self.config.cassette_path,
+                mode=CassetteMode(self.config.cassette_mode),
+                keep_latency=self.config.cassette_keep_latency,
             )
+        # One connection pool carries the traffic of all endpoints and is shared by the main and the judge model
+        self.http_client = self.create_http_client(httpx.Client)
+        self.async_http_client = (
+            self.create_http_client(httpx.AsyncClient)
+            if self.config.use_async or self.config.batch_backend
+            else None
+        )
+        self.endpoint_pool = self.create_endpoint_pool()
+        # concurrent_api_requests becomes the upper bound of the adaptive limit
+        self.concurrency_limiter = (
+            ConcurrencyLimiter(
+                initial_limit=self.config.adaptive_concurrency_initial,
+                min_limit=self.config.adaptive_concurrency_min,
+                max_limit=self.config.concurrent_api_requests,
+            )
+            if self.config.adaptive_concurrency
+            else None
+        )
+        self.call_scheduler = (
+            CallScheduler(
+                policy=CallPriority(self.config.call_priority),
+                max_concurrent_calls=self.config.max_concurrent_calls,
+            )
+            if self.config.call_priority and self.config.max_concurrent_calls
+            else None
+        )
+        self.rate_limiter = (
+            RateLimiter(
+                requests_per_minute=self.config.api_requests_per_minute,
+                tokens_per_minute=self.config.api_tokens_per_minute,
+            )
+            if self.config.api_requests_per_minute or self.config.api_tokens_per_minute
+            else None
+        )
+        # The settings of the config replace those of the default generation profiles
+        self.generation_profiles = {
+            name: dataclasses.replace(
+                profile, **(self.config.generation_profiles or {}).get(name, {})
+            )
+            for name, profile in GENERATION_PROFILES.items()
+        }
+        self.batch_collector: Optional[BatchCollector] = None
+        if self.config.batch_backend:
+            # Only the main model is batched, the judge answers interactively
+            self.batch_collector = BatchCollector(
+                BATCH_BACKENDS[self.config.batch_backend](
+                    self.create_clients(self.config.endpoint_url, self.config.api_key)[0],
+                    Path(self.config.batch_dir),
+                ),
+                poll_interval=self.config.batch_poll_interval,
+                max_retries=self.config.api_max_retries,
+            )
+        self.llm = self.create_chat(
+            self.config.endpoint_url,
+            self.config.api_key,
+            self.config.model_name,
+            context_window=self.config.model_context_window,
+            tokenizer=self.config.model_tokenizer,
+            endpoint_pool=self.endpoint_pool,
+            concurrency_limiter=self.concurrency_limiter,
+            call_scheduler=self.call_scheduler,
+            rate_limiter=self.rate_limiter,
+            batch_collector=self.batch_collector,
+        )
+
+        self.judge_llm = None
+        if self.config.judge_endpoint_url:
+            self.judge_llm = self.create_chat(
+                self.config.judge_endpoint_url,
+                self.config.judge_api_key,
+                self.config.judge_model_name,
+                context_window=self.config.judge_model_context_window,
+                tokenizer=self.config.judge_model_tokenizer,
+            )
+
+        if config.response_generator not in RESPONSE_GENERATORS:
+            logger.error(f"No valid response generator for {config.response_generator}")
+            raise Exception(
+                f"No valid response generator for {config.response_generator}"
+            )
+        self.response_generator = RESPONSE_GENERATORS[config.response_generator](
+            self.llm
+        )
+
+        self.completed_samples = self.resumed_samples
+        self.total_samples = len(self.data) + self.resumed_samples
+        self.failed_example_ids: list[str] = []
+        self.work_queue = (
+            WorkQueue(config.work_queue_path, lease_seconds=config.work_queue_lease_seconds)
+            if config.work_queue_path
+            else None
+        )
+
+        def create_writer(kind: str) -> Union[OutputWriter, WorkQueueWriter]:
+            if self.work_queue:
+                # The records of all nodes are merged from the work queue at the end
+                return WorkQueueWriter(self.work_queue, kind)
+            return OutputWriter(self.records_path(config, kind))
+
+        self.output_writer = create_writer("output")
+        self.ablation_output_writer = (
+            create_writer("ablation") if config.use_ablation else None
+        )
+        # The combined mode writes the baseline next to the discussions
+        self.baseline_output_writer = (
+            create_writer("baseline") if config.use_combined else None
+        )
+
+        # The worker processes of a sharded run track their own memory
+        self.memory_tracker = (
+            MemoryTracker() if config.track_memory and config.num_processes == 1 else None
+        )
+
+        if not worker:
+            logger.info(f"""Found {self.total_samples} samples to process.""")
+        logger.info("Finished initializing the scheduler.")
+
+    def load_data(self, config: Config) -> None:
+        """
+        Removes the output of previous runs, unless the run is resumed, and reads the input data.
+        """
+        # Cleaning other files, unless they belong to an interrupted run or the work queue of a distributed run
+        if not config.resume and not config.work_queue_path:
+            paths: list[Union[str, Path]] = [
+                config.output_json_file_path,
+                self.checkpoint_path(config),
+                *(self.records_path(config, kind) for kind in self.OUTPUT_KINDS),
+                *(
+                    path
+                    for kind in self.OUTPUT_KINDS
+                    for path in self.shard_records_paths(config, kind)
+                ),
+            ]
+            for path in paths:
+                if os.path.exists(path):
+                    os.remove(path)
+                    logger.info(f"""The file {path} has been deleted.""")
 
         # Read input data (format: json lines)
-        self.data = []
         try:
             logger.info(
                 f"""Trying to read {config.input_json_file_path} from file..."""
@@ -139,45 +349,376 @@ class Scheduler:
             )
             sys.exit(1)
 
-        if config.shuffle_input_samples:
-            random.shuffle(self.data)
-            logger.info("Shuffled the input data.")
+    def prepare_data(self, config: Config) -> None:
+        """
+        Determines the order of the samples and skips the samples that an interrupted run already completed.
+        """
+        if config.work_queue_path:
+            # The work queue keeps the order and the state of the samples for all nodes
+            if config.shuffle_input_samples:
+                random.shuffle(self.data)
+                logger.info("Shuffled the input data.")
+            return
 
-        self.config = config
-        self.llm = Chat(
-            client=OpenAI(
-                base_url=self.config.endpoint_url, api_key=self.config.api_key
+        checkpoint = self.checkpoint = Checkpoint(self.checkpoint_path(config))
+        if config.resume and checkpoint.load():
+            if len(checkpoint.order) != len(self.data):
+                logger.error(
+                    f"The checkpoint {checkpoint.path} does not match the input data. Please run again without resume."
+                )
+                sys.exit(1)
+            # Restores the sample order and the example_ids of the interrupted run
+            self.data = [self.data[i] for i in checkpoint.order]
+            for data, example_id in zip(self.data, checkpoint.example_ids):
+                data.example_id = example_id
+            logger.info(f"Restored the sample order from {checkpoint.path}.")
+        else:
+            checkpoint.order = list(range(len(self.data)))
+            if config.shuffle_input_samples:
+                random.shuffle(checkpoint.order)
+                self.data = [self.data[i] for i in checkpoint.order]
+                logger.info("Shuffled the input data.")
+            checkpoint.example_ids = [data.example_id for data in self.data]
+            checkpoint.save()
+
+        # Samples that were completed by an interrupted run are skipped, and failed samples stay substituted
+        if config.resume:
+            completed = self.resume_records(config)
+            if config.use_ablation:
+                ablated = self.resume_records(config, "ablation")
+                # The discussion of these samples finished before their ablation
+                self.pending_ablations = {
+                    example_id: exchanged_messages
+                    for example_id, exchanged_messages in completed.items()
+                    if example_id not in ablated
+                }
+            finished = set(completed) - set(self.pending_ablations)
+            self.resumed_samples = len(finished)
+            skipped = finished | set(checkpoint.failed_example_ids)
+            self.data = [data for data in self.data if data.example_id not in skipped]
+            logger.info(
+                f"Resuming after {self.resumed_samples} completed and {len(checkpoint.failed_example_ids)} failed samples."
+            )
+
+    @staticmethod
+    def output_path(config: Config, kind: str = "output") -> Path:
+        """
+        Returns the output file of the discussions, or the output file of the ablation or the baseline next to it.
+        """
+        path = Path(config.output_json_file_path)
+        if kind != "output":
+            path = path.with_name(f"{path.stem}-{kind}{path.suffix}")
+        return path
+
+    @staticmethod
+    def records_path(config: Config, kind: str = "output") -> Path:
+        """
+        Returns the JSON lines file next to the output file that the output records are appended to.
+        With the json output format, it only exists while the run is in progress.
+        """
+        return Scheduler.output_path(config, kind).with_suffix(".jsonl")
+
+    @staticmethod
+    def checkpoint_path(config: Config) -> Path:
+        """
+        Returns the file next to the output file that the sample order and the failed samples are persisted to.
+        """
+        return Scheduler.output_path(config).with_suffix(".checkpoint.json")
+
+    @staticmethod
+    def shard_config(config: Config, shard: int) -> Config:
+        """
+        Returns the config of a worker process. The concurrency and rate limits are split between the processes.
+        """
+
+        def share(budget: int) -> int:
+            return max(1, budget // config.num_processes + (1 if shard < budget % config.num_processes else 0))
+
+        def share_optional(budget: Optional[int]) -> Optional[int]:
+            return None if budget is None else share(budget)
+
+        output_path = Scheduler.output_path(config)
+        return dataclasses.replace(
+            config,
+            output_json_file_path=str(
+                output_path.with_name(f"{output_path.stem}.shard{shard}{output_path.suffix}")
             ),
-            model=self.config.model_name
+            num_processes=1,
+            resume=False,
+            output_format="jsonl",
+            concurrent_api_requests=share(config.concurrent_api_requests),
+            adaptive_concurrency_initial=share(config.adaptive_concurrency_initial),
+            adaptive_concurrency_min=share(config.adaptive_concurrency_min),
+            max_concurrent_calls=share_optional(config.max_concurrent_calls),
+            api_requests_per_minute=share_optional(config.api_requests_per_minute),
+            api_tokens_per_minute=share_optional(config.api_tokens_per_minute),
+            endpoints=[
+                (
+                    {
+                        **endpoint,
+                        "max_concurrent_requests": share_optional(endpoint.get("max_concurrent_requests")),
+                    }
+                    if isinstance(endpoint, dict)
+                    else endpoint
+                )
+                for endpoint in config.endpoints
+            ],
         )
 
-        self.judge_llm = None
-        if self.config.judge_endpoint_url:
-            self.judge_llm = Chat(
-                client=OpenAI(
-                    base_url=self.config.judge_endpoint_url,
-                    api_key=self.config.judge_api_key,
-                ),
-                model=self.config.judge_model_name,
+    @staticmethod
+    def shard_records_paths(config: Config, kind: str = "output") -> list[Path]:
+        """
+        Returns the records files that worker processes left behind, also those of runs with another number of processes.
+        """
+        output_path = Scheduler.output_path(config)
+        suffix = "" if kind == "output" else f"-{kind}"
+        return sorted(
+            path
+            for path in output_path.parent.glob(f"{output_path.stem}.shard*.jsonl")
+            if re.fullmatch(rf"{re.escape(output_path.stem)}\.shard\d+{suffix}", path.stem)
+        )
+
+    def resume_records(self, config: Config, kind: str = "output") -> dict[str, int]:
+        """
+        Collects the output records of an interrupted run and rewrites them as the JSON lines file this run appends to.
+        Returns the number of exchanged messages of each completed example_id.
+        """
+        records_path = self.records_path(config, kind)
+        source = records_path if records_path.exists() else self.output_path(config, kind)
+        # The records of worker processes that were not merged yet
+        shard_paths = self.shard_records_paths(config, kind)
+        sources = ([source] if source.exists() else []) + shard_paths
+        if not sources:
+            return {}
+        completed = {}
+        temp_path = records_path.with_name(records_path.name + ".tmp")
+        with open(temp_path, "w") as file:
+            for path in sources:
+                for record in OutputWriter.read_records(path):
+                    completed[record["exampleId"]] = len(record.get("globalMemory") or [])
+                    file.write(json.dumps(record) + "\n")
+        os.replace(temp_path, records_path)
+        for path in shard_paths:
+            os.remove(path)
+        logger.info(f"Found {len(completed)} completed samples in {', '.join(map(str, sources))}.")
+        return completed
+
+    def mark_failed(self, example_id: str) -> None:
+        """
+        Marks a sample as failed, so that it is substituted by the next remaining sample, also after a resume.
+        """
+        self.failed_example_ids.append(example_id)
+        if self.checkpoint:
+            self.checkpoint.save(failed_example_id=example_id)
+
+    def close_output(self) -> None:
+        """
+        Writes the remaining output records and converts them into JSON arrays, unless the output format is JSON lines.
+        """
+        if self.work_queue:
+            self.write_work_queue_output(self.work_queue)
+            return
+        for writer, kind in (
+            (self.output_writer, "output"),
+            (self.ablation_output_writer, "ablation"),
+            (self.baseline_output_writer, "baseline"),
+        ):
+            if not isinstance(writer, OutputWriter):
+                continue
+            writer.close()
+            if self.config.num_processes > 1:
+                for path in self.shard_records_paths(self.config, kind):
+                    writer.merge(path)
+            if self.config.output_format == "json":
+                writer.convert_to_json(self.output_path(self.config, kind))
+            logger.info(f"Wrote {writer.records} output records.")
+
+    def write_work_queue_output(self, work_queue: WorkQueue) -> None:
+        """
+        Writes the records of all nodes to the output if this is the last node of a distributed run to finish.
+        """
+        if not work_queue.claim_merge():
+            logger.info(
+                "Samples are unfinished or the output was already written. The last node to finish writes the output."
             )
+            return
+        for node_writer in (
+            self.output_writer,
+            self.ablation_output_writer,
+            self.baseline_output_writer,
+        ):
+            if not isinstance(node_writer, WorkQueueWriter):
+                continue
+            records_path = self.records_path(self.config, node_writer.kind)
+            if records_path.exists():
+                os.remove(records_path)
+            writer = OutputWriter(records_path)
+            for record in work_queue.results(node_writer.kind):
+                writer.write(record)
+            writer.close()
+            if self.config.output_format == "json":
+                writer.convert_to_json(self.output_path(self.config, node_writer.kind))
+            logger.info(f"Wrote {writer.records} output records of all nodes.")
 
-        if config.response_generator not in RESPONSE_GENERATORS:
-            logger.error(f"No valid response generator for {config.response_generator}")
-            raise Exception(
-                f"No valid response generator for {config.response_generator}"
+    def create_http_client(self, client_class: type[HTTPClient]) -> HTTPClient:
+        """
+        Creates a keep-alive connection pool that is large enough for all concurrent requests.
+        """
+        client: HTTPClient = client_class(
+            limits=httpx.Limits(
+                max_connections=self.config.concurrent_api_requests,
+                max_keepalive_connections=self.config.concurrent_api_requests,
+                keepalive_expiry=60,
+            ),
+            http2=self.config.use_http2,
+        )
+        return client
+
+    def create_clients(
+        self, endpoint_url: str, api_key: str
+    ) -> tuple[OpenAI, Optional[AsyncOpenAI]]:
+        """
+        Creates the API clients of an endpoint that send their requests through the shared connection pool.
+        """
+        # Retries are handled by the retry policy of Chat, so the clients must not retry on their own
+        client = OpenAI(
+            base_url=endpoint_url,
+            api_key=api_key,
+            max_retries=0,
+            http_client=self.http_client,
+        )
+        async_client = None
+        if self.async_http_client:
+            async_client = AsyncOpenAI(
+                base_url=endpoint_url,
+                api_key=api_key,
+                max_retries=0,
+                http_client=self.async_http_client,
             )
-        self.response_generator = RESPONSE_GENERATORS[config.response_generator](
-            self.llm
+        return client, async_client
+
+    def create_endpoint_pool(self) -> Optional[EndpointPool]:
+        """
+        Creates a pool of all endpoints that serve the main model, if more than the default endpoint is configured.
+        """
+        if not self.config.endpoints:
+            return None
+        endpoints = []
+        for entry in self.config.endpoints:
+            endpoint: dict[str, Any] = (
+                {"url": entry} if isinstance(entry, str) else entry
+            )
+            client, async_client = self.create_clients(
+                endpoint["url"].rstrip("/"),
+                endpoint.get("api_key", self.config.api_key),
+            )
+            endpoints.append(
+                Endpoint(
+                    url=endpoint["url"],
+                    client=client,
+                    async_client=async_client,
+                    weight=endpoint.get("weight", 1.0),
+                    max_concurrent_requests=endpoint.get("max_concurrent_requests"),
+                )
+            )
+        logger.info(f"Distributing the requests over {len(endpoints)} endpoints.")
+        return EndpointPool(
+            endpoints,
+            ejection_threshold=self.config.endpoint_ejection_threshold,
+            ejection_cooldown=self.config.endpoint_ejection_cooldown,
         )
 
-        self.completed_samples = 0
-        self.total_samples = len(self.data)
-        self.failed_example_ids: list[str] = []
-        self.output_dicts: list[dict[str, Any]] = []
-        self.ablation_output_dicts: list[dict[str, Any]] = []
+    def create_chat(
+        self,
+        endpoint_url: str,
+        api_key: str,
+        model_name: Optional[str],
+        context_window: Optional[int] = None,
+        tokenizer: Optional[str] = None,
+        endpoint_pool: Optional[EndpointPool] = None,
+        concurrency_limiter: Optional[ConcurrencyLimiter] = None,
+        call_scheduler: Optional[CallScheduler] = None,
+        rate_limiter: Optional[RateLimiter] = None,
+        batch_collector: Optional[BatchCollector] = None,
+    ) -> Chat:
+        """
+        Creates a model that sends its requests to an endpoint or distributes them over an endpoint pool.
+        """
+        if endpoint_pool:
+            client = endpoint_pool.endpoints[0].client
+            async_client = endpoint_pool.endpoints[0].async_client
+        else:
+            client, async_client = self.create_clients(endpoint_url, api_key)
+        return Chat(
+            client=client,
+            async_client=async_client,
+            model=model_name,
+            retry_policy=self.retry_policy,
+            connect_timeout=self.config.api_connect_timeout,
+            read_timeout=self.config.api_read_timeout,
+            timeout=self.config.api_timeout,
+            response_cache=self.response_cache,
+            cassette=self.cassette,
+            stream_usage=self.config.api_stream_usage,
+            generation_profiles=self.generation_profiles,
+            context_window=context_window,
+            tokenizer=tokenizer,
+            structured_output=(
+                StructuredOutput(self.config.structured_output)
+                if self.config.structured_output
+                else None
+            ),
+            latency_tracker=(
+                LatencyTracker(percentile=self.config.hedge_percentile)
+                if self.config.hedge_requests
+                else None
+            ),
+            endpoint_pool=endpoint_pool,
+            concurrency_limiter=concurrency_limiter,
+            call_scheduler=call_scheduler,
+            rate_limiter=rate_limiter,
+            batch_collector=batch_collector,
+        )
 
-        logger.info(f"""Found {self.total_samples} samples to process.""")
-        logger.info("Finished initializing the scheduler.")
+    @asynccontextmanager
+    async def batch_participant(self) -> AsyncIterator[None]:
+        """
+        Registers a sample with the batch collector while it runs, so that the next batch waits for its requests.
+        """
+        if self.batch_collector is None:
+            yield
+            return
+        async with self.batch_collector.participant():
+            yield
+
+    @staticmethod
+    def token_usage_output(statistics: CallStatistics) -> dict[str, Any]:
+        """
+        Formats the token usage of a sample for the output file.
+        """
+
+        def usage_dict(usage: TokenUsage) -> dict[str, int]:
+            return {
+                "promptTokens": usage.prompt_tokens,
+                "completionTokens": usage.completion_tokens,
+                "totalTokens": usage.total_tokens,
+            }
+
+        return {
+            **usage_dict(statistics.usage),
+            "byCallType": {
+                call_type: usage_dict(usage)
+                for call_type, usage in statistics.usage_by_call_type.items()
+            },
+            "byAgent": {
+                agent_id: usage_dict(usage)
+                for agent_id, usage in statistics.usage_by_agent.items()
+            },
+            "contextTrims": {
+                "prompts": statistics.trimmed_prompts,
+                "tokens": statistics.trimmed_tokens,
+            },
+        }
 
     def run_discussion(
         self,
@@ -192,6 +733,15 @@ class Scheduler:
         Runs a single discussion between agents on a sample.
         """
 
+        if sample.example_id in self.pending_ablations:
+            # The discussion finished before the run was interrupted
+            answer = self.run_ablation(
+                client, sample, self.pending_ablations.pop(sample.example_id)
+            )
+            self.completed_samples += 1
+            progress.update(task, advance=1)
+            return answer
+
         logger.info(f"""Starting discussion of sample {sample.example_id}""")
         try:
             coordinator = Coordinator(
@@ -205,28 +755,31 @@ class Scheduler:
         except Exception as e:
             logger.error("Failed intializing coordinator.")
             logger.error(e)
-            self.failed_example_ids.append(sample.example_id)
+            self.mark_failed(sample.example_id)
             return None
         try:
-            (
-                answer,
-                global_mem,
-                agent_mems,
-                turn,
-                agreements,
-                discussion_time,
-                decision_success,
-                voting_results_per_turn,
-                challenged_answers,
-                judgements,
-                judged_solutions,
-            ) = coordinator.discuss(
-                config=self.config, sample=sample, worker_functions=worker_functions
-            )
+            with track_call_statistics() as call_statistics, discussion_deadline(
+                self.config.max_discussion_seconds
+            ) as deadline, track_discussion_progress(self.config.max_turns):
+                (
+                    answer,
+                    global_mem,
+                    agent_mems,
+                    turn,
+                    agreements,
+                    discussion_time,
+                    decision_success,
+                    voting_results_per_turn,
+                    challenged_answers,
+                    judgements,
+                    judged_solutions,
+                ) = coordinator.discuss(
+                    config=self.config, sample=sample, worker_functions=worker_functions
+                )
             personas, persona_diversity = coordinator.get_agents(
                 self.config, worker_functions
             )
-            self.output_dicts.append(
+            self.output_writer.write(
                 {
                     "dataset": self.dataset_name,
                     "exampleId": sample.example_id,
@@ -263,12 +816,23 @@ class Scheduler:
                     ],
                     "judgements": judgements,
                     "judged_solutions": judged_solutions,
+                    "apiCalls": call_statistics.calls,
+                    "apiRetries": call_statistics.retries,
+                    "apiHedges": {
+                        "hedged": call_statistics.hedged_calls,
+                        "won": call_statistics.hedge_wins,
+                    },
+                    "tokenUsage": self.token_usage_output(call_statistics),
+                    "tokenBudgetExhausted": self.config.max_discussion_tokens is not None
+                    and call_statistics.usage.total_tokens
+                    >= self.config.max_discussion_tokens,
+                    "timedOut": deadline.reached,
                 }
             )
         except Exception:
             # More extensive error logging to ease debugging during async execution
             logger.error(f"Failed discussion of sample {sample.example_id}.")
-            self.failed_example_ids.append(sample.example_id)
+            self.mark_failed(sample.example_id)
             logger.error("Exception occurred", exc_info=True)
             logger.error(traceback.format_exc())
             return None
@@ -280,17 +844,6 @@ class Scheduler:
         logger.info(f"""Reference answer: {sample.references}""")
         logger.info(f"""Decision successful: {decision_success}""")
 
-        try:
-            with open(self.config.output_json_file_path, "w") as file:
-                file.write(
-                    json.dumps(self.output_dicts)
-                )  # TODO: ensure correct json formatting (sometimes there is an invalid escape sequence warning)
-                file.truncate()
-        except Exception as e:
-            logger.error("Failed to write output to file.")
-            logger.error(e)
-            self.failed_example_ids.append(sample.example_id)
-
         self.completed_samples += 1
         samples_left = min(
             self.total_samples,
@@ -300,31 +853,26 @@ class Scheduler:
             f"""Completed samples: {self.completed_samples}. Samples left: {samples_left - self.completed_samples}."""
         )
         progress.update(task, advance=1)
+        if self.memory_tracker:
+            self.memory_tracker.sample()
         del coordinator
-        gc.collect()
+        if not self.config.bounded_memory:
+            gc.collect()
 
         if self.config.use_ablation:
-            self.run_ablation(
-                client, sample, len(self.output_dicts[-1]["globalMemory"])
-            )
+            if self.config.use_combined:
+                # Runs as a job of its own once the discussion is done, see serve()
+                self.pending_ablations[sample.example_id] = len(global_mem)
+            else:
+                self.run_ablation(client, sample, len(global_mem))
 
         return str(answer)
 
-    def manage_discussions(self, client: httpx.Client) -> None:
+    @staticmethod
+    def create_worker_functions() -> WorkerFunctions:
         """
-        Manages all discussions on the data.
-        Discussions are handled in a queue of length max_concurrent_requests.
-        Once a spot in the queue is free because a discussion ended, the next discussion is initialized.
+        Loads the models that are shared between all discussions and wraps them in lock-protected worker functions.
         """
-        logger.debug("Starting discussion manager...")
-        console = Console(record=True)
-        # Creating HuggingFace endpoint
-
-        if self.config.num_samples:
-            processing_data = self.data[: self.config.num_samples]
-            self.data = self.data[self.config.num_samples :]
-        else:
-            processing_data = self.data
         context_lock = Lock()
         paraphrase_lock = Lock()
         persona_diversity_lock = Lock()
@@ -364,60 +912,53 @@ class Scheduler:
                 persona_diversity = sum(similarities) / len(similarities)
             return round(persona_diversity, 4)
 
-        worker_functions = WorkerFunctions(
+        return WorkerFunctions(
             worker_paraphrase_function=worker_paraphrase_function,
             worker_context_function=worker_context_function,
             worker_persona_diversity_function=worker_persona_diversity_function,
         )
 
+    def select_processing_data(self) -> list[InputExample]:
+        """
+        Selects the samples to process. The remaining samples are kept as substitutes for failed samples.
+        The order only changes within the selected samples, so that starting the longest samples first never changes which
+        samples are processed.
+        """
+        if self.config.num_samples:
+            num_samples = max(0, self.config.num_samples - self.resumed_samples)
+            processing_data = self.data[:num_samples]
+            self.data = self.data[num_samples:]
+        else:
+            processing_data, self.data = self.data, []
+        if self.config.longest_samples_first:
+            # Starting the longest samples last would leave most of the pool idle at the end of the run
+            processing_data = SampleCostEstimator(
+                self.config.sample_cost_history
+            ).longest_first(processing_data)
+            logger.info("Ordered the samples to start the longest first.")
+        return processing_data
+
+    def manage_discussions(self, client: httpx.Client) -> None:
+        """
+        Manages all discussions on the data.
+        Exactly concurrent_api_requests discussions are in flight. Once a discussion ends, the next sample is started in its
+        place, and a failed sample is substituted right away.
+        """
+        logger.debug("Starting discussion manager...")
+        processing_data = self.select_processing_data()
+        feeder = SampleFeeder(processing_data, self.data)
+
         with Progress() as progress:
             task = progress.add_task(
                 "[cyan]Finished discussions...", total=len(processing_data)
             )
-            while True:
-                logger.info(f"Processing {len(processing_data)} samples.")
-                pool = ThreadPool(processes=self.config.concurrent_api_requests)
-                results = []
+            logger.info(f"Processing {len(processing_data)} samples.")
+            self.serve(client, feeder.next, feeder.report, progress, task)
 
-                for sample in processing_data:
-                    try:
-                        results.append(
-                            pool.apply_async(
-                                self.run_discussion,
-                                (
-                                    client,
-                                    sample,
-                                    console,
-                                    progress,
-                                    task,
-                                    worker_functions,
-                                ),
-                            )
-                        )
-                    except Exception as e:
-                        logger.error("Failed to run discussion.")
-                        logger.error(e)
-                pool.close()  # Done adding tasks.
-                pool.join()  # Wait for all tasks to complete.
-                del pool
-
-                if len(self.failed_example_ids) == 0:
-                    logger.info("No samples failed.")
-                    break
-                logger.warning(
-                    f"{len(self.failed_example_ids)} samples failed. Here is a list of their example_ids: \n{self.failed_example_ids!s}"
-                )
-                if len(self.data) < len(self.failed_example_ids):
-                    logger.error(
-                        "No more samples in the datasets to substitute failed samples."
-                    )
-                    raise Exception(
-                        "No more samples in the datasets to substitute failed samples."
-                    )
-                logger.warning("Resampling from the dataset as a substitute...")
-                processing_data = self.data[: len(self.failed_example_ids)]
-                self.data = self.data[len(self.failed_example_ids) :]
-                self.failed_example_ids = []
+        if feeder.exhausted:
+            raise Exception(
+                "No more samples in the datasets to substitute failed samples."
+            )
 
     def run_ablation(
         self, client: httpx.Client, sample: InputExample, exchanged_messages: int
@@ -450,14 +991,19 @@ class Scheduler:
             solution="None. Please provide a first solution.",
             agreement=None,
         )
+        call_statistics = CallStatistics()
         for i in range(exchanged_messages):
             try:
-                answer = self.response_generator.generate_ablation(
-                    task_instruction=sample_instruction,
-                    input_str=input_str,
-                    current_solution=answer.solution,
-                    chain_of_thought=self.config.use_chain_of_thought,
-                )
+                with track_call_statistics() as iteration_statistics, call_scope(
+                    call_type=CallType.ABLATION
+                ):
+                    answer = self.response_generator.generate_ablation(
+                        task_instruction=sample_instruction,
+                        input_str=input_str,
+                        current_solution=answer.solution,
+                        chain_of_thought=self.config.use_chain_of_thought,
+                    )
+                call_statistics.merge(iteration_statistics)
                 globalMemory.append(
                     {
                         "message_id": i,
@@ -469,7 +1015,7 @@ class Scheduler:
             except Exception as e:
                 logger.error("Failed running baseline.")
                 logger.error(e)
-                self.failed_example_ids.append(sample.example_id)
+                self.mark_failed(sample.example_id)
                 return None
 
         discussion_time = timedelta(
@@ -480,7 +1026,8 @@ class Scheduler:
             + str(answer.solution)
         )
 
-        self.ablation_output_dicts.append(
+        assert self.ablation_output_writer is not None
+        self.ablation_output_writer.write(
             {
                 "dataset": self.dataset_name,
                 "exampleId": sample.example_id,
@@ -501,21 +1048,15 @@ class Scheduler:
                 "clockSeconds": float(f"{discussion_time:.2f}"),
                 "globalMemory": globalMemory,
                 "agentMemory": None,
+                "apiCalls": call_statistics.calls,
+                "apiRetries": call_statistics.retries,
+                "apiHedges": {
+                    "hedged": call_statistics.hedged_calls,
+                    "won": call_statistics.hedge_wins,
+                },
+                "tokenUsage": self.token_usage_output(call_statistics),
             }
         )
-        try:
-            out_path = Path(self.config.output_json_file_path)
-            with open(
-                out_path.with_name(out_path.stem + "-ablation.json"), "w"
-            ) as file:
-                file.write(
-                    json.dumps(self.ablation_output_dicts)
-                )  # TODO: ensure correct json formatting (sometimes there is an invalid escape sequence warning)
-                file.truncate()
-        except Exception as e:
-            logger.error("Failed to write ablation output to file.")
-            logger.error(e)
-
         return answer.solution
 
     def run_baseline(
@@ -541,18 +1082,21 @@ class Scheduler:
         logger.info(f"""Starting baseline processing of sample {sample.example_id}""")
         try:
             start_time = time.perf_counter()
-            answer = self.response_generator.generate_baseline(
-                task_instruction=sample_instruction,
-                input_str=input_str,
-                chain_of_thought=self.config.use_chain_of_thought,
-            )
+            with track_call_statistics() as call_statistics, call_scope(
+                call_type=CallType.BASELINE
+            ):
+                answer = self.response_generator.generate_baseline(
+                    task_instruction=sample_instruction,
+                    input_str=input_str,
+                    chain_of_thought=self.config.use_chain_of_thought,
+                )
             discussion_time = timedelta(
                 seconds=time.perf_counter() - start_time
             ).total_seconds()
         except Exception as e:
             logger.error("Failed running baseline.")
             logger.error(e)
-            self.failed_example_ids.append(sample.example_id)
+            self.mark_failed(sample.example_id)
             return None
 
         logger.info(
@@ -560,7 +1104,7 @@ class Scheduler:
             + str(answer.solution)
         )
 
-        self.output_dicts.append(
+        (self.baseline_output_writer or self.output_writer).write(
             {
                 "dataset": self.dataset_name,
                 "exampleId": sample.example_id,
@@ -581,23 +1125,23 @@ class Scheduler:
                 "clockSeconds": float(f"{discussion_time:.2f}"),
                 "globalMemory": None,
                 "agentMemory": None,
+                "apiCalls": call_statistics.calls,
+                "apiRetries": call_statistics.retries,
+                "apiHedges": {
+                    "hedged": call_statistics.hedged_calls,
+                    "won": call_statistics.hedge_wins,
+                },
+                "tokenUsage": self.token_usage_output(call_statistics),
             }
         )
-        try:
-            with open(self.config.output_json_file_path, "w") as file:
-                file.write(
-                    json.dumps(self.output_dicts)
-                )  # TODO: ensure correct json formatting (sometimes there is an invalid escape sequence warning)
-                file.truncate()
-        except Exception as e:
-            logger.error("Failed to write output to file.")
-            logger.error(e)
-            self.failed_example_ids.append(sample.example_id)
-
-        self.completed_samples += 1
-        logger.info(
-            f"""Completed samples: {self.completed_samples}. Samples left: {self.total_samples - self.completed_samples}."""
-        )
+        # In the combined mode, the discussions count the completed samples
+        if not self.config.use_combined:
+            self.completed_samples += 1
+            logger.info(
+                f"""Completed samples: {self.completed_samples}. Samples left: {self.total_samples - self.completed_samples}."""
+            )
+        if self.memory_tracker:
+            self.memory_tracker.sample()
         return answer.solution
 
     def manage_baseline(self, client: httpx.Client) -> None:
@@ -606,60 +1150,365 @@ class Scheduler:
         The LM answers the query with a single request with no discussion being held.
         """
         logger.debug("Starting baseline manager...")
-        # Creating HuggingFace endpoint
+        processing_data = self.select_processing_data()
+        feeder = SampleFeeder(processing_data, self.data)
 
-        if self.config.num_samples:
-            processing_data = self.data[: self.config.num_samples]
-            self.data = self.data[self.config.num_samples :]
+        with Progress() as progress:
+            task = progress.add_task(
+                "[cyan]Finished samples...", total=len(processing_data)
+            )
+            logger.info(f"Processing {len(processing_data)} samples.")
+            self.serve(client, feeder.next, feeder.report, progress, task)
+
+        if feeder.exhausted:
+            raise Exception(
+                "No more samples in the datasets to substitute failed samples."
+            )
+
+    def manage_processes(self) -> None:
+        """
+        Distributes the samples over num_processes worker processes, each with its own scheduler and share of the concurrency.
+        The samples are handed out through a queue, so that idle workers take the next sample. The worker processes write
+        their records to their own files, which are merged into the output at the end. Failed samples are substituted here.
+        """
+        logger.debug("Starting process manager...")
+        processing_data = self.select_processing_data()
+        context = multiprocessing.get_context("spawn")
+        tasks: multiprocessing.Queue[Optional[InputExample]] = context.Queue()
+        events: multiprocessing.Queue[tuple[str, Any]] = context.Queue()
+        configs = [
+            self.shard_config(self.config, shard)
+            for shard in range(self.config.num_processes)
+        ]
+        processes = [
+            context.Process(
+                target=run_worker,
+                args=(config, self.dataset_name, self.pending_ablations, tasks, events),
+                name=f"mallm-worker-{shard}",
+            )
+            for shard, config in enumerate(configs)
+        ]
+        for process in processes:
+            process.start()
+        for sample in processing_data:
+            tasks.put(sample)
+        running = len(processing_data)
+        feeder = SampleFeeder([], self.data)
+        try:
+            with Progress() as progress:
+                task = progress.add_task(
+                    "[cyan]Finished discussions...", total=len(processing_data)
+                )
+                while running:
+                    if any(not process.is_alive() for process in processes):
+                        raise Exception("A worker process exited unexpectedly.")
+                    try:
+                        event, value = events.get(timeout=1.0)
+                    except queue.Empty:
+                        continue
+                    if event == "completed":
+                        running -= 1
+                        self.completed_samples += 1
+                        progress.update(task, advance=1)
+                    elif event == "failed":
+                        self.mark_failed(value)
+                        feeder.report(event, value)
+                        substitute = feeder.next()
+                        if substitute is None:
+                            raise Exception(
+                                "No more samples in the datasets to substitute failed samples."
+                            )
+                        tasks.put(substitute)
+                    elif event == "statistics":
+                        # Workers only stop once the samples are done, unless they crashed
+                        self.llm.call_statistics.merge(value)
+                        raise Exception(
+                            "A worker process stopped before all samples were finished."
+                        )
+                    else:
+                        raise Exception(f"Unknown event of a worker process: {event}")
+        finally:
+            # Each thread of a worker stops at its own None once the queued samples are done
+            for config in configs:
+                for _ in range(config.concurrent_api_requests):
+                    tasks.put(None)
+            while any(process.is_alive() for process in processes) or not events.empty():
+                try:
+                    event, value = events.get(timeout=1.0)
+                except queue.Empty:
+                    continue
+                if event == "statistics":
+                    # The parent makes no calls itself and reports the calls of all workers
+                    self.llm.call_statistics.merge(value)
+            for process in processes:
+                process.join()
+
+    def manage_work_queue(self, client: httpx.Client, work_queue: WorkQueue) -> None:
+        """
+        Runs the samples of the work queue that is shared with the other nodes of a distributed run.
+        Samples are leased one at a time and their leases are renewed while they run. Once no sample is pending, the node
+        waits until the samples of the other nodes are finished, since their leases may expire and have to run again.
+        """
+        logger.debug("Starting work queue manager...")
+        processing_data = self.select_processing_data()
+        if work_queue.populate(processing_data + self.data, len(processing_data)):
+            logger.info(
+                f"Filled the work queue {work_queue.path} with {len(processing_data)} samples and {len(self.data)} substitutes."
+            )
         else:
-            processing_data = self.data
+            logger.info(f"Joining the work queue {work_queue.path}.")
+        self.data = []
+        stopped = Event()
 
-        while True:
-            logger.info(f"Processing {len(processing_data)} samples.")
-            pool = ThreadPool(processes=self.config.concurrent_api_requests)
-            results = []
-            for sample in processing_data:
+        def renew_leases() -> None:
+            while not stopped.wait(work_queue.lease_seconds / 3):
                 try:
-                    results.append(
-                        pool.apply_async(
-                            self.run_baseline,
-                            (client, sample),
-                        )
-                    )
+                    work_queue.heartbeat()
                 except Exception as e:
-                    logger.error("Failed running baseline.")
-                    logger.error(e)
-            pool.close()  # Done adding tasks.
-            pool.join()  # Wait for all tasks to complete.
-            del pool
-
-            if len(self.failed_example_ids) == 0:
-                logger.info("No samples failed.")
-                break
-            logger.warning(
-                f"{len(self.failed_example_ids)} samples failed. Here is a list of their example_ids: \n{self.failed_example_ids!s}"
-            )
-            if len(self.data) < len(self.failed_example_ids):
-                logger.error(
-                    "No more samples in the datasets to substitute failed samples."
-                )
-                raise Exception(
-                    "No more samples in the datasets to substitute failed samples."
+                    logger.error(f"Failed to renew the leases: {e}")
+
+        def next_sample() -> Optional[InputExample]:
+            while True:
+                sample = work_queue.lease()
+                if sample is not None or not work_queue.unfinished():
+                    return sample
+                time.sleep(min(work_queue.lease_seconds / 3, self.WORK_QUEUE_POLL_INTERVAL))
+
+        exhausted = False
+
+        def report(event: str, example_id: str) -> None:
+            nonlocal exhausted
+            if event == "completed":
+                work_queue.complete(example_id)
+            elif not work_queue.fail(example_id):
+                exhausted = True
+                logger.error("No more samples in the datasets to substitute failed samples.")
+
+        heartbeat = Thread(target=renew_leases, name="mallm-heartbeat", daemon=True)
+        heartbeat.start()
+        try:
+            with Progress() as progress:
+                task = progress.add_task(
+                    "[cyan]Finished discussions...", total=work_queue.unfinished()
                 )
-            logger.warning("Resampling from the dataset as a substitute...")
-            processing_data = self.data[: len(self.failed_example_ids)]
-            self.data = self.data[len(self.failed_example_ids) :]
-            self.failed_example_ids = []
+                self.serve(client, next_sample, report, progress, task)
+        finally:
+            stopped.set()
+            heartbeat.join()
+
+        if exhausted:
+            raise Exception(
+                "No more samples in the datasets to substitute failed samples."
+            )
+
+    def serve(
+        self,
+        client: httpx.Client,
+        next_sample: Callable[[], Optional[InputExample]],
+        report: Callable[[str, str], None],
+        progress: Progress,
+        task: TaskID,
+    ) -> None:
+        """
+        Runs samples with concurrent_api_requests threads or tasks, each until next_sample returns None for it.
+        Reports for each sample whether it completed or failed.
+        In batch mode, the samples in flight advance in lockstep and their requests form one batch per step.
+        In the combined mode, the discussion, the baseline and the ablation of a sample are separate jobs that any thread
+        or task can run. The ablation is queued once the discussion is done, since it repeats as many improvements as
+        the discussion exchanged messages. The sample is reported once all its jobs are done.
+        """
+        # The recorded console keeps the output of all discussions to save it as HTML
+        console = Console(record=not self.config.bounded_memory)
+        worker_functions = self.create_worker_functions()
+        if self.config.bounded_memory:
+            # Everything loaded so far lives for the whole run and is never scanned by the garbage collector again.
+            # The objects of a discussion are mostly freed by reference counting, so the young generation is collected less often.
+            gc.freeze()
+            gc.set_threshold(50_000, 20, 10)
+
+        # Jobs of the combined mode that wait for a thread or task, and the number of unfinished jobs of each sample
+        jobs: deque[tuple[JobType, InputExample]] = deque()
+        open_jobs: dict[str, int] = {}
+        jobs_lock = Lock()
+
+        def next_job() -> Optional[tuple[JobType, InputExample]]:
+            with jobs_lock:
+                if jobs:
+                    return jobs.popleft()
+            sample = next_sample()
+            if sample is None:
+                return None
+            if not self.config.use_combined:
+                return (JobType.BASELINE if self.config.use_baseline else JobType.DISCUSSION), sample
+            with jobs_lock:
+                open_jobs[sample.example_id] = 2
+                jobs.append((JobType.BASELINE, sample))
+            return JobType.DISCUSSION, sample
+
+        def run_job(job_type: JobType, sample: InputExample) -> None:
+            with self.memory_tracker.running() if self.memory_tracker else nullcontext():
+                if job_type == JobType.BASELINE:
+                    self.run_baseline(client, sample)
+                elif job_type == JobType.ABLATION:
+                    self.run_ablation(
+                        client, sample, self.pending_ablations.pop(sample.example_id)
+                    )
+                else:
+                    self.run_discussion(
+                        client, sample, console, progress, task, worker_functions
+                    )
+            failed = sample.example_id in self.failed_example_ids
+            if self.config.use_baseline and not failed:
+                progress.update(task, advance=1)
+            if self.config.use_combined:
+                with jobs_lock:
+                    if job_type == JobType.DISCUSSION and sample.example_id in self.pending_ablations:
+                        open_jobs[sample.example_id] += 1
+                        jobs.append((JobType.ABLATION, sample))
+                    open_jobs[sample.example_id] -= 1
+                    if open_jobs[sample.example_id]:
+                        return
+                    del open_jobs[sample.example_id]
+            report("failed" if failed else "completed", sample.example_id)
+
+        def run_thread() -> None:
+            while (job := next_job()) is not None:
+                run_job(*job)
+
+        async def arun_tasks() -> None:
+            loop = asyncio.get_running_loop()
+            # Waiting for the next sample blocks a thread per task, which the default executor has too few of
+            with ThreadPoolExecutor(self.config.concurrent_api_requests) as executor:
+
+                async def run_task() -> None:
+                    while (job := await loop.run_in_executor(executor, next_job)) is not None:
+                        async with self.batch_participant():
+                            await run_sync_in_loop(run_job, *job)
+
+                try:
+                    await asyncio.gather(
+                        *(run_task() for _ in range(self.config.concurrent_api_requests))
+                    )
+                finally:
+                    if self.batch_collector:
+                        await self.batch_collector.aclose()
+                    if self.async_http_client:
+                        await self.async_http_client.aclose()
+
+        if self.config.use_async or self.batch_collector:
+            # The batch mode needs the samples on one event loop to collect their requests
+            asyncio.run(arun_tasks())
+        else:
+            threads = [
+                Thread(target=run_thread)
+                for _ in range(self.config.concurrent_api_requests)
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
 
     def run(self) -> None:
         """
         The routine that runs the discussions between LLM agents on the provided data.
         """
-        with httpx.Client() as client:
-            if self.config.use_baseline:
-                self.manage_baseline(client)  # baseline (single LM)
-            else:
-                self.manage_discussions(client)  # multi-agent discussion
+        try:
+            with self.http_client as client:
+                if self.config.num_processes > 1:
+                    self.manage_processes()
+                elif self.work_queue:
+                    self.manage_work_queue(client, self.work_queue)
+                elif self.config.use_baseline:
+                    self.manage_baseline(client)  # baseline (single LM)
+                else:
+                    self.manage_discussions(client)  # multi-agent discussion
+        finally:
+            # Keeps the records of finished samples if the run fails
+            self.close_output()
+        self.log_call_statistics()
+        if self.endpoint_pool:
+            self.endpoint_pool.log_statistics()
+        if self.concurrency_limiter:
+            self.concurrency_limiter.log_statistics()
+        if self.call_scheduler:
+            self.call_scheduler.log_statistics()
+        if self.rate_limiter:
+            self.rate_limiter.log_statistics()
+        if self.batch_collector:
+            self.batch_collector.log_statistics()
+        if self.work_queue:
+            self.work_queue.log_statistics()
+            self.work_queue.close()
+        if self.response_cache:
+            self.response_cache.log_statistics()
+            self.response_cache.close()
+        if self.cassette:
+            self.cassette.close()
+        if self.memory_tracker:
+            self.memory_tracker.log_statistics()
+
+    def log_call_statistics(self) -> None:
+        """
+        Logs how many API calls were made in total and how often they had to be retried.
+        """
+        statistics = CallStatistics()
+        statistics.merge(self.llm.call_statistics)
+        if self.judge_llm:
+            statistics.merge(self.judge_llm.call_statistics)
+        logger.info(
+            f"API calls: {statistics.calls}, failed calls: {statistics.failed_calls}, retries by error type: {statistics.retries or 'none'}."
+        )
+        logger.info(
+            f"Token usage: {statistics.usage.prompt_tokens} prompt tokens, {statistics.usage.completion_tokens} completion tokens."
+        )
+        if statistics.hedged_calls:
+            logger.info(
+                f"Hedged {statistics.hedged_calls} calls ({statistics.hedged_calls / statistics.calls:.1%}), the hedged request finished first {statistics.hedge_wins} times."
+            )
+        if statistics.trimmed_prompts:
+            logger.warning(
+                f"Trimmed {statistics.trimmed_prompts} prompts by {statistics.trimmed_tokens} tokens to fit the context window."
+            )
+
+
+def run_worker(
+    config: Config,
+    dataset_name: str,
+    pending_ablations: dict[str, int],
+    tasks: "multiprocessing.Queue[Optional[InputExample]]",
+    events: "multiprocessing.Queue[tuple[str, Any]]",
+) -> None:
+    """
+    Entry point of a worker process started by Scheduler.manage_processes.
+    """
+    scheduler = Scheduler(config, worker=True)
+    scheduler.dataset_name = dataset_name
+    scheduler.pending_ablations = pending_ablations
+    # Not rendered, the parent process shows the progress of all workers
+    progress = Progress()
+    task = progress.add_task("[cyan]Finished discussions...")
+    try:
+        with scheduler.http_client as client:
+            scheduler.serve(
+                client,
+                tasks.get,
+                lambda event, example_id: events.put((event, example_id)),
+                progress,
+                task,
+            )
+    finally:
+        scheduler.close_output()
+        statistics = CallStatistics()
+        statistics.merge(scheduler.llm.call_statistics)
+        if scheduler.judge_llm:
+            statistics.merge(scheduler.judge_llm.call_statistics)
+        events.put(("statistics", statistics))
+        if scheduler.response_cache:
+            scheduler.response_cache.close()
+        if scheduler.cassette:
+            scheduler.cassette.close()
+        if scheduler.memory_tracker:
+            scheduler.memory_tracker.log_statistics()
 
 
 def main() -> None:
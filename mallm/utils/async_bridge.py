@@ -0,0 +1,65 @@
+"""
+Runs the synchronous discussion code on an asyncio event loop.
+
+The discussion logic (coordinator, paradigms, decision protocols, response generators) is written synchronously.
+Instead of duplicating it as coroutines, each discussion is executed inside a greenlet that is driven by an asyncio task.
+Whenever the synchronous code needs to wait for I/O (e.g. an LLM request in Chat), it hands the awaitable to the driving task
+with await_only() and is resumed once the result is available. This way thousands of discussions can share a single event loop
+without occupying one thread each.
+"""
+
+import asyncio
+import contextvars
+import sys
+from collections.abc import Awaitable
+from typing import Any, Callable, TypeVar
+
+import greenlet
+
+T = TypeVar("T")
+
+
+class _BridgeGreenlet(greenlet.greenlet):  # type: ignore
+    def __init__(self, fn: Callable[..., Any], driver: greenlet.greenlet) -> None:
+        super().__init__(fn, driver)
+        self.driver = driver
+
+
+def in_async_bridge() -> bool:
+    """
+    Returns whether the calling code runs inside run_sync_in_loop() and may therefore use await_only().
+    """
+    return isinstance(greenlet.getcurrent(), _BridgeGreenlet)
+
+
+def await_only(awaitable: Awaitable[T]) -> T:
+    """
+    Waits for an awaitable from synchronous code by suspending the current greenlet until the driving task resolved it.
+    Must only be called inside run_sync_in_loop().
+    """
+    current = greenlet.getcurrent()
+    if not isinstance(current, _BridgeGreenlet):
+        raise RuntimeError("await_only() can only be used inside run_sync_in_loop().")
+    result: T = current.driver.switch(awaitable)
+    return result
+
+
+async def run_sync_in_loop(fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """
+    Runs a synchronous function on the running event loop. Calls to await_only() within the function are awaited by this coroutine.
+    """
+    context = _BridgeGreenlet(fn, greenlet.getcurrent())
+    # The greenlet inherits the context variables of the calling task.
+    context.gr_context = contextvars.copy_context()
+    result: Any = context.switch(*args, **kwargs)
+    while not context.dead:
+        try:
+            # Awaiting the awaitable directly would run it in the context of the driving task,
+            # so it is scheduled as a task that sees the context variables set by the greenlet.
+            value = await context.gr_context.run(asyncio.ensure_future, result)
+        except BaseException:
+            result = context.throw(*sys.exc_info())
+        else:
+            result = context.switch(value)
+    return_value: T = result
+    return return_value
@@ -0,0 +1,59 @@
+import json
+import logging
+import os
+import threading
+from pathlib import Path
+from typing import Optional
+
+logger = logging.getLogger("mallm")
+
+
+class Checkpoint:
+    """
+    Persists the state of a run that is not part of its output records, so that an interrupted run can be resumed.
+
+    This is the order in which the samples are processed, including their example_ids, which are random for Hugging Face
+    datasets, and the samples that failed and were substituted by the next samples in that order.
+    The file is replaced atomically on every change, so that it is never left half-written.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self.order: list[int] = []
+        self.example_ids: list[str] = []
+        self.failed_example_ids: list[str] = []
+        self._lock = threading.Lock()
+
+    def load(self) -> bool:
+        """
+        Reads the checkpoint from disk. Returns False if there is no checkpoint yet.
+        """
+        if not self.path.exists():
+            return False
+        with open(self.path) as file:
+            state = json.load(file)
+        self.order = state["order"]
+        self.example_ids = state["example_ids"]
+        self.failed_example_ids = state["failed_example_ids"]
+        return True
+
+    def save(self, failed_example_id: Optional[str] = None) -> None:
+        """
+        Writes the checkpoint to disk, adding a sample that failed if given.
+        """
+        with self._lock:
+            if failed_example_id is not None:
+                self.failed_example_ids.append(failed_example_id)
+            temp_path = self.path.with_name(self.path.name + ".tmp")
+            with open(temp_path, "w") as file:
+                json.dump(
+                    {
+                        "order": self.order,
+                        "example_ids": self.example_ids,
+                        "failed_example_ids": self.failed_example_ids,
+                    },
+                    file,
+                )
+                file.flush()
+                os.fsync(file.fileno())
+            os.replace(temp_path, self.path)
@@ -1,12 +1,17 @@
+import importlib.util
 import logging
 import os
 import sys
-from dataclasses import dataclass, field
-from typing import Optional
+from dataclasses import dataclass, field, fields
+from typing import Any, Optional
 
 import requests
 
+from mallm.utils.enums import CallPriority
+from mallm.utils.functions import TIKTOKEN_PREFIX
+from mallm.utils.generation_profiles import GENERATION_PROFILES
 from mallm.utils.task_instructions import TASK_INSTRUCTIONS
+from mallm.utils.types import GenerationProfile
 
 logger = logging.getLogger("mallm")
 
@@ -21,6 +26,9 @@ class Config:
     endpoint_url: str = "https://api.openai.com/v1"
     model_name: str = "gpt-3.5-turbo"
     api_key: str = "-"
+    endpoints: list[Any] = field(default_factory=list)
+    endpoint_ejection_threshold: int = 3
+    endpoint_ejection_cooldown: float = 30.0
     max_turns: int = 10
     skip_decision_making: bool = False
     discussion_paradigm: str = "memory"
@@ -29,6 +37,9 @@ class Config:
     visible_turns_in_memory: int = 2
     debate_rounds: int = 2
     concurrent_api_requests: int = 100
+    num_processes: int = 1
+    work_queue_path: Optional[str] = None
+    work_queue_lease_seconds: float = 300.0
     use_baseline: bool = False
     use_chain_of_thought: bool = True
     num_agents: int = 3
@@ -44,7 +55,10 @@ class Config:
     hf_dataset_reference_column: Optional[str] = None
     hf_dataset_context_column: Optional[str] = None
     use_ablation: bool = False
+    use_combined: bool = False
     shuffle_input_samples: bool = False
+    longest_samples_first: bool = False
+    sample_cost_history: Optional[str] = None
     all_agents_generate_first_draft: bool = False
     all_agents_generate_draft: bool = False
     voting_protocols_with_alterations: bool = False
@@ -56,6 +70,46 @@ class Config:
     judge_model_name: Optional[str] = None
     judge_api_key: str = "-"
     judge_always_intervene: bool = False
+    use_async: bool = False
+    use_http2: bool = False
+    api_max_retries: int = 5
+    api_max_rate_limit_retries: int = 10
+    api_retry_base_delay: float = 1.0
+    api_retry_max_delay: float = 60.0
+    api_connect_timeout: float = 10.0
+    api_read_timeout: float = 60.0
+    api_timeout: float = 300.0
+    response_cache_path: Optional[str] = None
+    response_cache_max_size_mb: Optional[float] = 1024
+    response_cache_max_age_days: Optional[float] = 30
+    cassette_path: Optional[str] = None
+    cassette_mode: str = "record"
+    cassette_keep_latency: bool = True
+    api_stream_usage: bool = True
+    max_discussion_tokens: Optional[int] = None
+    max_discussion_seconds: Optional[float] = None
+    output_format: str = "json"
+    resume: bool = False
+    bounded_memory: bool = False
+    track_memory: bool = False
+    adaptive_concurrency: bool = False
+    adaptive_concurrency_initial: int = 8
+    adaptive_concurrency_min: int = 1
+    call_priority: Optional[str] = None
+    max_concurrent_calls: Optional[int] = None
+    api_requests_per_minute: Optional[int] = None
+    api_tokens_per_minute: Optional[int] = None
+    model_context_window: Optional[int] = None
+    judge_model_context_window: Optional[int] = None
+    model_tokenizer: Optional[str] = None
+    judge_model_tokenizer: Optional[str] = None
+    hedge_requests: bool = False
+    hedge_percentile: float = 0.95
+    structured_output: Optional[str] = None
+    batch_backend: Optional[str] = None
+    batch_dir: str = "batches"
+    batch_poll_interval: float = 30.0
+    generation_profiles: Optional[dict[str, dict[str, Any]]] = None
 
     def __post_init__(self) -> None:
         if (
@@ -115,15 +169,148 @@ class Config:
                 f"The length of the provided agent generators ({self.agent_generators_list}) does not match the number of agents (3). Setting num_agents={len(self.agent_generators_list)}."
             )
             self.num_agents = len(self.agent_generators_list)
+        for endpoint in self.endpoints:
+            if not isinstance(endpoint, (str, dict)) or (
+                isinstance(endpoint, dict) and "url" not in endpoint
+            ):
+                logger.error(
+                    f"Invalid endpoint: {endpoint}. Please provide endpoints as urls or as dictionaries with the keys url, api_key (optional), weight (optional) and max_concurrent_requests (optional)."
+                )
+                sys.exit(1)
+            if isinstance(endpoint, dict) and endpoint.get("weight", 1.0) <= 0:
+                logger.error(f"The weight of endpoint {endpoint['url']} must be positive.")
+                sys.exit(1)
         if self.endpoint_url.endswith("/"):
             logger.warning("Removing trailing / from the endpoint url.")
             self.endpoint_url = self.endpoint_url[:-1]
-        if self.concurrent_api_requests > 250:
+        if self.concurrent_api_requests > 250 and not self.adaptive_concurrency:
+            logger.warning(
+                "concurrent_api_requests is very large. Please make sure the API endpoint you are using can handle that many simultaneous requests or enable adaptive_concurrency."
+            )
+        if self.adaptive_concurrency and not (
+            1 <= self.adaptive_concurrency_min <= self.concurrent_api_requests
+            and self.adaptive_concurrency_initial >= 1
+        ):
+            logger.error(
+                "adaptive_concurrency_min and adaptive_concurrency_initial must be at least 1 and adaptive_concurrency_min must not exceed concurrent_api_requests."
+            )
+            sys.exit(1)
+        if self.call_priority is not None:
+            if self.call_priority not in [priority.value for priority in CallPriority]:
+                logger.error(
+                    f"Invalid call_priority: {self.call_priority}. Available options are: {', '.join(priority.value for priority in CallPriority)}."
+                )
+                sys.exit(1)
+            if self.max_concurrent_calls is None or self.max_concurrent_calls < 1:
+                logger.error(
+                    "Please set max_concurrent_calls to at least 1. Calls are only ordered by call_priority while they wait for one of these slots."
+                )
+                sys.exit(1)
+        if (self.api_requests_per_minute is not None and self.api_requests_per_minute <= 0) or (
+            self.api_tokens_per_minute is not None and self.api_tokens_per_minute <= 0
+        ):
+            logger.error("api_requests_per_minute and api_tokens_per_minute must be positive.")
+            sys.exit(1)
+        for context_window in (self.model_context_window, self.judge_model_context_window):
+            if context_window is not None and context_window <= 0:
+                logger.error("The context window of a model must be positive.")
+                sys.exit(1)
+        if self.structured_output not in {None, "openai", "vllm"}:
+            logger.error(
+                f"Invalid structured_output: {self.structured_output}. Available options are: openai, vllm."
+            )
+            sys.exit(1)
+        for name, profile in (self.generation_profiles or {}).items():
+            if name not in GENERATION_PROFILES:
+                logger.error(
+                    f"Invalid generation profile: {name}. Available options are: {list(GENERATION_PROFILES)}."
+                )
+                sys.exit(1)
+            invalid_keys = set(profile) - {f.name for f in fields(GenerationProfile)}
+            if invalid_keys:
+                logger.error(
+                    f"Invalid settings of the generation profile {name}: {invalid_keys}. Available settings are: max_tokens, stop, logprobs, stream."
+                )
+                sys.exit(1)
+        if self.output_format not in {"json", "jsonl"}:
+            logger.error(
+                f"Invalid output format: {self.output_format}. Available options are: json, jsonl."
+            )
+            sys.exit(1)
+        if not 1 <= self.num_processes <= self.concurrent_api_requests:
+            logger.error(
+                "num_processes must be at least 1 and must not exceed concurrent_api_requests."
+            )
+            sys.exit(1)
+        if self.num_processes > 1 and self.batch_backend:
+            logger.error("The batch mode runs all discussions in one process. Please set num_processes to 1.")
+            sys.exit(1)
+        if self.num_processes > 1 and self.cassette_path and self.cassette_mode == "record":
+            logger.error("A cassette can only be recorded by one process. Please set num_processes to 1.")
+            sys.exit(1)
+        if self.use_combined and (self.use_baseline or self.resume):
+            logger.error(
+                "The combined mode runs the baseline next to the discussions and cannot be resumed. Please set use_baseline and resume to False."
+            )
+            sys.exit(1)
+        if self.sample_cost_history and not os.path.isfile(self.sample_cost_history):
+            logger.error(f"The sample cost history {self.sample_cost_history} does not exist.")
+            sys.exit(1)
+        if self.work_queue_path:
+            if self.work_queue_lease_seconds <= 0:
+                logger.error("work_queue_lease_seconds must be positive.")
+                sys.exit(1)
+            if self.num_processes > 1 or self.batch_backend or self.resume:
+                logger.error(
+                    "A run with a work queue cannot be combined with num_processes, batch_backend or resume. The work queue keeps the state of the run itself."
+                )
+                sys.exit(1)
+        if self.batch_poll_interval <= 0:
+            logger.error("batch_poll_interval must be positive.")
+            sys.exit(1)
+        if not 0 < self.hedge_percentile < 1:
+            logger.error("hedge_percentile must be between 0 and 1.")
+            sys.exit(1)
+        if self.api_max_retries < 0 or self.api_max_rate_limit_retries < 0:
+            logger.error("The number of API retries must not be negative.")
+            sys.exit(1)
+        if min(self.api_connect_timeout, self.api_read_timeout, self.api_timeout) <= 0:
+            logger.error("The API timeouts must be positive.")
+            sys.exit(1)
+        if self.max_discussion_seconds is not None and self.max_discussion_seconds <= 0:
+            logger.error("max_discussion_seconds must be positive.")
+            sys.exit(1)
+        if self.api_retry_base_delay < 0 or self.api_retry_max_delay < 0:
+            logger.error("The API retry delays must not be negative.")
+            sys.exit(1)
+        if self.cassette_path:
+            if self.cassette_mode not in {"record", "replay"}:
+                logger.error(
+                    f"Invalid cassette mode: {self.cassette_mode}. Available options are: record, replay."
+                )
+                sys.exit(1)
+            if self.cassette_mode == "replay" and not os.path.isfile(
+                self.cassette_path
+            ):
+                logger.error(f"The cassette {self.cassette_path} does not exist.")
+                sys.exit(1)
+        for tokenizer in (self.model_tokenizer, self.judge_model_tokenizer):
+            if tokenizer is None:
+                continue
+            package = "tiktoken" if tokenizer.startswith(TIKTOKEN_PREFIX) else "transformers"
+            if importlib.util.find_spec(package) is None:
+                logger.error(
+                    f"The tokenizer {tokenizer} requires the {package} package (pip install mallm[tiktoken] for tiktoken encodings)."
+                )
+                sys.exit(1)
+        if self.use_http2 and importlib.util.find_spec("h2") is None:
             logger.warning(
-                "concurrent_api_requests is very large. Please make sure the API endpoint you are using can handle that many simultaneous requests."
+                "HTTP/2 requires the h2 package (pip install mallm[http2]). Falling back to HTTP/1.1."
             )
+            self.use_http2 = False
         # import here to avoid circular imports
         from mallm.utils.dicts import (  # noqa PLC0415
+            BATCH_BACKENDS,
             DECISION_PROTOCOLS,
             DISCUSSION_PARADIGMS,
             RESPONSE_GENERATORS,
@@ -144,3 +331,8 @@ class Config:
                 f"Invalid decision protocol: {self.decision_protocol}. Available options are: {DECISION_PROTOCOLS.keys()}."
             )
             sys.exit(1)
+        if self.batch_backend is not None and self.batch_backend not in BATCH_BACKENDS:
+            logger.error(
+                f"Invalid batch backend: {self.batch_backend}. Available options are: {BATCH_BACKENDS.keys()}."
+            )
+            sys.exit(1)
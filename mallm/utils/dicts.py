@@ -17,6 +17,9 @@ from mallm.discussion_paradigms.memory import DiscussionMemory
 from mallm.discussion_paradigms.paradigm import DiscussionParadigm
 from mallm.discussion_paradigms.relay import DiscussionRelay
 from mallm.discussion_paradigms.report import DiscussionReport
+from mallm.models.batch.BatchBackend import BatchBackend
+from mallm.models.batch.LocalBatchBackend import LocalBatchBackend
+from mallm.models.batch.OpenAIBatchBackend import OpenAIBatchBackend
 from mallm.models.discussion.CriticalResponseGenerator import CriticalResponseGenerator
 from mallm.models.discussion.FreeTextResponseGenerator import FreeTextResponseGenerator
 from mallm.models.discussion.ReasoningResponseGenerator import (
@@ -68,3 +71,8 @@ RESPONSE_GENERATORS: dict[str, type[ResponseGenerator]] = {
     "critical": CriticalResponseGenerator,
     "reasoning": ReasoningResponseGenerator,
 }
+
+BATCH_BACKENDS: dict[str, type[BatchBackend]] = {
+    "openai": OpenAIBatchBackend,
+    "local": LocalBatchBackend,
+}
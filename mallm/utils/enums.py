@@ -10,3 +10,46 @@ class DecisionAlteration(Enum):
     CONFIDENCE_PROMPTED = "confidence_prompted"
     CONFIDENCE_CONSISTENCY = "confidence_consistency"
     ANONYMOUS = "anonymous"
+
+
+class APIErrorType(Enum):
+    RATE_LIMIT = "rate_limit"
+    SERVER = "server_error"
+    TIMEOUT = "timeout"
+    CONNECTION = "connection"
+
+
+class CassetteMode(Enum):
+    RECORD = "record"
+    REPLAY = "replay"
+
+
+class CallType(Enum):
+    PERSONA = "persona"
+    DRAFT = "draft"
+    IMPROVE = "improve"
+    FEEDBACK = "feedback"
+    FINAL_ANSWER = "final_answer"
+    CONFIDENCE = "confidence"
+    VOTE = "vote"
+    JUDGE = "judge"
+    CHALLENGE = "challenge"
+    BASELINE = "baseline"
+    ABLATION = "ablation"
+
+
+class CallPriority(Enum):
+    FIFO = "fifo"
+    OLDEST_DISCUSSION = "oldest_discussion"
+    CLOSEST_TO_COMPLETION = "closest_to_completion"
+
+
+class JobType(Enum):
+    DISCUSSION = "discussion"
+    BASELINE = "baseline"
+    ABLATION = "ablation"
+
+
+class StructuredOutput(Enum):
+    OPENAI = "openai"
+    VLLM = "vllm"
@@ -1,4 +1,7 @@
-from typing import Optional
+from functools import cache
+from typing import Callable, Optional
+
+TIKTOKEN_PREFIX = "tiktoken:"
 
 
 def extract_draft(response: Optional[str]) -> Optional[str]:
@@ -14,3 +17,76 @@ def extract_draft(response: Optional[str]) -> Optional[str]:
             0
         ]  # because LM tends to add extra explanation afterwards
     return None
+
+
+def draft_complete(partial_response: str) -> bool:
+    """
+    Returns whether a partial response already contains everything that extract_draft() would extract from it.
+    """
+    match_str = "final solution"
+    position = partial_response.lower().rfind(match_str)
+    if position == -1:
+        return False
+    matched_str = partial_response[position + len(match_str) :].lstrip()
+    # A mention of the final solution in the reasoning is not followed by a colon, the actual solution comes later
+    if matched_str.startswith("]:"):
+        matched_str = matched_str[2:]
+    elif matched_str.startswith(":"):
+        matched_str = matched_str[1:]
+    else:
+        return False
+    # The solution ends with a blank line, which can only follow once some solution text was streamed
+    return "\n\n" in matched_str.lstrip()
+
+
+def json_object_complete(partial_response: str) -> bool:
+    """
+    Returns whether the first JSON object of a partial response is closed.
+    """
+    depth = 0
+    in_string = False
+    escaped = False
+    for char in partial_response[max(partial_response.find("{"), 0) :]:
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char == "{":
+            depth += 1
+        elif char == "}":
+            depth -= 1
+            if depth == 0:
+                return True
+    return False
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Estimates the number of tokens of a text at about four characters per token.
+    """
+    return (len(text) + 3) // 4
+
+
+@cache
+def token_counter(tokenizer: Optional[str]) -> Callable[[str], int]:
+    """
+    Returns a function that counts the tokens of a text with a tokenizer, which is loaded on first use.
+    "tiktoken:<encoding>" selects an encoding of tiktoken, any other name a tokenizer from the Hugging Face Hub or a local path.
+    Without a tokenizer, the tokens are estimated by estimate_tokens().
+    """
+    if tokenizer is None:
+        return estimate_tokens
+    if tokenizer.startswith(TIKTOKEN_PREFIX):
+        import tiktoken  # noqa: PLC0415
+
+        encoding = tiktoken.get_encoding(tokenizer.removeprefix(TIKTOKEN_PREFIX))
+        return lambda text: len(encoding.encode(text, disallowed_special=()))
+    from transformers import AutoTokenizer  # noqa: PLC0415
+
+    hf_tokenizer = AutoTokenizer.from_pretrained(tokenizer)
+    return lambda text: len(hf_tokenizer.encode(text, add_special_tokens=False))
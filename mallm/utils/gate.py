@@ -0,0 +1,84 @@
+import asyncio
+import threading
+from typing import Callable, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+class Gate:
+    """
+    Lets threads and coroutines wait until a resource becomes available.
+
+    Subclasses try to take the resource with a function that returns None while it is unavailable and call notify()
+    whenever it might have become available. Threads block on a condition variable, while coroutines wait on a future
+    so that the event loop is not blocked.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Condition()
+        self._async_waiters: list[asyncio.Future[None]] = []
+
+    def wait_for(self, take: Callable[[], Optional[T]], timeout: Optional[float] = None) -> T:
+        """
+        Blocks the calling thread until take() succeeds. take() is called while holding the lock.
+        If timeout is given, take() is retried at least every timeout seconds, e.g. for resources that refill over time.
+        """
+        with self._lock:
+            while True:
+                result = take()
+                if result is not None:
+                    return result
+                self._lock.wait(timeout)
+
+    async def await_for(self, take: Callable[[], Optional[T]], timeout: Optional[float] = None) -> T:
+        """
+        Waits without blocking the event loop until take() succeeds. take() is called while holding the lock.
+        """
+        while True:
+            with self._lock:
+                result = take()
+                if result is not None:
+                    return result
+                waiter = asyncio.get_running_loop().create_future()
+                self._async_waiters.append(waiter)
+            try:
+                await asyncio.wait_for(asyncio.shield(waiter), timeout)
+            except asyncio.TimeoutError:
+                with self._lock:
+                    if waiter in self._async_waiters:
+                        self._async_waiters.remove(waiter)
+            except asyncio.CancelledError:
+                with self._lock:
+                    if waiter in self._async_waiters:
+                        self._async_waiters.remove(waiter)
+                    else:
+                        # Pass the wake-up on to the next waiting coroutine
+                        self._wake_next()
+                raise
+
+    def notify(self) -> None:
+        """
+        Wakes up one waiting thread and one waiting coroutine. Must be called while holding the lock.
+        """
+        self._lock.notify()
+        self._wake_next()
+
+    def notify_all(self) -> None:
+        """
+        Wakes up all waiting threads and coroutines. Must be called while holding the lock.
+        """
+        self._lock.notify_all()
+        while self._async_waiters:
+            self._wake_next()
+
+    def _wake_next(self) -> None:
+        while self._async_waiters:
+            waiter = self._async_waiters.pop(0)
+            if not waiter.done():
+                waiter.get_loop().call_soon_threadsafe(self._wake, waiter)
+                return
+
+    @staticmethod
+    def _wake(waiter: asyncio.Future[None]) -> None:
+        if not waiter.done():
+            waiter.set_result(None)
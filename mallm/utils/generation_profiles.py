@@ -0,0 +1,19 @@
+from mallm.utils.types import GenerationProfile
+
+# Only the final answers feed their log probabilities into the confidence of a vote.
+# Calls with a short, fixed answer format get small budgets. Votes and personas are streamed, so that their stream can
+# be closed as soon as they are parsed, the shortest answers are not streamed at all.
+# The contributions to a discussion keep the default parameters, but can be tuned separately per call type.
+GENERATION_PROFILES: dict[str, GenerationProfile] = {
+    "default": GenerationProfile(),
+    "draft": GenerationProfile(),
+    "improve": GenerationProfile(),
+    "feedback": GenerationProfile(),
+    "agreement": GenerationProfile(),
+    "judge": GenerationProfile(),
+    "final_answer": GenerationProfile(logprobs=True),
+    "vote": GenerationProfile(max_tokens=64),
+    "confidence": GenerationProfile(max_tokens=8, stream=False),
+    "challenge": GenerationProfile(max_tokens=16, stream=False),
+    "persona": GenerationProfile(max_tokens=512),
+}
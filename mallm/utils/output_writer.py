@@ -0,0 +1,114 @@
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from collections.abc import Iterator
+from pathlib import Path
+from typing import Any, Optional
+
+logger = logging.getLogger("mallm")
+
+
+class OutputWriter:
+    """
+    Appends the output records of a run to a JSON lines file from a single background thread.
+
+    Threads and tasks hand their finished records over with write() and never touch the file themselves, so that records
+    cannot interleave and each record is serialized only once. The file is synced to disk at most every fsync_interval
+    seconds, which batches the records that finished in the meantime.
+    """
+
+    def __init__(self, path: Path, fsync_interval: float = 1.0) -> None:
+        self.path = path
+        self.fsync_interval = fsync_interval
+        self.records = 0
+        self._queue: queue.Queue[Optional[dict[str, Any]]] = queue.Queue()
+        self._file = open(path, "a")
+        self._thread = threading.Thread(target=self._run, name="mallm-output-writer", daemon=True)
+        self._thread.start()
+
+    def write(self, record: dict[str, Any]) -> None:
+        """
+        Queues a record for writing. The writer thread holds the only reference to it afterwards.
+        """
+        self._queue.put(record)
+
+    def close(self) -> None:
+        """
+        Writes all queued records, syncs them to disk and closes the file.
+        """
+        self._queue.put(None)
+        self._thread.join()
+        self._file.close()
+
+    def convert_to_json(self, json_path: Path) -> None:
+        """
+        Converts the written records into a JSON array at json_path, one record at a time, and removes the JSON lines file.
+        """
+        with open(self.path) as lines, open(json_path, "w") as file:
+            file.write("[")
+            for i, line in enumerate(line for line in lines if line.strip()):
+                file.write(("," if i else "") + line.rstrip("\n"))
+            file.write("]")
+        os.remove(self.path)
+
+    def merge(self, path: Path) -> None:
+        """
+        Appends the records of another JSON lines file after the writer was closed, and removes that file.
+        Lines are copied without parsing them. Only a last line that was cut off by a crash is skipped.
+        """
+        with open(path) as lines, open(self.path, "a") as file:
+            for line in lines:
+                if line.endswith("\n") and line.strip():
+                    file.write(line)
+                    self.records += 1
+        os.remove(path)
+
+    @staticmethod
+    def read_records(path: Path) -> Iterator[dict[str, Any]]:
+        """
+        Reads the records of a JSON lines file or of a JSON array. A last line that was cut off by a crash is skipped.
+        """
+        with open(path) as file:
+            if path.suffix == ".json":
+                yield from json.load(file)
+                return
+            for line in file:
+                if not line.strip():
+                    continue
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    logger.warning(f"Skipping an incomplete record in {path}.")
+
+    def _run(self) -> None:
+        last_sync = time.monotonic()
+        unsynced = False
+        while True:
+            try:
+                # Without unsynced records there is nothing to sync, so wait for the next record
+                record = self._queue.get(
+                    timeout=max(0.0, self.fsync_interval - (time.monotonic() - last_sync)) if unsynced else None
+                )
+            except queue.Empty:
+                self._sync()
+                last_sync, unsynced = time.monotonic(), False
+                continue
+            if record is None:
+                break
+            try:
+                self._file.write(json.dumps(record) + "\n")
+                self.records += 1
+                unsynced = True
+            except Exception as e:
+                logger.error(f"Failed to write output to {self.path}: {e}")
+            if time.monotonic() - last_sync >= self.fsync_interval:
+                self._sync()
+                last_sync, unsynced = time.monotonic(), False
+        self._sync()
+
+    def _sync(self) -> None:
+        self._file.flush()
+        os.fsync(self._file.fileno())
@@ -0,0 +1,59 @@
+import json
+import logging
+from pathlib import Path
+from typing import Optional
+
+from mallm.utils.functions import estimate_tokens
+from mallm.utils.output_writer import OutputWriter
+from mallm.utils.types import InputExample
+
+logger = logging.getLogger("mallm")
+
+
+class SampleCostEstimator:
+    """
+    Estimates how long the discussion of a sample takes, so that the longest discussions can be started first.
+
+    Without history, the estimate is the number of tokens of the inputs and the context of the sample. Given the output
+    of an earlier run, samples with the same inputs and context are estimated by the seconds their discussion took then,
+    and the other samples by their tokens times the seconds per token observed in that run.
+    """
+
+    def __init__(self, history_path: Optional[str] = None) -> None:
+        self.seconds: dict[str, float] = {}
+        self.seconds_per_token: Optional[float] = None
+        if history_path:
+            self._load_history(Path(history_path))
+
+    @staticmethod
+    def key(inputs: list[str], context: Optional[list[str]]) -> str:
+        return json.dumps([inputs, context])
+
+    @staticmethod
+    def tokens(sample: InputExample) -> int:
+        return estimate_tokens("\n".join(sample.inputs + (sample.context or [])))
+
+    def estimate(self, sample: InputExample) -> float:
+        seconds = self.seconds.get(self.key(sample.inputs, sample.context))
+        if seconds is not None:
+            return seconds
+        tokens = self.tokens(sample)
+        return tokens * self.seconds_per_token if self.seconds_per_token else tokens
+
+    def longest_first(self, samples: list[InputExample]) -> list[InputExample]:
+        """
+        Sorts the samples by their estimated duration in descending order. Samples with equal estimates keep their order.
+        """
+        return sorted(samples, key=self.estimate, reverse=True)
+
+    def _load_history(self, path: Path) -> None:
+        tokens: dict[str, int] = {}
+        for record in OutputWriter.read_records(path):
+            if record.get("clockSeconds") is None or not record.get("input"):
+                continue
+            key = self.key(record["input"], record.get("context"))
+            self.seconds[key] = record["clockSeconds"]
+            tokens[key] = estimate_tokens("\n".join(record["input"] + (record.get("context") or [])))
+        if sum(tokens.values()):
+            self.seconds_per_token = sum(self.seconds.values()) / sum(tokens.values())
+        logger.info(f"Estimating the duration of the samples from {len(self.seconds)} samples in {path}.")
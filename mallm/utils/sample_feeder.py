@@ -0,0 +1,51 @@
+import logging
+import threading
+from collections import deque
+from typing import Optional
+
+from mallm.utils.types import InputExample
+
+logger = logging.getLogger("mallm")
+
+
+class SampleFeeder:
+    """
+    Hands out the samples of a run one at a time to the threads or tasks that process them.
+
+    A failed sample is substituted by the next remaining sample as soon as it is reported, so that the substitute starts
+    in the slot that became free instead of after all other samples finished.
+    """
+
+    def __init__(
+        self, samples: list[InputExample], substitutes: list[InputExample]
+    ) -> None:
+        self.exhausted = False
+        self._samples = deque(samples)
+        self._substitutes = deque(substitutes)
+        self._lock = threading.Lock()
+
+    def next(self) -> Optional[InputExample]:
+        """
+        Returns the next sample, or None if there is none left.
+        """
+        with self._lock:
+            return self._samples.popleft() if self._samples else None
+
+    def report(self, event: str, example_id: str) -> None:
+        """
+        Takes the result of a sample, and queues a substitute if it failed.
+        """
+        if event != "failed":
+            return
+        with self._lock:
+            if self._substitutes:
+                substitute = self._substitutes.popleft()
+                self._samples.append(substitute)
+                logger.warning(
+                    f"Sample {example_id} failed. Substituting it with sample {substitute.example_id}."
+                )
+            else:
+                self.exhausted = True
+                logger.error(
+                    "No more samples in the datasets to substitute failed samples."
+                )
@@ -0,0 +1,142 @@
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+from mallm.utils.enums import CallType
+from mallm.utils.types import CallStatistics, Deadline, DiscussionProgress
+
+_call_statistics: ContextVar[Optional[CallStatistics]] = ContextVar(
+    "mallm_call_statistics", default=None
+)
+_call_scope: ContextVar[tuple[Optional[str], Optional[CallType]]] = ContextVar(
+    "mallm_call_scope", default=(None, None)
+)
+_deadline: ContextVar[Optional[Deadline]] = ContextVar("mallm_deadline", default=None)
+_discussion_progress: ContextVar[Optional[DiscussionProgress]] = ContextVar(
+    "mallm_discussion_progress", default=None
+)
+
+
+@contextmanager
+def track_call_statistics() -> Iterator[CallStatistics]:
+    """
+    Collects the statistics of all LLM calls made in this context, e.g. during one discussion.
+    """
+    statistics = CallStatistics()
+    token = _call_statistics.set(statistics)
+    try:
+        yield statistics
+    finally:
+        _call_statistics.reset(token)
+
+
+def current_call_statistics() -> Optional[CallStatistics]:
+    """
+    Returns the statistics collected by the innermost track_call_statistics() context, if any.
+    """
+    return _call_statistics.get()
+
+
+@contextmanager
+def call_scope(
+    agent_id: Optional[str] = None, call_type: Optional[CallType] = None
+) -> Iterator[None]:
+    """
+    Attributes all LLM calls made in this context to an agent and a call type.
+    Arguments that are not given are inherited from the enclosing scope.
+    """
+    outer_agent_id, outer_call_type = _call_scope.get()
+    token = _call_scope.set(
+        (agent_id or outer_agent_id, call_type or outer_call_type)
+    )
+    try:
+        yield
+    finally:
+        _call_scope.reset(token)
+
+
+def current_call_scope() -> tuple[Optional[str], Optional[CallType]]:
+    """
+    Returns the agent id and the call type of the current call_scope().
+    """
+    return _call_scope.get()
+
+
+def token_budget_exhausted(budget: Optional[int]) -> bool:
+    """
+    Returns whether the LLM calls tracked by the current track_call_statistics() context used up the token budget.
+    """
+    statistics = current_call_statistics()
+    return (
+        budget is not None
+        and statistics is not None
+        and statistics.usage.total_tokens >= budget
+    )
+
+
+class DeadlineExceeded(Exception):
+    """
+    Raised by an LLM call that cannot finish before the deadline of its discussion.
+    """
+
+
+@contextmanager
+def discussion_deadline(seconds: Optional[float]) -> Iterator[Deadline]:
+    """
+    Gives the discussion running in this context a wall-clock deadline, if seconds is not None.
+    """
+    deadline = Deadline(None if seconds is None else time.monotonic() + seconds)
+    token = _deadline.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _deadline.reset(token)
+
+
+def deadline_exceeded() -> bool:
+    """
+    Returns whether the deadline of the current discussion_deadline() context has passed.
+    Callers stop once it has, so the deadline then counts as reached.
+    """
+    deadline = _deadline.get()
+    if deadline is None or deadline.expires is None or time.monotonic() < deadline.expires:
+        return False
+    deadline.reached = True
+    return True
+
+
+def check_deadline(wait: float = 0.0) -> Optional[float]:
+    """
+    Returns the seconds left until the deadline of the current discussion_deadline() context, or None without a deadline.
+    Raises DeadlineExceeded if the deadline passes within wait seconds.
+    """
+    deadline = _deadline.get()
+    if deadline is None or deadline.expires is None:
+        return None
+    remaining = deadline.expires - time.monotonic()
+    if remaining <= wait:
+        deadline.reached = True
+        raise DeadlineExceeded(f"The deadline of the discussion passes in {max(0.0, remaining):.1f} seconds.")
+    return remaining
+
+
+@contextmanager
+def track_discussion_progress(max_turns: int) -> Iterator[DiscussionProgress]:
+    """
+    Tracks the turns of the discussion running in this context, which the discussion paradigm updates.
+    """
+    progress = DiscussionProgress(started=time.monotonic(), max_turns=max_turns)
+    token = _discussion_progress.set(progress)
+    try:
+        yield progress
+    finally:
+        _discussion_progress.reset(token)
+
+
+def current_discussion_progress() -> Optional[DiscussionProgress]:
+    """
+    Returns the progress of the discussion of the current track_discussion_progress() context, if any.
+    """
+    return _discussion_progress.get()
@@ -1,5 +1,5 @@
 # noqa: A005
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from typing import Any, Callable, Optional
 
 from torch import Tensor
@@ -110,3 +110,90 @@ class WorkerFunctions:
     worker_paraphrase_function: Callable[[list[str]], list[Tensor]]
     worker_context_function: Callable[[str], str]
     worker_persona_diversity_function: Callable[[list[str]], float]
+
+
+@dataclass
+class TokenUsage:
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+
+    @property
+    def total_tokens(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
+
+    def add(self, other: "TokenUsage") -> None:
+        self.prompt_tokens += other.prompt_tokens
+        self.completion_tokens += other.completion_tokens
+
+
+@dataclass
+class CallStatistics:
+    calls: int = 0
+    failed_calls: int = 0
+    retries: dict[str, int] = field(default_factory=dict)
+    usage: TokenUsage = field(default_factory=TokenUsage)
+    usage_by_call_type: dict[str, TokenUsage] = field(default_factory=dict)
+    usage_by_agent: dict[str, TokenUsage] = field(default_factory=dict)
+    trimmed_prompts: int = 0
+    trimmed_tokens: int = 0
+    hedged_calls: int = 0
+    hedge_wins: int = 0
+
+    def merge(self, other: "CallStatistics") -> None:
+        self.calls += other.calls
+        self.failed_calls += other.failed_calls
+        self.hedged_calls += other.hedged_calls
+        self.hedge_wins += other.hedge_wins
+        self.trimmed_prompts += other.trimmed_prompts
+        self.trimmed_tokens += other.trimmed_tokens
+        for error_type, count in other.retries.items():
+            self.retries[error_type] = self.retries.get(error_type, 0) + count
+        self.usage.add(other.usage)
+        for call_type, usage in other.usage_by_call_type.items():
+            self.usage_by_call_type.setdefault(call_type, TokenUsage()).add(usage)
+        for agent_id, usage in other.usage_by_agent.items():
+            self.usage_by_agent.setdefault(agent_id, TokenUsage()).add(usage)
+
+
+@dataclass
+class Deadline:
+    """
+    The wall-clock deadline of a discussion, and whether the discussion was cut short by it.
+    """
+
+    expires: Optional[float]
+    reached: bool = False
+
+
+@dataclass
+class DiscussionProgress:
+    """
+    How far a discussion has come, which decides the priority of its LLM calls.
+    """
+
+    started: float
+    max_turns: int
+    turn: int = 0
+
+
+@dataclass
+class OutputConstraint:
+    """
+    Restricts the response of an LLM call to a regular expression or a JSON schema if the endpoint supports structured output.
+    """
+
+    name: str
+    regex: Optional[str] = None
+    json_schema: Optional[dict[str, Any]] = None
+
+
+@dataclass
+class GenerationProfile:
+    """
+    Generation parameters of a kind of LLM call. A max_tokens of None falls back to the max_tokens of the model.
+    """
+
+    max_tokens: Optional[int] = None
+    stop: list[str] = field(default_factory=list)
+    logprobs: bool = False
+    stream: bool = True
@@ -0,0 +1,250 @@
+import dataclasses
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from collections.abc import Iterator
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Optional
+
+from mallm.utils.types import InputExample
+
+logger = logging.getLogger("mallm")
+
+
+class WorkQueue:
+    """
+    Queue of the samples of a run that is shared by several nodes through a SQLite database, e.g. on a shared filesystem.
+
+    The first node fills the queue. The first num_samples samples are pending, the others are kept in reserve to
+    substitute failed samples. Each node leases pending samples for lease_seconds and renews its leases with heartbeat()
+    while they run. The leases of a node that died expire, and their samples are leased again by the other nodes.
+    The output records of the nodes are committed to the queue as well, so that the last node to finish can write the
+    output of all nodes.
+    Note that SQLite relies on file locks, which some network filesystems do not implement correctly.
+    """
+
+    def __init__(self, path: str, lease_seconds: float = 300.0) -> None:
+        self.path = path
+        self.lease_seconds = lease_seconds
+        # Unique per run, so that a restarted node with the same process id does not renew the leases of its predecessor
+        self.owner = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._lock = threading.Lock()
+
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        # Transactions are started explicitly, so that leasing a sample locks the database for the other nodes
+        self._connection = sqlite3.connect(
+            path, timeout=60.0, isolation_level=None, check_same_thread=False
+        )
+        with self._transaction() as connection:
+            connection.execute(
+                """CREATE TABLE IF NOT EXISTS samples (
+                    position INTEGER PRIMARY KEY,
+                    example_id TEXT NOT NULL UNIQUE,
+                    sample TEXT NOT NULL,
+                    state TEXT NOT NULL,
+                    owner TEXT,
+                    lease_expires REAL,
+                    leases INTEGER NOT NULL DEFAULT 0
+                )"""
+            )
+            connection.execute(
+                "CREATE INDEX IF NOT EXISTS samples_state ON samples (state, position)"
+            )
+            connection.execute(
+                """CREATE TABLE IF NOT EXISTS results (
+                    example_id TEXT NOT NULL,
+                    kind TEXT NOT NULL,
+                    record TEXT NOT NULL,
+                    PRIMARY KEY (example_id, kind)
+                )"""
+            )
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)"
+            )
+
+    def populate(self, samples: list[InputExample], num_samples: Optional[int]) -> bool:
+        """
+        Fills the queue with the samples, unless another node already did. Returns whether the queue was filled.
+        """
+        with self._transaction() as connection:
+            if connection.execute("SELECT COUNT(*) FROM samples").fetchone()[0]:
+                return False
+            connection.executemany(
+                "INSERT INTO samples (position, example_id, sample, state) VALUES (?, ?, ?, ?)",
+                (
+                    (
+                        position,
+                        sample.example_id,
+                        json.dumps(dataclasses.asdict(sample)),
+                        "pending" if num_samples is None or position < num_samples else "reserve",
+                    )
+                    for position, sample in enumerate(samples)
+                ),
+            )
+        return True
+
+    def lease(self) -> Optional[InputExample]:
+        """
+        Leases the next pending sample, or a sample whose lease expired. Returns None if there is none.
+        """
+        now = time.time()
+        with self._transaction() as connection:
+            row = connection.execute(
+                """SELECT position, sample, leases FROM samples
+                WHERE state = 'pending' OR (state = 'leased' AND lease_expires < ?)
+                ORDER BY position LIMIT 1""",
+                (now,),
+            ).fetchone()
+            if row is None:
+                return None
+            position, sample, leases = row
+            connection.execute(
+                "UPDATE samples SET state = 'leased', owner = ?, lease_expires = ?, leases = leases + 1 WHERE position = ?",
+                (self.owner, now + self.lease_seconds, position),
+            )
+        example = InputExample(**json.loads(sample))
+        if leases:
+            logger.warning(f"The lease of sample {example.example_id} expired. Running it again.")
+        return example
+
+    def heartbeat(self) -> None:
+        """
+        Renews the leases of all samples this node is running.
+        """
+        with self._transaction() as connection:
+            connection.execute(
+                "UPDATE samples SET lease_expires = ? WHERE state = 'leased' AND owner = ?",
+                (time.time() + self.lease_seconds, self.owner),
+            )
+
+    def add_result(self, kind: str, record: dict[str, Any]) -> None:
+        """
+        Commits an output record. The record of a sample that ran again replaces the previous one.
+        """
+        with self._transaction() as connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO results (example_id, kind, record) VALUES (?, ?, ?)",
+                (record["exampleId"], kind, json.dumps(record)),
+            )
+
+    def complete(self, example_id: str) -> None:
+        with self._transaction() as connection:
+            updated = connection.execute(
+                "UPDATE samples SET state = 'done', owner = NULL WHERE example_id = ? AND state = 'leased' AND owner = ?",
+                (example_id, self.owner),
+            ).rowcount
+        if not updated:
+            logger.warning(f"The lease of sample {example_id} expired before it completed.")
+
+    def fail(self, example_id: str) -> bool:
+        """
+        Marks a sample as failed and makes the next sample in reserve pending as its substitute.
+        Returns False if there is no sample left to substitute it.
+        """
+        with self._transaction() as connection:
+            failed = connection.execute(
+                "UPDATE samples SET state = 'failed', owner = NULL WHERE example_id = ? AND state = 'leased' AND owner = ?",
+                (example_id, self.owner),
+            ).rowcount
+            # Otherwise another node runs the sample again since its lease expired, so it needs no substitute
+            substituted = not failed or bool(
+                connection.execute(
+                    """UPDATE samples SET state = 'pending' WHERE position = (
+                        SELECT MIN(position) FROM samples WHERE state = 'reserve'
+                    )"""
+                ).rowcount
+            )
+        if not failed:
+            logger.warning(f"The lease of sample {example_id} expired before it failed.")
+        return substituted
+
+    def unfinished(self) -> int:
+        """
+        Returns the number of samples that are pending or running on any node.
+        """
+        with self._lock:
+            return int(
+                self._connection.execute(
+                    "SELECT COUNT(*) FROM samples WHERE state IN ('pending', 'leased')"
+                ).fetchone()[0]
+            )
+
+    def claim_merge(self) -> bool:
+        """
+        Returns True for exactly one node once all samples are finished, which then writes the output of all nodes.
+        """
+        with self._transaction() as connection:
+            if connection.execute(
+                "SELECT COUNT(*) FROM samples WHERE state IN ('pending', 'leased')"
+            ).fetchone()[0]:
+                return False
+            return bool(
+                connection.execute(
+                    "INSERT OR IGNORE INTO meta (key, value) VALUES ('merged_by', ?)",
+                    (self.owner,),
+                ).rowcount
+            )
+
+    def results(self, kind: str) -> Iterator[dict[str, Any]]:
+        """
+        Yields the committed output records of all nodes in the order of their samples.
+        """
+        connection = sqlite3.connect(self.path, timeout=60.0)
+        try:
+            for (record,) in connection.execute(
+                """SELECT results.record FROM results
+                JOIN samples ON samples.example_id = results.example_id
+                WHERE results.kind = ? ORDER BY samples.position""",
+                (kind,),
+            ):
+                yield json.loads(record)
+        finally:
+            connection.close()
+
+    def log_statistics(self) -> None:
+        with self._lock:
+            counts = dict(
+                self._connection.execute(
+                    "SELECT state, COUNT(*) FROM samples GROUP BY state"
+                ).fetchall()
+            )
+        logger.info(
+            f"Work queue: {counts.get('done', 0)} samples done, {counts.get('failed', 0)} failed, "
+            f"{counts.get('pending', 0) + counts.get('leased', 0)} unfinished."
+        )
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        with self._lock:
+            self._connection.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._connection
+            except BaseException:
+                self._connection.execute("ROLLBACK")
+                raise
+            self._connection.execute("COMMIT")
+
+
+class WorkQueueWriter:
+    """
+    Commits the output records of a node to the work queue instead of writing them to a file.
+    """
+
+    def __init__(self, work_queue: WorkQueue, kind: str) -> None:
+        self.work_queue = work_queue
+        self.kind = kind
+        self.records = 0
+
+    def write(self, record: dict[str, Any]) -> None:
+        self.work_queue.add_result(self.kind, record)
+        self.records += 1
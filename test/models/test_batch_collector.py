@@ -0,0 +1,70 @@
+import asyncio
+import json
+from pathlib import Path
+from typing import Optional
+
+from openai import OpenAI
+
+from mallm.models.batch.BatchBackend import BatchBackend
+from mallm.models.batch.BatchCollector import BatchCollector
+
+
+class EchoBackend(BatchBackend):
+    def __init__(self, directory: Path, fail_first: bool = False):
+        super().__init__(OpenAI(api_key="-"), directory)
+        self.batch_sizes: list[int] = []
+        self.fail_first = fail_first
+
+    def submit(self, input_path: Path) -> str:
+        batch_id = f"batch-{len(self.batch_sizes)}"
+        with open(input_path) as file:
+            requests = [json.loads(line) for line in file]
+        self.batch_sizes.append(len(requests))
+        with open(self.directory / f"{batch_id}-output.jsonl", "w") as file:
+            for request in requests:
+                failed = self.fail_first and len(self.batch_sizes) == 1
+                response = {
+                    "status_code": 500 if failed else 200,
+                    "body": {"content": request["body"]["messages"][0]["content"]},
+                }
+                file.write(json.dumps({"custom_id": request["custom_id"], "response": response}) + "\n")
+        return batch_id
+
+    def poll(self, batch_id: str) -> Optional[Path]:
+        return self.directory / f"{batch_id}-output.jsonl"
+
+
+def request(content: str) -> dict:
+    return {"model": "m", "messages": [{"role": "user", "content": content}], "stream": True}
+
+
+def test_waits_for_all_participants(tmp_path):
+    backend = EchoBackend(tmp_path)
+    collector = BatchCollector(backend, poll_interval=0.01)
+
+    async def participant(name: str) -> list[str]:
+        async with collector.participant():
+            first = await collector.submit(request(f"{name}-1"))
+            second = await collector.submit(request(f"{name}-2"))
+            return [first["content"], second["content"]]
+
+    async def run() -> list[list[str]]:
+        return await asyncio.gather(*(participant(name) for name in "abc"))
+
+    assert asyncio.run(run()) == [["a-1", "a-2"], ["b-1", "b-2"], ["c-1", "c-2"]]
+    assert backend.batch_sizes == [3, 3]
+
+
+def test_retries_failed_requests_with_next_batch(tmp_path):
+    backend = EchoBackend(tmp_path, fail_first=True)
+    collector = BatchCollector(backend, poll_interval=0.01)
+    assert asyncio.run(collector.submit(request("x")))["content"] == "x"
+    assert backend.batch_sizes == [1, 1]
+
+
+def test_batch_body_merges_extra_body():
+    body = BatchCollector.batch_body(
+        {**request("x"), "stream_options": {"include_usage": True}, "extra_body": {"guided_regex": "0|1"}}
+    )
+    assert "stream" not in body and "stream_options" not in body
+    assert body["guided_regex"] == "0|1"
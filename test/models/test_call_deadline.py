@@ -0,0 +1,47 @@
+import asyncio
+from types import SimpleNamespace
+
+from openai import AsyncOpenAI, OpenAI
+
+from mallm.models.Chat import Chat
+from mallm.utils.async_bridge import await_only, run_sync_in_loop
+from mallm.utils.tracking import discussion_deadline
+from mallm.utils.types import CallStatistics
+
+PROMPT = [{"role": "user", "content": "Answer."}]
+
+
+class FakeAsyncCompletions:
+    def __init__(self):
+        self.timeouts = []
+
+    async def create(self, timeout, **request):
+        self.timeouts.append(timeout)
+        return self.stream()
+
+    @staticmethod
+    async def stream():
+        yield SimpleNamespace(
+            choices=[
+                SimpleNamespace(delta=SimpleNamespace(content="42"), logprobs=None)
+            ],
+            usage=None,
+        )
+
+
+# Test that async calls of a discussion are limited to the time left before its deadline
+def test_async_attempt_timeout_is_limited_to_the_deadline(monkeypatch):
+    completions = FakeAsyncCompletions()
+    async_client = AsyncOpenAI(api_key="-")
+    monkeypatch.setattr(async_client.chat.completions, "create", completions.create)
+    chat = Chat(client=OpenAI(api_key="-"), async_client=async_client, timeout=60.0)
+    request = chat._completion_request(PROMPT)
+
+    def call():
+        with discussion_deadline(5.0):
+            return await_only(chat._arequest_with_retries(request, CallStatistics()))
+
+    collected_messages, _, _ = asyncio.run(run_sync_in_loop(call))
+    assert collected_messages == ["42"]
+    assert len(completions.timeouts) == 1
+    assert 4.0 < completions.timeouts[0].read <= 5.0
@@ -0,0 +1,62 @@
+import asyncio
+import threading
+import time
+
+from mallm.models.CallScheduler import CallScheduler
+from mallm.utils.async_bridge import await_only, run_sync_in_loop
+from mallm.utils.enums import CallPriority, CallType
+from mallm.utils.tracking import call_scope, track_discussion_progress
+
+
+def test_runs_discussions_closest_to_completion_first():
+    scheduler = CallScheduler(CallPriority.CLOSEST_TO_COMPLETION, max_concurrent_calls=1)
+    scheduler.acquire()
+    order = []
+
+    def call(turn: int) -> None:
+        with track_discussion_progress(max_turns=4) as progress:
+            progress.turn = turn
+            scheduler.acquire()
+            order.append(turn)
+            scheduler.release()
+
+    threads = [threading.Thread(target=call, args=(turn,)) for turn in (0, 3, 1)]
+    for thread in threads:
+        thread.start()
+    while len(scheduler._waiting) < len(threads):
+        time.sleep(0.01)
+    scheduler.release()
+    for thread in threads:
+        thread.join()
+    assert order == [3, 1, 0]
+    assert scheduler.in_flight == 0
+
+
+# Test that async calls of discussions are ordered by the progress and call scope of their discussion
+def test_orders_async_calls_by_their_discussion():
+    scheduler = CallScheduler(CallPriority.CLOSEST_TO_COMPLETION, max_concurrent_calls=1)
+    scheduler.acquire()
+    order = []
+
+    def call(name: str, turn: int, call_type: CallType) -> None:
+        with track_discussion_progress(max_turns=4) as progress, call_scope(
+            call_type=call_type
+        ):
+            progress.turn = turn
+            await_only(scheduler.aacquire())
+            order.append(name)
+            scheduler.release()
+
+    async def main() -> None:
+        calls = [
+            asyncio.ensure_future(run_sync_in_loop(call, "improve", 1, CallType.IMPROVE)),
+            asyncio.ensure_future(run_sync_in_loop(call, "vote", 1, CallType.VOTE)),
+        ]
+        while len(scheduler._waiting) < len(calls):
+            await asyncio.sleep(0.01)
+        scheduler.release()
+        await asyncio.gather(*calls)
+
+    asyncio.run(main())
+    assert order == ["vote", "improve"]
+    assert scheduler.in_flight == 0
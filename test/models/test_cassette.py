@@ -0,0 +1,33 @@
+import pytest
+from openai.types.chat import ChatCompletionChunk
+
+from mallm.models.Cassette import Cassette
+from mallm.utils.enums import CassetteMode
+
+REQUEST = {"model": "m", "messages": [{"role": "user", "content": "Hello"}]}
+
+
+def chunk(content):
+    return ChatCompletionChunk.model_validate(
+        {
+            "id": "x",
+            "object": "chat.completion.chunk",
+            "created": 0,
+            "model": "m",
+            "choices": [{"index": 0, "delta": {"content": content}}],
+        }
+    )
+
+
+def test_record_and_replay(tmp_path):
+    path = str(tmp_path / "cassette.jsonl")
+    cassette = Cassette(path, CassetteMode.RECORD)
+    for content in ["first", "second"]:
+        assert list(cassette.record(REQUEST, iter([chunk(content)]), 0.0)) == [chunk(content)]
+    cassette.close()
+
+    cassette = Cassette(path, CassetteMode.REPLAY, keep_latency=False)
+    assert list(cassette.replay(REQUEST)) == [chunk("first")]
+    assert list(cassette.replay(REQUEST)) == [chunk("second")]
+    with pytest.raises(Exception, match="No recorded response"):
+        list(cassette.replay(REQUEST))
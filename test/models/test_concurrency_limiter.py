@@ -0,0 +1,42 @@
+import asyncio
+
+import httpx
+from openai import RateLimitError
+
+from mallm.models.ConcurrencyLimiter import ConcurrencyLimiter
+
+
+def rate_limit_error():
+    request = httpx.Request("POST", "http://localhost/v1/chat/completions")
+    return RateLimitError(
+        "error", response=httpx.Response(429, request=request), body=None
+    )
+
+
+def test_additive_increase_multiplicative_decrease():
+    limiter = ConcurrencyLimiter(initial_limit=2, max_limit=4)
+    for _ in range(10):
+        slot = limiter.acquire()
+        slot.latency = 1.0
+        limiter.release(slot)
+    assert limiter.limit == 4
+
+    slots = [limiter.acquire() for _ in range(4)]
+    for slot in slots:
+        limiter.release(slot, rate_limit_error())
+    # The burst of rate limits of requests started before the decrease counts once
+    assert limiter.limit == 2
+
+
+def test_waits_for_free_slot():
+    limiter = ConcurrencyLimiter(initial_limit=1, max_limit=1)
+
+    async def run():
+        slot = await limiter.aacquire()
+        waiting = asyncio.create_task(limiter.aacquire())
+        await asyncio.sleep(0.01)
+        assert not waiting.done()
+        limiter.release(slot)
+        await asyncio.wait_for(waiting, 1)
+
+    asyncio.run(run())
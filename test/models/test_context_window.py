@@ -0,0 +1,54 @@
+import sys
+from types import SimpleNamespace
+
+import pytest
+from openai import OpenAI
+
+from mallm.models.Chat import Chat
+from mallm.utils.functions import estimate_tokens, token_counter
+
+
+def test_drops_oldest_discussion_history_first():
+    chat = Chat(client=OpenAI(api_key="-"), context_window=1100, max_tokens=1000)
+    prompt = [
+        {"role": "system", "content": "system"},
+        {"role": "user", "content": "task " * 40},
+        {"role": "user", "content": "old " * 20},
+        {"role": "assistant", "content": "new " * 20},
+        {"role": "user", "content": "instruction"},
+    ]
+    messages, trimmed_tokens = chat._fit_context_window(prompt)
+    assert [m["content"] for m in messages] == [
+        "system",
+        "task " * 40,
+        "new " * 20,
+        "instruction",
+    ]
+    assert trimmed_tokens > 0
+    assert chat._fit_context_window(messages) == (messages, 0)
+
+
+def test_raises_if_shortening_does_not_reduce_the_prompt():
+    # The marker of the omitted text takes as many tokens as the content it would replace
+    chat = Chat(client=OpenAI(api_key="-"), context_window=15, max_tokens=10)
+    with pytest.raises(Exception, match="Prompt exceeds the context window."):
+        chat._fit_context_window([{"role": "user", "content": "abcdefgh"}])
+
+
+def test_counts_tokens_with_the_tokenizer_of_the_model(monkeypatch):
+    assert token_counter(None) is estimate_tokens
+    encodings = []
+
+    def get_encoding(name):
+        encodings.append(name)
+        return SimpleNamespace(encode=lambda text, disallowed_special: text.split())
+
+    monkeypatch.setitem(sys.modules, "tiktoken", SimpleNamespace(get_encoding=get_encoding))
+    token_counter.cache_clear()
+    chat = Chat(client=OpenAI(api_key="-"), tokenizer="tiktoken:cl100k_base")
+    # The tokenizer is only loaded once it is needed
+    assert encodings == []
+    assert chat._count_tokens("one two three") == 3
+    assert chat._count_tokens("four five") == 2
+    assert encodings == ["cl100k_base"]
+    token_counter.cache_clear()
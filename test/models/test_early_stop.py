@@ -0,0 +1,82 @@
+from openai.types.chat import ChatCompletionChunk
+
+from mallm.models.Chat import Chat
+from mallm.models.discussion.FreeTextResponseGenerator import (
+    FreeTextResponseGenerator,
+)
+from mallm.utils.functions import draft_complete, extract_draft, json_object_complete
+
+
+class FakeStream:
+    def __init__(self, texts: list[str]):
+        self.chunks = [
+            ChatCompletionChunk.model_validate(
+                {
+                    "id": "x",
+                    "object": "chat.completion.chunk",
+                    "created": 0,
+                    "model": "m",
+                    "choices": [{"index": 0, "delta": {"content": text}, "finish_reason": None}],
+                }
+            )
+            for text in texts
+        ]
+        self.closed = False
+
+    def __iter__(self):
+        return iter(self.chunks)
+
+    def close(self) -> None:
+        self.closed = True
+
+
+def test_closes_stream_once_response_is_complete():
+    stream = FakeStream(['{"role": ', '"Tester"}', " and more", " text"])
+    chunks = list(Chat._until_complete(stream, json_object_complete))
+    assert "".join(chunk.choices[0].delta.content for chunk in chunks) == '{"role": "Tester"}'
+    assert stream.closed
+
+
+def test_parsers_accept_only_complete_responses():
+    assert not json_object_complete('{"role": "a}b", "x": {')
+    assert json_object_complete('Sure: {"role": "a}b", "x": {}}')
+    assert not draft_complete("[AGREE] Final Solution: A) yes")
+    assert draft_complete("[AGREE] Final Solution: A) yes\n\nBecause")
+
+
+def test_draft_is_not_complete_after_final_solution_in_reasoning():
+    response = "To find the final solution, we add the numbers.\n\nStep 1: 2 + 2 = 4.\n\nFinal Solution: 4\n\nDone."
+    partial = response[: response.index("Step 1")]
+    assert not draft_complete(partial)
+    assert not draft_complete("Final Solution:\n\n")
+    assert draft_complete(response)
+    assert extract_draft(response) == "4"
+
+
+class FakeLLM:
+    def __init__(self, response: str):
+        self.response = response
+        self.is_complete = []
+
+    def invoke(self, prompt, is_complete=None, **kwargs):
+        self.is_complete.append(is_complete)
+        if is_complete is None:
+            return self.response
+        return next(
+            self.response[:end]
+            for end in range(len(self.response) + 1)
+            if is_complete(self.response[:end]) or end == len(self.response)
+        )
+
+
+def test_responses_with_agreement_are_not_cut_off():
+    response = "I agree with the approach.\n\nFinal Solution: 5\n\n[DISAGREE] The sum is wrong."
+    llm = FakeLLM(response)
+    generator = FreeTextResponseGenerator(llm)
+    result = generator.generate_response([], "task", "input", False, None, False, False)
+    assert llm.is_complete[0] is None
+    assert result.message == response
+    assert result.agreement is False
+    # Drafts carry no agreement and stop after the solution
+    draft = generator.generate_response([], "task", "input", False, None, False, True)
+    assert draft.message == "I agree with the approach.\n\nFinal Solution: 5\n\n"
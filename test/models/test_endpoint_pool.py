@@ -0,0 +1,40 @@
+import httpx
+from openai import InternalServerError
+
+from mallm.models.EndpointPool import Endpoint, EndpointPool
+
+
+def server_error():
+    request = httpx.Request("POST", "http://localhost/v1/chat/completions")
+    return InternalServerError(
+        "error", response=httpx.Response(503, request=request), body=None
+    )
+
+
+def create_pool():
+    return EndpointPool(
+        [
+            Endpoint(url="a", client=None, weight=2.0),
+            Endpoint(url="b", client=None, max_concurrent_requests=1),
+        ],
+        ejection_threshold=2,
+        ejection_cooldown=60,
+    )
+
+
+def test_routes_to_least_loaded_endpoint():
+    pool = create_pool()
+    assert [pool.acquire().url for _ in range(4)] == ["a", "a", "b", "a"]
+
+
+def test_failover_and_ejection():
+    pool = create_pool()
+    endpoint = pool.acquire()
+    pool.release(endpoint, server_error())
+    assert pool.acquire(exclude=endpoint).url == "b"
+    endpoint = pool.acquire()
+    pool.release(endpoint, server_error())
+    # a failed twice in a row and is ejected, b is busy: the pool waits for b
+    assert pool.endpoints[0].ejected_until > 0
+    pool.release(pool.endpoints[1])
+    assert pool.acquire().url == "b"
@@ -0,0 +1,65 @@
+from openai import OpenAI
+from openai.types.chat import ChatCompletion
+
+from mallm.models.Chat import Chat
+from mallm.models.discussion.FreeTextResponseGenerator import (
+    FreeTextResponseGenerator,
+)
+
+PROMPT = [{"role": "user", "content": "Vote."}]
+
+
+def test_profiles_select_generation_parameters():
+    chat = Chat(client=OpenAI(api_key="-"), max_tokens=1024)
+    default = chat._completion_request(PROMPT)
+    assert default["stream"] and default["max_tokens"] == 1024
+    assert "logprobs" not in default
+    assert chat._completion_request(PROMPT, profile=chat.generation_profiles["final_answer"])["logprobs"]
+    confidence = chat._completion_request(PROMPT, profile=chat.generation_profiles["confidence"])
+    assert not confidence["stream"] and "stream_options" not in confidence
+    assert confidence["max_tokens"] < 1024
+
+
+def test_completion_becomes_single_chunk():
+    completion = ChatCompletion.model_validate(
+        {
+            "id": "x",
+            "object": "chat.completion",
+            "created": 0,
+            "model": "m",
+            "choices": [
+                {
+                    "index": 0,
+                    "message": {"role": "assistant", "content": "1"},
+                    "finish_reason": "stop",
+                    "logprobs": {
+                        "content": [
+                            {"token": "1", "logprob": -0.2, "top_logprobs": []},
+                            {"token": "", "logprob": -0.4, "top_logprobs": []},
+                        ]
+                    },
+                }
+            ],
+            "usage": {"prompt_tokens": 5, "completion_tokens": 2, "total_tokens": 7},
+        }
+    )
+    chunk = Chat._completion_chunk(completion)
+    assert chunk.choices[0].delta.content == "1"
+    assert abs(chunk.choices[0].logprobs.content[0].logprob + 0.3) < 1e-9
+    assert chunk.usage.completion_tokens == 2
+
+
+class ProfileRecordingLLM:
+    def __init__(self):
+        self.profiles = []
+
+    def invoke(self, prompt, generation_profile="default", **kwargs):
+        self.profiles.append(generation_profile)
+        return "Final Solution: 4\n\n"
+
+
+def test_response_generators_select_profiles():
+    llm = ProfileRecordingLLM()
+    FreeTextResponseGenerator(llm).generate_baseline("task", "input", False)
+    # The draft and the final answer extracted from it
+    assert llm.profiles == ["draft", "final_answer"]
@@ -0,0 +1,11 @@
+from mallm.models.LatencyTracker import LatencyTracker
+
+
+def test_threshold_per_call_type():
+    tracker = LatencyTracker(percentile=0.9, min_samples=10)
+    for latency in range(1, 11):
+        tracker.record("vote", float(latency))
+    tracker.record("draft", 5.0)
+    assert tracker.threshold("vote") == 9.0
+    # Too few samples to hedge draft calls
+    assert tracker.threshold("draft") is None
@@ -0,0 +1,23 @@
+import threading
+import time
+
+from mallm.models.RateLimiter import RateLimiter
+
+
+def test_admits_requests_within_quota():
+    limiter = RateLimiter(requests_per_minute=600, tokens_per_minute=1000)
+    assert limiter.acquire(800) == 800
+    # The token bucket is almost empty, the request waits until the unused tokens are returned
+    admitted = threading.Event()
+    thread = threading.Thread(target=lambda: admitted.set() if limiter.acquire(500) else None)
+    thread.start()
+    time.sleep(0.2)
+    assert not admitted.is_set()
+    limiter.settle(800, 100)
+    thread.join(1)
+    assert admitted.is_set()
+
+
+def test_caps_requests_larger_than_quota():
+    limiter = RateLimiter(tokens_per_minute=100)
+    assert limiter.acquire(500) == 100
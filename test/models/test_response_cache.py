@@ -0,0 +1,45 @@
+from mallm.models.ResponseCache import ResponseCache
+
+
+def request(content, max_tokens=1024):
+    return {
+        "model": "gpt-3.5-turbo",
+        "messages": [{"role": "user", "content": content}],
+        "stream": True,
+        "max_tokens": max_tokens,
+    }
+
+
+def test_lookup_and_store(tmp_path):
+    cache = ResponseCache(str(tmp_path / "cache.db"))
+    assert cache.lookup(request("Hello")) is None
+    cache.store(request("Hello"), "Hi!", -0.5)
+    assert cache.lookup(request("Hello")) == ("Hi!", -0.5)
+    assert cache.lookup(request("Hello", max_tokens=10)) is None
+    assert (cache.hits, cache.misses) == (1, 2)
+    cache.close()
+
+    # The cache persists between runs
+    cache = ResponseCache(str(tmp_path / "cache.db"))
+    assert cache.lookup(request("Hello")) == ("Hi!", -0.5)
+    cache.close()
+
+
+def test_size_eviction_keeps_recent_entries(tmp_path):
+    cache = ResponseCache(str(tmp_path / "cache.db"), max_size_mb=100 / 1024 / 1024)
+    for i in range(20):
+        cache.store(request(str(i)), "x" * 10, 0.0)
+    cache.evict()
+    assert cache.lookup(request("0")) is None
+    assert cache.lookup(request("19")) == ("x" * 10, 0.0)
+    cache.close()
+
+
+def test_retry_attempts_get_new_responses(tmp_path):
+    cache = ResponseCache(str(tmp_path / "cache.db"))
+    cache.store(request("Vote"), "unparseable", -1.0)
+    assert cache.lookup(request("Vote"), attempt=1) is None
+    cache.store(request("Vote"), "1", -0.1, attempt=1)
+    assert cache.lookup(request("Vote")) == ("unparseable", -1.0)
+    assert cache.lookup(request("Vote"), attempt=1) == ("1", -0.1)
+    cache.close()
@@ -0,0 +1,35 @@
+import httpx
+from openai import APIStatusError, RateLimitError
+
+from mallm.models.RetryPolicy import RetryPolicy
+from mallm.utils.enums import APIErrorType
+
+
+def status_error(status_code, headers=None):
+    request = httpx.Request("POST", "http://localhost/v1/chat/completions")
+    response = httpx.Response(status_code, headers=headers, request=request)
+    if status_code == 429:
+        return RateLimitError("error", response=response, body=None)
+    return APIStatusError("error", response=response, body=None)
+
+
+def test_classify():
+    request = httpx.Request("POST", "http://localhost")
+    assert RetryPolicy.classify(status_error(429)) == APIErrorType.RATE_LIMIT
+    assert RetryPolicy.classify(status_error(503)) == APIErrorType.SERVER
+    assert RetryPolicy.classify(httpx.ReadTimeout("timeout", request=request)) == APIErrorType.TIMEOUT
+    assert RetryPolicy.classify(httpx.ConnectError("refused", request=request)) == APIErrorType.CONNECTION
+    assert RetryPolicy.classify(status_error(400)) is None
+
+
+def test_backoff_is_capped():
+    policy = RetryPolicy(base_delay=1.0, max_delay=4.0)
+    for attempt in range(1, 10):
+        assert 0 <= policy.delay(status_error(503), attempt) <= 4.0
+
+
+def test_retry_after_header():
+    policy = RetryPolicy(base_delay=0.5)
+    assert 2.0 <= policy.delay(status_error(429, {"retry-after": "2"}), 1) <= 2.5
+    assert RetryPolicy.retry_after(status_error(429, {"retry-after-ms": "1500"})) == 1.5
+    assert RetryPolicy.retry_after(status_error(503)) is None
@@ -0,0 +1,31 @@
+from openai import OpenAI
+
+from mallm.models.Chat import Chat
+from mallm.utils.enums import StructuredOutput
+from mallm.utils.types import OutputConstraint
+
+PROMPT = [{"role": "user", "content": "Vote."}]
+VOTE = OutputConstraint(name="vote", regex="(0|1)")
+PERSONA = OutputConstraint(name="persona", json_schema={"type": "object"})
+
+
+def test_vllm_guided_decoding():
+    chat = Chat(client=OpenAI(api_key="-"), structured_output=StructuredOutput.VLLM)
+    assert chat._completion_request(PROMPT, VOTE)["extra_body"] == {
+        "guided_regex": "(0|1)"
+    }
+    assert chat._completion_request(PROMPT, PERSONA)["extra_body"] == {
+        "guided_json": {"type": "object"}
+    }
+
+
+def test_openai_response_format():
+    chat = Chat(client=OpenAI(api_key="-"), structured_output=StructuredOutput.OPENAI)
+    assert chat._completion_request(PROMPT, PERSONA)["response_format"]["json_schema"][
+        "schema"
+    ] == {"type": "object"}
+    # Regular expressions are not supported by the OpenAI API
+    assert "response_format" not in chat._completion_request(PROMPT, VOTE)
+    assert "extra_body" not in Chat(client=OpenAI(api_key="-"))._completion_request(
+        PROMPT, VOTE
+    )
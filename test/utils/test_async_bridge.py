@@ -0,0 +1,70 @@
+import asyncio
+import contextvars
+
+import pytest
+
+from mallm.utils.async_bridge import await_only, in_async_bridge, run_sync_in_loop
+
+request_id = contextvars.ContextVar("request_id", default=None)
+
+
+def double_after_sleep(value):
+    assert in_async_bridge()
+    return await_only(asyncio.sleep(0.01, result=value * 2))
+
+
+async def raise_value_error():
+    raise ValueError("failed")
+
+
+def catch_error():
+    try:
+        await_only(raise_value_error())
+    except ValueError:
+        return "caught"
+    return "not caught"
+
+
+# Test that many synchronous functions can wait concurrently on one event loop
+def test_run_sync_in_loop_concurrently():
+    async def main():
+        return await asyncio.gather(
+            *(run_sync_in_loop(double_after_sleep, i) for i in range(10))
+        )
+
+    assert asyncio.run(main()) == [i * 2 for i in range(10)]
+
+
+# Test that exceptions of awaitables are raised inside the synchronous code
+def test_exceptions_are_propagated():
+    assert asyncio.run(run_sync_in_loop(catch_error)) == "caught"
+
+
+async def read_request_id():
+    await asyncio.sleep(0)
+    return request_id.get()
+
+
+def set_and_read_request_id(value):
+    request_id.set(value)
+    return await_only(read_request_id())
+
+
+# Test that awaitables see the context variables set by the synchronous code
+def test_awaitables_run_in_context_of_sync_code():
+    async def main():
+        return await asyncio.gather(
+            *(run_sync_in_loop(set_and_read_request_id, i) for i in range(5))
+        )
+
+    assert asyncio.run(main()) == list(range(5))
+    assert request_id.get() is None
+
+
+# Test that await_only cannot be used outside of the bridge
+def test_await_only_outside_of_bridge():
+    assert not in_async_bridge()
+    coroutine = asyncio.sleep(0)
+    with pytest.raises(RuntimeError):
+        await_only(coroutine)
+    coroutine.close()
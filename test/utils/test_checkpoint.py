@@ -0,0 +1,16 @@
+from mallm.utils.checkpoint import Checkpoint
+
+
+def test_restores_order_and_failed_samples(tmp_path):
+    checkpoint = Checkpoint(tmp_path / "out.checkpoint.json")
+    assert not checkpoint.load()
+    checkpoint.order = [2, 0, 1]
+    checkpoint.example_ids = ["c", "a", "b"]
+    checkpoint.save()
+    checkpoint.save(failed_example_id="a")
+
+    restored = Checkpoint(tmp_path / "out.checkpoint.json")
+    assert restored.load()
+    assert restored.order == [2, 0, 1]
+    assert restored.example_ids == ["c", "a", "b"]
+    assert restored.failed_example_ids == ["a"]
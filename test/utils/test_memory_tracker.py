@@ -0,0 +1,18 @@
+import sys
+
+import pytest
+
+from mallm.utils.memory_tracker import MemoryTracker
+
+
+@pytest.mark.skipif(sys.platform != "linux", reason="The RSS is only sampled on Linux")
+def test_divides_memory_by_discussions_in_flight():
+    tracker = MemoryTracker()
+    with tracker.running(), tracker.running():
+        # Written to, so that the pages are resident
+        retained = b"x" * (8 * 2**20)
+        tracker.sample()
+    assert tracker.samples == 1
+    assert 4 * 2**20 <= tracker.max_footprint < 6 * 2**20
+    del retained
+    assert tracker.peak_rss() >= tracker.current_rss()
@@ -0,0 +1,49 @@
+import json
+import threading
+
+from mallm.utils.output_writer import OutputWriter
+
+
+def test_writes_records_of_all_threads(tmp_path):
+    writer = OutputWriter(tmp_path / "out.jsonl", fsync_interval=0.01)
+    threads = [
+        threading.Thread(target=lambda i=i: [writer.write({"exampleId": f"{i}-{j}"}) for j in range(50)])
+        for i in range(4)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    writer.close()
+    with open(tmp_path / "out.jsonl") as file:
+        records = [json.loads(line) for line in file]
+    assert len({record["exampleId"] for record in records}) == writer.records == 200
+
+
+def test_converts_records_to_json_array(tmp_path):
+    writer = OutputWriter(tmp_path / "out.jsonl")
+    writer.write({"exampleId": "a"})
+    writer.write({"exampleId": "b"})
+    writer.close()
+    writer.convert_to_json(tmp_path / "out.json")
+    with open(tmp_path / "out.json") as file:
+        assert json.load(file) == [{"exampleId": "a"}, {"exampleId": "b"}]
+    assert not (tmp_path / "out.jsonl").exists()
+
+
+def test_reads_records_without_incomplete_last_line(tmp_path):
+    with open(tmp_path / "out.jsonl", "w") as file:
+        file.write('{"exampleId": "a"}\n{"exampleId": "b"}\n{"exampleId": ')
+    assert [record["exampleId"] for record in OutputWriter.read_records(tmp_path / "out.jsonl")] == ["a", "b"]
+
+
+def test_merges_records_of_other_file(tmp_path):
+    writer = OutputWriter(tmp_path / "out.jsonl")
+    writer.write({"exampleId": "a"})
+    writer.close()
+    with open(tmp_path / "out.shard0.jsonl", "w") as file:
+        file.write('{"exampleId": "b"}\n{"exampleId": ')
+    writer.merge(tmp_path / "out.shard0.jsonl")
+    assert [record["exampleId"] for record in OutputWriter.read_records(tmp_path / "out.jsonl")] == ["a", "b"]
+    assert writer.records == 2
+    assert not (tmp_path / "out.shard0.jsonl").exists()
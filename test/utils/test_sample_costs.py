@@ -0,0 +1,28 @@
+import json
+
+from mallm.utils.sample_costs import SampleCostEstimator
+from mallm.utils.types import InputExample
+
+
+def sample(example_id: str, text: str) -> InputExample:
+    return InputExample(example_id=example_id, dataset_id=None, inputs=[text], context=None, references=["a"])
+
+
+def test_orders_longest_samples_first():
+    samples = [sample("short", "a b"), sample("long", "a b " * 100), sample("medium", "a b " * 10)]
+    ordered = SampleCostEstimator().longest_first(samples)
+    assert [s.example_id for s in ordered] == ["long", "medium", "short"]
+
+
+def test_prefers_durations_from_history(tmp_path):
+    with open(tmp_path / "history.json", "w") as file:
+        json.dump(
+            [
+                {"input": ["a b"], "context": None, "clockSeconds": 100.0},
+                {"input": ["a b " * 100], "context": None, "clockSeconds": 1.0},
+            ],
+            file,
+        )
+    samples = [sample("long", "a b " * 100), sample("slow", "a b")]
+    ordered = SampleCostEstimator(str(tmp_path / "history.json")).longest_first(samples)
+    assert [s.example_id for s in ordered] == ["slow", "long"]
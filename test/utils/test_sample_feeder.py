@@ -0,0 +1,17 @@
+from mallm.utils.sample_feeder import SampleFeeder
+from mallm.utils.types import InputExample
+
+
+def sample(example_id: str) -> InputExample:
+    return InputExample(example_id=example_id, dataset_id=None, inputs=["input"], context=None, references=["a"])
+
+
+def test_substitutes_failed_samples_right_away():
+    feeder = SampleFeeder([sample("0"), sample("1")], [sample("2")])
+    assert feeder.next().example_id == "0"
+    feeder.report("failed", "0")
+    assert [feeder.next().example_id, feeder.next().example_id] == ["1", "2"]
+    assert feeder.next() is None
+    assert not feeder.exhausted
+    feeder.report("failed", "2")
+    assert feeder.exhausted
@@ -0,0 +1,58 @@
+import time
+
+import pytest
+
+from mallm.utils.enums import CallType
+from mallm.utils.tracking import (
+    DeadlineExceeded,
+    call_scope,
+    check_deadline,
+    current_call_scope,
+    deadline_exceeded,
+    discussion_deadline,
+    token_budget_exhausted,
+    track_call_statistics,
+)
+from mallm.utils.types import CallStatistics, TokenUsage
+
+
+def test_nested_call_scopes():
+    assert current_call_scope() == (None, None)
+    with call_scope("agent", CallType.IMPROVE):
+        with call_scope(call_type=CallType.VOTE):
+            assert current_call_scope() == ("agent", CallType.VOTE)
+        assert current_call_scope() == ("agent", CallType.IMPROVE)
+    assert current_call_scope() == (None, None)
+
+
+def test_token_budget():
+    assert not token_budget_exhausted(10)
+    with track_call_statistics() as statistics:
+        statistics.merge(
+            CallStatistics(calls=1, usage=TokenUsage(prompt_tokens=8, completion_tokens=2))
+        )
+        assert not token_budget_exhausted(None)
+        assert not token_budget_exhausted(11)
+        assert token_budget_exhausted(10)
+
+
+def test_discussion_deadline():
+    with discussion_deadline(None):
+        assert not deadline_exceeded()
+    with discussion_deadline(0.05) as deadline:
+        assert not deadline_exceeded()
+        assert not deadline.reached
+        time.sleep(0.06)
+        assert deadline_exceeded()
+        assert deadline.reached
+    assert not deadline_exceeded()
+
+
+def test_calls_are_limited_to_the_time_left():
+    assert check_deadline(60.0) is None
+    with discussion_deadline(10.0) as deadline:
+        assert 9.0 < check_deadline(1.0) <= 10.0
+        # A retry that would wait past the deadline gives up, which marks the deadline as reached
+        with pytest.raises(DeadlineExceeded):
+            check_deadline(20.0)
+        assert deadline.reached
@@ -0,0 +1,48 @@
+from mallm.utils.types import InputExample
+from mallm.utils.work_queue import WorkQueue
+
+
+def samples(n: int) -> list[InputExample]:
+    return [
+        InputExample(example_id=str(i), dataset_id=None, inputs=[f"input {i}"], context=None, references=["a"])
+        for i in range(n)
+    ]
+
+
+def test_leases_samples_once(tmp_path):
+    first = WorkQueue(str(tmp_path / "queue.db"))
+    second = WorkQueue(str(tmp_path / "queue.db"))
+    assert first.populate(samples(3), num_samples=None)
+    assert not second.populate(samples(3), num_samples=None)
+    leased = [first.lease(), second.lease(), first.lease(), second.lease()]
+    assert [sample.example_id if sample else None for sample in leased] == ["0", "1", "2", None]
+
+
+def test_expired_leases_run_again(tmp_path):
+    dead = WorkQueue(str(tmp_path / "queue.db"), lease_seconds=-1.0)
+    alive = WorkQueue(str(tmp_path / "queue.db"))
+    dead.populate(samples(1), num_samples=None)
+    assert dead.lease() is not None
+    sample = alive.lease()
+    assert sample is not None and sample.example_id == "0"
+    alive.add_result("output", {"exampleId": "0"})
+    dead.complete("0")
+    # The sample belongs to the other node now, so it is neither failed nor substituted
+    assert dead.fail("0")
+    assert alive.unfinished() == 1
+    alive.complete("0")
+    assert alive.unfinished() == 0
+    assert list(alive.results("output")) == [{"exampleId": "0"}]
+
+
+def test_failed_samples_are_substituted(tmp_path):
+    queue = WorkQueue(str(tmp_path / "queue.db"))
+    queue.populate(samples(3), num_samples=2)
+    assert queue.lease().example_id == "0"
+    assert queue.fail("0")
+    assert [queue.lease().example_id, queue.lease().example_id] == ["1", "2"]
+    queue.complete("1")
+    assert not queue.claim_merge()
+    assert not queue.fail("2")
+    assert queue.claim_merge()
+    assert not queue.claim_merge()